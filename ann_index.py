@@ -0,0 +1,258 @@
+# ann_index.py
+
+import argparse
+import logging
+import threading
+from array import array
+from pathlib import Path
+import numpy as np
+from vector_index import VectorIndex, score_rows
+
+
+def spherical_kmeans(sample: np.ndarray, k: int, iterations: int = 10, rng=None) -> np.ndarray:
+    """Cluster normalized rows by cosine similarity. Returns k unit-length centroids."""
+    rng = rng or np.random.default_rng(0)
+    centroids = sample[rng.choice(len(sample), size=k, replace=False)].copy()
+    for _ in range(iterations):
+        labels = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, sample)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        empty = norms[:, 0] == 0
+        # Re-seed empty clusters with random sample points
+        if empty.any():
+            sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+            norms[empty] = np.linalg.norm(sums[empty], axis=1, keepdims=True)
+        centroids = sums / np.maximum(norms, 1e-12)
+    return centroids
+
+
+def assign_clusters(vectors: np.ndarray, centroids: np.ndarray, chunk_size: int = 65536) -> np.ndarray:
+    """Return the nearest centroid for each (normalized) row."""
+    assignments = np.empty(vectors.shape[0], dtype=np.int64)
+    for start in range(0, vectors.shape[0], chunk_size):
+        chunk = vectors[start:start + chunk_size].astype(np.float32)
+        assignments[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+    return assignments
+
+
+class IVFIndex(VectorIndex):
+    """
+    Approximate nearest-neighbour index (inverted file over k-means clusters).
+    Vectors are partitioned into `nlist` clusters; a query only scores the rows
+    in its `nprobe` closest clusters. Until trained it behaves like an exact index.
+    """
+
+    def __init__(self, dim: int, nlist: int = 1024, nprobe: int = 16, min_train_size: int = 10000,
+                 train_sample: int = 100000, train_iterations: int = 10, initial_capacity: int = 1024,
+                 segment=None, dtype: str = "float32"):
+        super().__init__(dim, initial_capacity=initial_capacity, segment=segment, dtype=dtype)
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_train_size = min_train_size
+        self.train_sample = train_sample
+        self.train_iterations = train_iterations
+        self.centroids = None
+        self._lists = []
+        self._train_lock = threading.Lock()
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        return assign_clusters(vectors, self.centroids)
+
+    def _build_lists(self, assignments: np.ndarray):
+        lists = [array('q') for _ in range(self.centroids.shape[0])]
+        order = np.argsort(assignments, kind="stable")
+        bounds = np.searchsorted(assignments[order], np.arange(self.centroids.shape[0] + 1))
+        for cluster in range(self.centroids.shape[0]):
+            lists[cluster].frombytes(order[bounds[cluster]:bounds[cluster + 1]].astype(np.int64).tobytes())
+        self._lists = lists
+
+    def train(self, seed: int = 0):
+        """Run spherical k-means on a sample of the stored vectors and rebuild the inverted lists."""
+        with self._train_lock:
+            with self._lock:
+                size = self._size
+            if size == 0:
+                return
+            rng = np.random.default_rng(seed)
+            nlist = min(self.nlist, size)
+            sample_idx = rng.choice(size, size=min(self.train_sample, size), replace=False)
+            sample = self.vectors_at(np.sort(sample_idx))
+            centroids = spherical_kmeans(sample, nlist, self.train_iterations, rng)
+
+            with self._lock:
+                self.centroids = centroids.astype(np.float32)
+                self._build_lists(self._assign(self._matrix[:self._size]))
+            logging.info(f"Trained IVF index: {nlist} clusters over {size} vectors.")
+
+    def _on_added(self, position: int):
+        if self.is_trained:
+            cluster = int(np.argmax(self.centroids @ self._matrix[position].astype(np.float32)))
+            self._lists[cluster].append(position)
+
+    def _on_removed(self, keep: np.ndarray):
+        if not self.is_trained:
+            return
+        new_positions = np.cumsum(keep) - 1
+        lists = []
+        for members in self._lists:
+            positions = np.frombuffer(members, dtype=np.int64)
+            positions = positions[positions < len(keep)]
+            lists.append(array('q', new_positions[positions[keep[positions]]].astype(np.int64).tobytes()))
+        self._lists = lists
+
+    def search_many(self, vectors: np.ndarray, k: int = 1, **kwargs):
+        if not self.is_trained:
+            return super().search_many(vectors, k, **kwargs)
+        # Each query probes its own clusters, so there is no shared matrix product
+        return [self.search(vector, k) for vector in np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)]
+
+    def search(self, vector: np.ndarray, k: int = 1, nprobe: int = None):
+        if not self.is_trained:
+            return super().search(vector, k)
+
+        query = np.asarray(vector, dtype=np.float32).reshape(-1)
+        if query.shape[0] != self.dim:
+            logging.warning(f"Vector dim mismatch: {query.shape[0]} vs {self.dim}")
+            return []
+        query = self.normalize(query)
+
+        nprobe = min(nprobe or self.nprobe, self.centroids.shape[0])
+        probe = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        with self._lock:
+            matrix = self._matrix
+            ids = self._ids
+            inputs = self._inputs
+            responses = self._responses
+            scales = self._scales
+            candidates = np.concatenate([np.frombuffer(self._lists[c], dtype=np.int64) for c in probe])
+        if candidates.size == 0:
+            return []
+
+        scores = score_rows(matrix[candidates], query, scales[candidates] if scales is not None else None)
+        self._mask_dead(scores, candidates)
+        k = min(k, candidates.size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            {
+                "id": int(ids[candidates[i]]),
+                "input": inputs[candidates[i]],
+                "response": responses[candidates[i]],
+                "score": float(scores[i]),
+            }
+            for i in top
+            if scores[i] > -np.inf
+        ]
+
+    def save(self, path: Path):
+        """Persist centroids and row assignments (vectors stay in the memory DB)."""
+        if not self.is_trained:
+            return
+        with self._lock:
+            size = self._size
+            ids = self._ids[:size].copy()
+            assignments = np.empty(size, dtype=np.int64)
+            for cluster, members in enumerate(self._lists):
+                positions = np.frombuffer(members, dtype=np.int64)
+                assignments[positions[positions < size]] = cluster
+                del positions
+        with open(path, "wb") as f:
+            np.savez(f, centroids=self.centroids, ids=ids, assignments=assignments)
+        logging.info(f"Saved IVF index ({size} rows) to {path}")
+
+    def load_structure(self, path: Path) -> bool:
+        """
+        Restore centroids and assignments saved by save(). Rows added since the
+        file was written are assigned incrementally. Returns False if the file is
+        missing or does not match the loaded rows.
+        """
+        path = Path(path)
+        if not path.exists():
+            return False
+        try:
+            data = np.load(path)
+            centroids = data["centroids"]
+            saved_ids = data["ids"]
+            assignments = data["assignments"]
+        except Exception as e:
+            logging.warning(f"Could not read IVF index file {path}: {e}")
+            return False
+
+        with self._lock:
+            if centroids.shape[1] != self.dim or len(saved_ids) > self._size \
+                    or not np.array_equal(saved_ids, self._ids[:len(saved_ids)]):
+                logging.info(f"IVF index file {path} is stale, retraining.")
+                return False
+            self.centroids = centroids.astype(np.float32)
+            tail = self._matrix[len(saved_ids):self._size]
+            if len(tail):
+                assignments = np.concatenate([assignments, self._assign(tail)])
+            self._build_lists(assignments)
+        logging.info(f"Loaded IVF index from {path} ({len(saved_ids)} saved rows, {len(tail)} new).")
+        return True
+
+    def prepare(self, path: Path = None):
+        """Load a persisted structure or train a fresh one once the index is large enough."""
+        if path is not None and self.load_structure(path):
+            return
+        if len(self) >= self.min_train_size:
+            self.train()
+            if path is not None:
+                self.save(path)
+
+
+def evaluate_recall(index: IVFIndex, queries: np.ndarray, threshold: float, nprobe: int = None) -> dict:
+    """
+    Compare an approximate index against exact search.
+    Reports recall@1 and how often the SIMILARITY_THRESHOLD decision
+    (match / no match, and which answer) agrees with exact search.
+    """
+    recall_hits = 0
+    decision_agree = 0
+    for query in queries:
+        exact = VectorIndex.search(index, query, k=1)
+        approx = index.search(query, k=1, nprobe=nprobe)
+        if not exact:
+            continue
+        if approx and approx[0]["id"] == exact[0]["id"]:
+            recall_hits += 1
+        exact_match = exact[0]["id"] if exact[0]["score"] >= threshold else None
+        approx_match = approx[0]["id"] if approx and approx[0]["score"] >= threshold else None
+        if exact_match == approx_match:
+            decision_agree += 1
+    total = max(len(queries), 1)
+    return {"queries": len(queries), "recall_at_1": recall_hits / total, "decision_agreement": decision_agree / total}
+
+
+def main():
+    from config import SIMILARITY_THRESHOLD, IVF_NPROBE
+    import memory
+
+    parser = argparse.ArgumentParser(description="Check IVF recall@1 against exact search on the vector memory DB.")
+    parser.add_argument("--queries", type=int, default=1000, help="number of perturbed stored vectors to query")
+    parser.add_argument("--noise", type=float, default=0.05, help="std-dev of gaussian noise added to each query")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[IVF_NPROBE], help="nprobe values to evaluate")
+    args = parser.parse_args()
+
+    index = memory.get_index()
+    if not isinstance(index, IVFIndex) or not index.is_trained:
+        logging.error("IVF index is not enabled or not trained (check VECTOR_INDEX_BACKEND / IVF_MIN_TRAIN_SIZE).")
+        return
+
+    rng = np.random.default_rng(0)
+    picks = rng.choice(len(index), size=min(args.queries, len(index)), replace=False)
+    queries = index.vectors_at(picks) + rng.normal(0, args.noise, size=(len(picks), index.dim)).astype(np.float32)
+    for nprobe in args.nprobe:
+        result = evaluate_recall(index, queries, SIMILARITY_THRESHOLD, nprobe=nprobe)
+        print(f"nprobe={nprobe}: recall@1={result['recall_at_1']:.4f} "
+              f"threshold decision agreement={result['decision_agreement']:.4f} ({result['queries']} queries)")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+    main()
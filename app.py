@@ -1,51 +1,128 @@
 import gradio as gr
+import logging
+import re
+import threading
 import time
-from core import get_response
-from handlers import handle_input
+from config import (LOG_LEVEL, LOG_FORMAT, METRICS_ENABLED, METRICS_HOST, METRICS_PORT,
+                    CHAT_WINDOW_MESSAGES, CHAT_PAGE_MESSAGES, CHAT_ARCHIVE_PATH)
+from pipeline import stream_message
 from db_init import initialize_all_databases
+from model_loader import start_warmup, health
+from metrics import start_metrics_server
 
-# 🛠 Initialize DBs
+logging.basicConfig(level=LOG_LEVEL, format=LOG_FORMAT, force=True)
+
+# 🛠 Initialize DBs, then load models in the background so the UI is up immediately
 initialize_all_databases()
+start_warmup()
+
+# 📈 Prometheus metrics next to the UI
+if METRICS_ENABLED:
+    try:
+        start_metrics_server(METRICS_HOST, METRICS_PORT)
+    except OSError as e:
+        logging.warning(f"Metrics endpoint not started: {e}")
+
+# 🚦 Model readiness line shown above the chat
+def render_status():
+    status = health()
+    if status["ready"]:
+        return "<div class='status ready'>● All models ready</div>"
+    parts = [f"{name}: {info['state'].replace('_', ' ')}" for name, info in status["models"].items()]
+    return f"<div class='status warming'>● Warming up ({', '.join(parts)}). Rule-based answers are available now.</div>"
 
-# 💬 Message handling
-def chatbot_reply(user_message, chat_history):
-    chat_history = chat_history or []
-    response_data = get_response(user_message)
-
-    if response_data:
-        chat_history.append(("user", user_message, time.strftime("%H:%M")))
-        chat_history.append(("bot", response_data["response"], time.strftime("%H:%M")))
-    else:
-        bot_response = handle_input(user_message)
-        chat_history.append(("user", user_message, time.strftime("%H:%M")))
-        chat_history.append(("bot", bot_response, time.strftime("%H:%M")))
-    
-    return "", chat_history, render_chat_html(chat_history)
+# 💬 Message handling (streams the bot reply as the LLM generates it)
+def chatbot_reply(user_message, chat_view):
+    chat_view = chat_view if isinstance(chat_view, ChatView) else ChatView()
+    chat_view.append("user", user_message, time.strftime("%H:%M"))
+    chat_view.append("bot", "", time.strftime("%H:%M"))
+
+    for result in stream_message(user_message):
+        chat_view.update_last(result.response or "", time.strftime("%H:%M"))
+        yield "", chat_view, render_chat_html(chat_view)
 
 # 🖼️ HTML Renderer for Chat UI
-def render_chat_html(chat_history):
-    if not chat_history:
-        return "<div style='text-align:center;color:#999;margin-top:50px;'>No conversation yet.</div>"
-    
-    html = "<div id='chat-box'>"
-    for sender, message, timestamp in chat_history:
-        if sender == "user":
-            html += f"""
+def render_message(sender, message, timestamp):
+    if sender == "user":
+        return f"""
             <div class='chat-row user'>
                 <span class='sender'>You</span>
                 <div class='bubble user-bubble'>{message}</div>
                 <div class='time'>{timestamp}</div>
             </div>"""
-        else:
-            html += f"""
+    return f"""
             <div class='chat-row bot'>
                 <span class='sender'>Chatbot</span>
                 <div class='bubble bot-bubble'>{message}</div>
                 <div class='time'>{timestamp}</div>
             </div>"""
-    html += "</div>"
-    
-    return html
+
+_archive_lock = threading.Lock()
+_LINE_BREAKS = re.compile(r"\s*[\r\n]+\s*")
+
+def archive_messages(messages):
+    """Append paged-out (sender, message, timestamp) entries to CHAT_ARCHIVE_PATH as User:/Bot: lines."""
+    if CHAT_ARCHIVE_PATH is None or not messages:
+        return
+    # One line per message: a line break inside one would break the format ingest.read_chat reads
+    lines = [f"{'User' if sender == 'user' else 'Bot'}: {_LINE_BREAKS.sub(' ', message.strip())}\n"
+             + ("" if sender == "user" else "\n")
+             for sender, message, _ in messages]
+    try:
+        CHAT_ARCHIVE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        with _archive_lock, open(CHAT_ARCHIVE_PATH, "a", encoding="utf-8") as f:
+            f.write("".join(lines))
+    except OSError as e:
+        logging.warning(f"Could not archive chat messages to {CHAT_ARCHIVE_PATH}: {e}")
+
+class ChatView:
+    """
+    One session's chat, kept in gr.State. Each message is rendered to HTML once
+    and cached; while a reply streams only the last message is re-rendered.
+    At most `window` messages are kept: when more arrive, the oldest `page` are
+    appended to CHAT_ARCHIVE_PATH and dropped, so a turn costs the same in a
+    long session as in a short one.
+    """
+
+    def __init__(self, window=CHAT_WINDOW_MESSAGES, page=CHAT_PAGE_MESSAGES):
+        self.window = max(2, window)
+        self.page = min(max(2, page - page % 2), self.window)  # whole user/bot turns
+        self.messages = []  # (sender, message, timestamp)
+        self.fragments = []  # rendered HTML, one per message
+        self.paged_out = 0
+        self._settled = ""  # joined fragments of every message but the last
+
+    def append(self, sender, message, timestamp):
+        if self.fragments:
+            self._settled += self.fragments[-1]
+        self.messages.append((sender, message, timestamp))
+        self.fragments.append(render_message(sender, message, timestamp))
+        if len(self.messages) > self.window:
+            self._page_out()
+
+    def update_last(self, message, timestamp):
+        sender = self.messages[-1][0]
+        self.messages[-1] = (sender, message, timestamp)
+        self.fragments[-1] = render_message(sender, message, timestamp)
+
+    def _page_out(self):
+        count = min(self.page, len(self.messages) - 1)
+        archive_messages(self.messages[:count])
+        del self.messages[:count]
+        del self.fragments[:count]
+        self.paged_out += count
+        self._settled = "".join(self.fragments[:-1])
+
+    def html(self):
+        older = ""
+        if self.paged_out:
+            older = f"<div class='time' style='text-align:center;'>{self.paged_out} earlier messages not shown</div>"
+        return f"<div id='chat-box'>{older}{self._settled}{self.fragments[-1]}</div>"
+
+def render_chat_html(chat_view):
+    if not chat_view or not chat_view.messages:
+        return "<div style='text-align:center;color:#999;margin-top:50px;'>No conversation yet.</div>"
+    return chat_view.html()
 
 # 🎨 Stylish CSS (Fixed User Message Bubble & Wrapping)
 custom_css = """
@@ -139,6 +216,21 @@ body {
     margin-top: 3px;
 }
 
+/* Model readiness line */
+.status {
+    font-size: 0.8em;
+    text-align: center;
+    margin: 4px auto;
+}
+
+.status.ready {
+    color: #6c6;
+}
+
+.status.warming {
+    color: #e0b040;
+}
+
 /* Align input box properly */
 #chat-input-section {
     display: flex;
@@ -213,7 +305,7 @@ footer, .svelte-13f3c3s {
 
 # 🧠 UI Assembly
 with gr.Blocks(css=custom_css) as demo:
-    chat_history = gr.State([])
+    chat_history = gr.State(None)
 
     with gr.Column(elem_id="welcome-screen") as welcome_screen:
         gr.HTML("""
@@ -225,6 +317,7 @@ with gr.Blocks(css=custom_css) as demo:
         start_btn = gr.Button("Start Chat")
 
     with gr.Column(visible=False) as chat_container:
+        status_html = gr.HTML(render_status, every=2)
         chat_html = gr.HTML("<div id='chat-box'></div>")
 
         with gr.Row(elem_id="chat-input-section"):
@@ -238,7 +331,7 @@ with gr.Blocks(css=custom_css) as demo:
 
     # View switcher
     def switch_to_chat():
-        return gr.update(visible=False), gr.update(visible=True), gr.update(visible=True), []
+        return gr.update(visible=False), gr.update(visible=True), gr.update(visible=True), ChatView()
 
     start_btn.click(switch_to_chat, [], [welcome_screen, chat_container, user_input, chat_history])
     send_btn.click(chatbot_reply, [user_input, chat_history], [user_input, chat_history, chat_html])
@@ -0,0 +1,110 @@
+# batch.py
+"""
+Answer a file of prompts through the full pipeline, in bulk.
+
+    python batch.py prompts.jsonl -o answers.jsonl
+    cat prompts.txt | python batch.py - --no-llm > answers.jsonl
+
+Input lines are JSON objects with an "input" (or "prompt") key and an
+optional "id", or plain text (one prompt per line). Prompts are read in
+chunks of --batch-size: rule and cache hits are resolved first, the rest
+are embedded and searched together (ResponsePipeline.run_batch), and only
+true misses reach the LLM. Each answer is written as one JSON line, in
+input order, with the answering tier and per-item timings.
+"""
+
+import argparse
+import json
+import logging
+import sys
+import time
+from itertools import islice
+from pathlib import Path
+from config import LOG_FORMAT
+from db_init import initialize_all_databases
+from model_loader import start_warmup
+from pipeline import ResponsePipeline
+from memory import flush_writes
+from db import close_connections
+
+
+def read_prompts(lines):
+    """Yield (id, prompt) pairs from JSONL or plain-text lines; blank lines are skipped."""
+    for line_no, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        record = None
+        if line.startswith("{"):
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                logging.warning(f"line {line_no}: not valid JSON ({e}), using it as plain text")
+        if isinstance(record, dict):
+            prompt = record.get("input", record.get("prompt"))
+            if not isinstance(prompt, str) or not prompt.strip():
+                logging.warning(f"line {line_no}: no input, skipping")
+                continue
+            yield record.get("id", line_no), prompt
+        else:
+            yield line_no, line
+
+
+def run(lines, out, batch_size: int = 256, use_llm: bool = True, learn: bool = True) -> dict:
+    """Answer every prompt from `lines`, writing JSONL to `out`. Returns counts per answering tier."""
+    pipeline = ResponsePipeline(use_llm=use_llm, learn=learn)
+    counts = {}
+    total = 0
+    started = time.perf_counter()
+    prompts = read_prompts(lines)
+    while True:
+        chunk = list(islice(prompts, batch_size))
+        if not chunk:
+            break
+        results = pipeline.run_batch([prompt for _, prompt in chunk])
+        for (item_id, _), result in zip(chunk, results):
+            record = {"id": item_id, "input": result.user_input}
+            record.update(result.as_dict())
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            counts[result.source] = counts.get(result.source, 0) + 1
+        out.flush()
+        total += len(chunk)
+        elapsed = time.perf_counter() - started
+        logging.info(f"{total} prompts answered ({total / elapsed:.0f}/s).")
+    flush_writes()
+    close_connections()
+    elapsed = time.perf_counter() - started
+    logging.warning(f"Answered {total} prompts in {elapsed:.1f}s "
+                    f"({', '.join(f'{source}={count}' for source, count in sorted(counts.items()))}).")
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer a JSONL/text file of prompts through the pipeline.")
+    parser.add_argument("path", help="prompt file, or - for stdin")
+    parser.add_argument("-o", "--output", type=Path, help="write JSONL answers here (default: stdout)")
+    parser.add_argument("--batch-size", type=int, default=256, help="prompts embedded and searched together")
+    parser.add_argument("--no-llm", action="store_true", help="answer misses with the fallback reply instead")
+    parser.add_argument("--no-learn", action="store_true", help="do not save LLM answers to memory")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level, format=LOG_FORMAT, force=True)
+
+    if args.path != "-" and not Path(args.path).exists():
+        sys.exit(f"No such file: {args.path}")
+    initialize_all_databases()
+    start_warmup()  # Models load while the first chunk's rule hits are resolved
+
+    source = sys.stdin if args.path == "-" else open(args.path, encoding="utf-8")
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        run(source, out, batch_size=max(1, args.batch_size), use_llm=not args.no_llm, learn=not args.no_learn)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""Offline benchmarks with deterministic stand-in models (see benchmarks/run.py)."""
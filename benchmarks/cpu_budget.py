@@ -0,0 +1,194 @@
+# benchmarks/cpu_budget.py
+"""
+Sweep the CPU budget (see cpu_budget.py) and report the best split for this host.
+
+    python -m benchmarks.cpu_budget
+    python -m benchmarks.cpu_budget --embed-cores 0 2 4 --pin both --n-batch 256 512
+
+Each setting runs in its own subprocess (torch thread counts and CPU masks
+can only be set once per process) with the real models, and measures:
+  tok/s, first token   LLM generation alone
+  embed p50            single-text embeddings alone
+  under load           both again while the other engine is busy
+The recommended setting has the best LLM throughput under load among those
+whose embedding latency under load is within --embed-slack of the best.
+--stand-ins swaps in the benchmark stand-in models to check the plumbing;
+their numbers say nothing about the host.
+"""
+
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+PROMPT = "Explain in a few sentences why the sky is blue."
+
+
+def configure(setting: dict):
+    """Apply one sweep setting to config. Must run before llm/memory are imported."""
+    import config
+
+    config.CPU_BUDGET_EMBED_CORES = setting["embed_cores"]
+    config.CPU_BUDGET_PIN = setting["pin"]
+    config.LLM_N_BATCH = setting["n_batch"]
+    config.LLM_PREFIX_CACHE_PATH = None  # Keep the sweep from overwriting the saved prefix state
+
+
+def _embed_latencies(embed_one, count: int = 50, until: threading.Event = None) -> np.ndarray:
+    """Time single-text embeddings: `count` of them, or with `until` as many as fit before it is set."""
+    latencies = []
+    while (until is None and len(latencies) < count) or (until is not None and not until.is_set()):
+        text = f"benchmark sentence number {len(latencies)} about the weather today"
+        started = time.perf_counter()
+        embed_one(text)
+        latencies.append(time.perf_counter() - started)
+    return np.array(latencies)
+
+
+def _p50_ms(latencies: np.ndarray) -> float:
+    return float(np.percentile(latencies, 50) * 1000) if latencies.size else float("nan")
+
+
+def _generate(llm, max_tokens: int) -> dict:
+    started = time.perf_counter()
+    first = None
+    tokens = 0
+    for _ in llm.llm_stream_response(PROMPT, max_tokens=max_tokens, timeout=600):
+        if first is None:
+            first = time.perf_counter()
+        tokens += 1
+    finished = time.perf_counter()
+    generating = finished - (first or finished)
+    return {
+        "tokens": tokens,
+        "first_token_ms": ((first or finished) - started) * 1000,
+        "tok_s": (tokens - 1) / generating if tokens > 1 and generating > 0 else 0.0,
+    }
+
+
+def run_setting(setting: dict, max_tokens: int, embeds: int, stand_ins: bool) -> dict:
+    configure(setting)
+    if stand_ins:
+        from benchmarks.stand_ins import HashEmbedder, FakeLlama, install
+        install(embedder=HashEmbedder(latency_ms=2), llama=FakeLlama())
+    import cpu_budget
+    import llm
+    import memory
+
+    if memory.embedding_model.get() is None:
+        raise RuntimeError(f"Embedding model not loaded: {memory.embedding_model.error}")
+    if llm.llm_model.get() is None:
+        raise RuntimeError(f"LLM not loaded: {llm.llm_model.error}")
+    # The batcher thread is where the app embeds (and what CPU_BUDGET_PIN pins)
+    if memory.embedding_batcher is not None:
+        embed_one = memory.embedding_batcher.embed
+    else:
+        embed_one = lambda text: memory._encode_batch([text])
+
+    _generate(llm, 8)  # Warm up both engines
+    _embed_latencies(embed_one, count=5)
+
+    alone = _generate(llm, max_tokens)
+    embed_alone = _embed_latencies(embed_one, count=embeds)
+
+    # Both at once: embed continuously while one answer is generated
+    stop = threading.Event()
+    loaded = {}
+    embedder = threading.Thread(target=lambda: loaded.update(latencies=_embed_latencies(embed_one, until=stop)))
+    embedder.start()
+    try:
+        contended = _generate(llm, max_tokens)
+    finally:
+        stop.set()
+        embedder.join()
+
+    return {
+        **setting,
+        "budget": cpu_budget.describe(),
+        "tok_s": alone["tok_s"],
+        "first_token_ms": alone["first_token_ms"],
+        "embed_p50_ms": _p50_ms(embed_alone),
+        "loaded_tok_s": contended["tok_s"],
+        "loaded_first_token_ms": contended["first_token_ms"],
+        "loaded_embed_p50_ms": _p50_ms(loaded.get("latencies", np.array([]))),
+    }
+
+
+def sweep_settings(args) -> list:
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+    embed_cores = args.embed_cores or sorted({0, 1, 2, cpus // 4, cpus // 2})
+    pins = {"off": [False], "on": [True], "both": [False, True]}[args.pin]
+    settings = []
+    for cores in embed_cores:
+        if cores >= cpus:
+            continue
+        for pin in pins if cores else [False]:
+            for n_batch in args.n_batch or [None]:
+                settings.append({"embed_cores": cores, "pin": pin, "n_batch": n_batch})
+    return settings
+
+
+def recommend(results: list, slack: float) -> dict:
+    """Best loaded LLM throughput among settings whose loaded embedding latency is within `slack` of the best."""
+    measured = [result for result in results if not np.isnan(result["loaded_embed_p50_ms"])] or results
+    best_embed = min(result["loaded_embed_p50_ms"] for result in measured)
+    eligible = [result for result in measured if not result["loaded_embed_p50_ms"] > best_embed * slack]
+    return max(eligible, key=lambda result: result["loaded_tok_s"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep the LLM/embedding CPU split and report the best one.")
+    parser.add_argument("--embed-cores", type=int, nargs="+", help="CPU_BUDGET_EMBED_CORES values (default: a spread)")
+    parser.add_argument("--pin", choices=["off", "on", "both"], default="both", help="CPU_BUDGET_PIN values")
+    parser.add_argument("--n-batch", type=int, nargs="+", help="LLM_N_BATCH values (default: llama.cpp's)")
+    parser.add_argument("--max-tokens", type=int, default=64, help="tokens generated per measurement")
+    parser.add_argument("--embeds", type=int, default=50, help="embeddings timed per measurement")
+    parser.add_argument("--embed-slack", type=float, default=1.5)
+    parser.add_argument("--stand-ins", action="store_true", help="use the stand-in models (plumbing check only)")
+    parser.add_argument("--output", type=Path, help="write JSON results here")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level, format='%(asctime)s [%(levelname)s] %(message)s', force=True)
+
+    if args.worker:
+        print(json.dumps(run_setting(json.loads(args.worker), args.max_tokens, args.embeds, args.stand_ins)))
+        return
+
+    results = []
+    for setting in sweep_settings(args):
+        cmd = [sys.executable, "-m", "benchmarks.cpu_budget", "--worker", json.dumps(setting),
+               "--max-tokens", str(args.max_tokens), "--embeds", str(args.embeds), "--log-level", args.log_level]
+        if args.stand_ins:
+            cmd.append("--stand-ins")
+        proc = subprocess.run(cmd, cwd=ROOT, capture_output=True, text=True)
+        if proc.returncode != 0:
+            logging.error(f"Setting {setting} failed:\n{proc.stderr}")
+            continue
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        results.append(result)
+        print(f"embed_cores={result['embed_cores']:<3} pin={str(result['pin']):<5} n_batch={str(result['n_batch']):<5} "
+              f"tok/s={result['tok_s']:6.1f} first={result['first_token_ms']:7.1f}ms "
+              f"embed p50={result['embed_p50_ms']:6.2f}ms | under load: tok/s={result['loaded_tok_s']:6.1f} "
+              f"embed p50={result['loaded_embed_p50_ms']:6.2f}ms", flush=True)
+
+    if not results:
+        sys.exit("No setting could be measured.")
+    best = recommend(results, args.embed_slack)
+    print(f"\nRecommended for config.py ({best['budget']}):")
+    print(f"CPU_BUDGET_EMBED_CORES = {best['embed_cores']}")
+    print(f"CPU_BUDGET_PIN = {best['pin']}")
+    print(f"LLM_N_BATCH = {best['n_batch']}")
+    if args.output:
+        args.output.write_text(json.dumps({"results": results, "recommended": best}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
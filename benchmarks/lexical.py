@@ -0,0 +1,115 @@
+# benchmarks/lexical.py
+"""
+Full-text (FTS5) matching versus pure vector search.
+
+    python -m benchmarks.lexical --size 100000 --queries 1000
+
+Runs three lookups over the synthetic memory (see benchmarks/run.py):
+  vector     find_best_match over the whole index
+  prefilter  find_best_match scoring only the BM25 candidates (LEXICAL_PREFILTER_*)
+  lexical    find_best_lexical_match, the mode used without an embedding model
+Half the queries are near-duplicates of a stored input (recall: the source
+row is matched above the threshold), half are unrelated (false matches);
+latency is also reported per half, since a prefilter miss falls back to the
+full scan.
+Agreement is measured against the vector run. The stand-in embedder hashes
+words, so its vectors are themselves lexical; quality numbers only become
+meaningful with the real model.
+"""
+
+import argparse
+import json
+import logging
+import time
+from pathlib import Path
+import numpy as np
+from benchmarks.run import DEFAULT_DATA_DIR, configure, prepare_data
+
+
+def run(size: int, queries: int, data_dir: Path, candidates: int) -> list:
+    prepare_data(size, data_dir)
+    configure(data_dir / str(size))
+
+    from benchmarks import synthetic
+    from benchmarks.stand_ins import HashEmbedder, install
+    import memory
+    from config import SIMILARITY_THRESHOLD, LEXICAL_THRESHOLD
+
+    embedder = HashEmbedder()
+    install(embedder=embedder)
+    vocabulary = synthetic.make_vocabulary()
+    stored = list(dict.fromkeys(synthetic.make_texts(vocabulary, size, seed=2)))
+    rng = np.random.default_rng(0)
+    sources = [stored[i] for i in rng.choice(len(stored), size=queries // 2)]
+    near = [" ".join(text.split()[1:]) for text in sources]
+    fresh = synthetic.make_texts(vocabulary, queries - len(near), seed=99)
+    texts = near + fresh
+    vectors = synthetic.embed_texts(embedder, texts)
+
+    memory.ensure_table()  # Builds the FTS index for a data dir created before it existed
+    memory.get_index()
+    memory.LEXICAL_PREFILTER_CANDIDATES = candidates
+
+    def vector(i):
+        memory.LEXICAL_PREFILTER_MIN_ROWS = 0
+        return memory.find_best_match(vectors[i])
+
+    def prefilter(i):
+        memory.LEXICAL_PREFILTER_MIN_ROWS = 1
+        return memory.find_best_match(vectors[i], text=texts[i])
+
+    def lexical(i):
+        return memory.find_best_lexical_match(texts[i])
+
+    runs = [("vector", vector, SIMILARITY_THRESHOLD), ("prefilter", prefilter, SIMILARITY_THRESHOLD),
+            ("lexical", lexical, LEXICAL_THRESHOLD)]
+    baseline = None
+    report = []
+    for name, lookup, threshold in runs:
+        latencies = np.empty(len(texts))
+        matches = []
+        for i in range(len(texts)):
+            started = time.perf_counter()
+            matches.append(lookup(i))
+            latencies[i] = time.perf_counter() - started
+        decisions = [m["input"] if m and m["score"] >= threshold else None for m in matches]
+        if baseline is None:
+            baseline = decisions
+
+        result = {
+            "mode": name,
+            "threshold": threshold,
+            "p50_ms": float(np.percentile(latencies, 50) * 1000),
+            "p95_ms": float(np.percentile(latencies, 95) * 1000),
+            "near_p50_ms": float(np.percentile(latencies[:len(near)], 50) * 1000),
+            "fresh_p50_ms": float(np.percentile(latencies[len(near):], 50) * 1000) if fresh else 0.0,
+            "recall": float(np.mean([d == s for d, s in zip(decisions, sources)])),
+            "false_match_rate": float(np.mean([d is not None for d in decisions[len(near):]])) if fresh else 0.0,
+            "decision_agreement": float(np.mean([a == b for a, b in zip(decisions, baseline)])),
+        }
+        report.append(result)
+        print(f"{name:>10} p50={result['p50_ms']:7.3f}ms p95={result['p95_ms']:7.3f}ms "
+              f"(near {result['near_p50_ms']:7.3f}ms, fresh {result['fresh_p50_ms']:7.3f}ms)  "
+              f"recall={result['recall']:.4f} false={result['false_match_rate']:.4f} "
+              f"agreement={result['decision_agreement']:.4f}", flush=True)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Full-text matching vs. vector search: latency and match quality.")
+    parser.add_argument("--size", type=int, default=100000, help="rows in the synthetic memory DB")
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--candidates", type=int, default=256, help="BM25 candidates scored by the prefilter")
+    parser.add_argument("--data-dir", type=Path, default=DEFAULT_DATA_DIR)
+    parser.add_argument("--output", type=Path, help="write JSON results here")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level, format='%(asctime)s [%(levelname)s] %(message)s', force=True)
+
+    report = run(args.size, args.queries, args.data_dir, args.candidates)
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
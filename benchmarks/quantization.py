@@ -0,0 +1,96 @@
+# benchmarks/quantization.py
+"""
+Memory saved by a reduced-precision index versus agreement with float32.
+
+    python -m benchmarks.quantization --size 100000 --queries 1000
+
+Runs find_best_match on the synthetic vector memory (see benchmarks/run.py)
+once per VECTOR_INDEX_DTYPE, with and without re-ranking, and compares the
+best match and the SIMILARITY_THRESHOLD decision with the float32 run.
+"""
+
+import argparse
+import json
+import logging
+import time
+from pathlib import Path
+import numpy as np
+from benchmarks.run import DEFAULT_DATA_DIR, configure, prepare_data
+
+
+def run(size: int, queries: int, data_dir: Path, rerank_candidates: int) -> list:
+    prepare_data(size, data_dir)
+    configure(data_dir / str(size))
+
+    from benchmarks import synthetic
+    from benchmarks.stand_ins import HashEmbedder, install
+    import memory
+    from config import SIMILARITY_THRESHOLD
+
+    embedder = HashEmbedder()
+    install(embedder=embedder)
+    vocabulary = synthetic.make_vocabulary()
+    stored = list(dict.fromkeys(synthetic.make_texts(vocabulary, size, seed=2)))
+    rng = np.random.default_rng(0)
+    # Half near-duplicates of stored inputs (should match), half unrelated sentences
+    near = [" ".join(stored[i].split()[1:]) for i in rng.choice(len(stored), size=queries // 2)]
+    fresh = synthetic.make_texts(vocabulary, queries - len(near), seed=99)
+    vectors = synthetic.embed_texts(embedder, near + fresh)
+
+    runs = [("float32", 1), ("float16", 1), ("float16", rerank_candidates), ("int8", 1), ("int8", rerank_candidates)]
+    baseline = None
+    report = []
+    for dtype, candidates in runs:
+        memory.VECTOR_INDEX_DTYPE = dtype
+        memory.VECTOR_RERANK_CANDIDATES = candidates
+        memory._index = None
+        index = memory.get_index()
+
+        latencies = np.empty(len(vectors))
+        matches = []
+        for i, vector in enumerate(vectors):
+            started = time.perf_counter()
+            matches.append(memory.find_best_match(vector))
+            latencies[i] = time.perf_counter() - started
+        ids = [m["id"] if m else None for m in matches]
+        scores = np.array([m["score"] if m else -1.0 for m in matches])
+        decisions = [i if s >= SIMILARITY_THRESHOLD else None for i, s in zip(ids, scores)]
+        if baseline is None:
+            baseline = (ids, scores, decisions)
+
+        result = {
+            "dtype": dtype,
+            "rerank_candidates": candidates if dtype != "float32" else 0,
+            "index_mb": index.nbytes / 2 ** 20,
+            "p50_ms": float(np.percentile(latencies, 50) * 1000),
+            "p95_ms": float(np.percentile(latencies, 95) * 1000),
+            "top1_agreement": float(np.mean([a == b for a, b in zip(ids, baseline[0])])),
+            "decision_agreement": float(np.mean([a == b for a, b in zip(decisions, baseline[2])])),
+            "max_score_error": float(np.max(np.abs(scores - baseline[1]))),
+        }
+        report.append(result)
+        print(f"{dtype:>8} rerank={result['rerank_candidates']:<3} index={result['index_mb']:8.1f}MB  "
+              f"p50={result['p50_ms']:7.3f}ms p95={result['p95_ms']:7.3f}ms  "
+              f"top1={result['top1_agreement']:.4f} decision={result['decision_agreement']:.4f} "
+              f"max|score err|={result['max_score_error']:.5f}", flush=True)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quantized index memory vs. match agreement with float32.")
+    parser.add_argument("--size", type=int, default=100000, help="rows in the synthetic memory DB")
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--rerank-candidates", type=int, default=8)
+    parser.add_argument("--data-dir", type=Path, default=DEFAULT_DATA_DIR)
+    parser.add_argument("--output", type=Path, help="write JSON results here")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level, format='%(asctime)s [%(levelname)s] %(message)s', force=True)
+
+    report = run(args.size, args.queries, args.data_dir, args.rerank_candidates)
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+# benchmarks/run.py
+"""
+Offline benchmarks for every tier, using deterministic stand-in models.
+
+    python -m benchmarks.run --sizes 1000 10000 100000 --output bench.json
+    python -m benchmarks.run --compare old.json new.json
+
+Each (tier, size) runs in its own subprocess so peak RSS is per tier.
+Synthetic DBs are generated once per size under --data-dir and reused.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+ROOT = Path(__file__).resolve().parent.parent
+TIERS = ["rules", "embed", "vector_search", "check_vector_memory", "save_to_memory", "handle_input", "batch"]
+MUTATING_TIERS = {"save_to_memory", "handle_input", "batch"}  # run against a scratch copy of the DBs
+BATCH_SIZE = 64  # Prompts per run_batch call in the "batch" tier
+DEFAULT_DATA_DIR = ROOT / "bench_data"
+
+
+def configure(workdir: Path):
+    """Point config at the benchmark DBs. Must run before any app module is imported."""
+    import config
+
+    config.RULES_DB_PATH = workdir / "rules.db"
+    config.VECTOR_MEMORY_DB_PATH = workdir / "vector_memory.db"
+    config.IVF_INDEX_PATH = workdir / "vector_memory.ivf.npz"
+    config.VECTOR_SEGMENT_PATH = workdir / "vector_memory.vseg"
+    config.LLM_PREFIX_CACHE_PATH = None
+
+
+def peak_rss_mb() -> float:
+    if resource is None:
+        return float("nan")
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def measure(op, items, warmup: int = 10) -> dict:
+    """Time op(item) for each item; the first `warmup` calls are not recorded."""
+    for item in items[:warmup]:
+        op(item)
+    items = items[warmup:]
+    latencies = np.empty(len(items))
+    started = time.perf_counter()
+    for i, item in enumerate(items):
+        t0 = time.perf_counter()
+        op(item)
+        latencies[i] = time.perf_counter() - t0
+    elapsed = time.perf_counter() - started
+    p50, p95, p99 = np.percentile(latencies * 1000, [50, 95, 99])
+    return {
+        "n": len(items),
+        "mean_ms": float(latencies.mean() * 1000),
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+        "throughput_per_s": len(items) / elapsed if elapsed else float("inf"),
+    }
+
+
+def prepare_data(size: int, data_dir: Path):
+    """Create the synthetic DBs for this size unless they already exist (runs in its own subprocess)."""
+    workdir = data_dir / str(size)
+    workdir.mkdir(parents=True, exist_ok=True)
+    marker = workdir / "complete"
+    if marker.exists():
+        return
+    for name in ("rules.db", "vector_memory.db", "vector_memory.ivf.npz", "vector_memory.vseg"):
+        (workdir / name).unlink(missing_ok=True)
+    configure(workdir)
+
+    from benchmarks import synthetic
+    from benchmarks.stand_ins import HashEmbedder
+    import rules
+    import memory
+
+    rules.create_or_fix_rules_table()
+    memory.ensure_table()
+    synthetic.generate(size, workdir / "rules.db", workdir / "vector_memory.db", HashEmbedder())
+    marker.write_text(str(size))
+
+
+def run_tier(tier: str, size: int, data_dir: Path, queries: int, llm_token_ms: float) -> dict:
+    """Benchmark one tier in this process (called in the worker subprocess)."""
+    workdir = data_dir / str(size)
+    scratch = None
+    if tier in MUTATING_TIERS:
+        scratch = Path(tempfile.mkdtemp(prefix="neurochat-bench-"))
+        for name in ("rules.db", "vector_memory.db"):
+            shutil.copy(workdir / name, scratch / name)
+    configure(scratch or workdir)
+    try:
+        return _run_tier(tier, size, queries, llm_token_ms)
+    finally:
+        if scratch is not None:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+
+def _run_tier(tier: str, size: int, queries: int, llm_token_ms: float) -> dict:
+    from benchmarks import synthetic
+    from benchmarks.stand_ins import HashEmbedder, FakeLlama, install
+
+    embedder = HashEmbedder()
+    install(embedder=embedder, llama=FakeLlama(token_ms=llm_token_ms))
+
+    import db_init
+    import memory
+    import rules
+    import handlers
+    import pipeline
+
+    db_init.initialize_all_databases()
+    vocabulary = synthetic.make_vocabulary()
+    rule_inputs = synthetic.make_texts(vocabulary, size, seed=1)
+    memory_inputs = list(dict.fromkeys(synthetic.make_texts(vocabulary, size, seed=2)))
+    rng = np.random.default_rng(42)
+    fresh = synthetic.make_texts(vocabulary, queries + 20, seed=1000 + size)
+
+    def near(texts):
+        # Stored inputs with one word dropped: should still match in vector memory
+        picks = rng.choice(len(texts), size=min(len(texts), queries + 20), replace=len(texts) < queries + 20)
+        return [" ".join(texts[i].split()[1:]) for i in picks]
+
+    setup_started = time.perf_counter()
+    if tier == "rules":
+        rules.check_rules("warm up")
+        hits = [rule_inputs[i] for i in rng.choice(len(rule_inputs), size=(queries + 20) // 2)]
+        items = [q for pair in zip(hits, fresh) for q in pair]
+        op = rules.check_rules
+    elif tier == "embed":
+        memory.embed("warm up")
+        items = fresh
+        op = memory.embed
+    elif tier == "vector_search":
+        memory.get_index()
+        items = list(synthetic.embed_texts(embedder, near(memory_inputs)))
+        op = memory.find_best_match
+    elif tier == "check_vector_memory":
+        memory.get_index()
+        items = near(memory_inputs)
+        op = memory.check_vector_memory
+    elif tier == "save_to_memory":
+        memory.get_index()
+        items = [f"new {text}" for text in fresh]
+        op = lambda text: memory.save_to_memory(text, "benchmark answer")
+    elif tier == "handle_input":
+        memory.get_index()
+        rules.check_rules("warm up")
+        third = (queries + 20) // 3 + 1
+        hits = [rule_inputs[i] for i in rng.choice(len(rule_inputs), size=third)]
+        items = [q for triple in zip(hits, near(memory_inputs)[:third], fresh[:third]) for q in triple]
+        op = handlers.handle_input
+    elif tier == "batch":
+        # The handle_input mix, answered BATCH_SIZE prompts per call
+        memory.get_index()
+        rules.check_rules("warm up")
+        third = (queries + 20) // 3 + 1
+        hits = [rule_inputs[i] for i in rng.choice(len(rule_inputs), size=third)]
+        mix = [q for triple in zip(hits, near(memory_inputs)[:third], fresh[:third]) for q in triple]
+        items = [mix[start:start + BATCH_SIZE] for start in range(0, len(mix), BATCH_SIZE)]
+        op = pipeline.default_pipeline.run_batch
+    else:
+        raise ValueError(f"Unknown tier '{tier}'")
+    setup_seconds = time.perf_counter() - setup_started
+
+    result = measure(op, items, warmup=1 if tier == "batch" else 10)
+    if tier == "batch":
+        # Latencies are per call; throughput is reported per prompt like the other tiers
+        result["throughput_per_s"] *= BATCH_SIZE
+        result["batch_size"] = BATCH_SIZE
+    # Queued saves must land before a scratch copy is deleted; for the write tiers the time
+    # this takes is the commit delay the per-call latencies above do not include
+    flush_started = time.perf_counter()
+    memory.flush_writes()
+    if tier in MUTATING_TIERS:
+        flush_seconds = time.perf_counter() - flush_started
+        timed_seconds = result["n"] / result["throughput_per_s"] * (BATCH_SIZE if tier == "batch" else 1)
+        result["flush_ms"] = flush_seconds * 1000
+        result["committed_per_s"] = result["throughput_per_s"] * timed_seconds / (timed_seconds + flush_seconds)
+    result.update({"tier": tier, "size": size, "setup_s": setup_seconds, "peak_rss_mb": peak_rss_mb()})
+    return result
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT, text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+
+def run_all(args) -> dict:
+    results = []
+    for size in args.sizes:
+        prep = subprocess.run([sys.executable, "-m", "benchmarks.run", "--prepare", "--size", str(size),
+                               "--data-dir", str(args.data_dir), "--log-level", args.log_level], cwd=ROOT)
+        if prep.returncode != 0:
+            logging.error(f"Could not generate synthetic data for size {size}")
+            continue
+        for tier in args.tiers:
+            cmd = [sys.executable, "-m", "benchmarks.run", "--worker", tier, "--size", str(size),
+                   "--data-dir", str(args.data_dir), "--queries", str(args.queries),
+                   "--llm-token-ms", str(args.llm_token_ms), "--log-level", args.log_level]
+            proc = subprocess.run(cmd, cwd=ROOT, capture_output=True, text=True)
+            if proc.returncode != 0:
+                logging.error(f"{tier} @ {size} failed:\n{proc.stderr}")
+                continue
+            result = json.loads(proc.stdout.strip().splitlines()[-1])
+            results.append(result)
+            print(f"{tier:>20} {size:>9}  p50={result['p50_ms']:9.3f}ms  p95={result['p95_ms']:9.3f}ms  "
+                  f"p99={result['p99_ms']:9.3f}ms  {result['throughput_per_s']:10.1f}/s  "
+                  f"rss={result['peak_rss_mb']:8.1f}MB"
+                  + (f"  flush={result['flush_ms']:.1f}ms ({result['committed_per_s']:.1f}/s committed)"
+                     if "flush_ms" in result else ""), flush=True)
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "queries": args.queries,
+        },
+        "results": results,
+    }
+
+
+def compare(old_path: Path, new_path: Path, threshold: float = 0.10) -> int:
+    """Print p50/p95 changes between two result files. Returns the number of regressions."""
+    old = {(r["tier"], r["size"]): r for r in json.loads(Path(old_path).read_text())["results"]}
+    new = {(r["tier"], r["size"]): r for r in json.loads(Path(new_path).read_text())["results"]}
+    regressions = 0
+    for key in sorted(old.keys() & new.keys()):
+        line = f"{key[0]:>20} {key[1]:>9}"
+        for metric in ("p50_ms", "p95_ms"):
+            before, after = old[key][metric], new[key][metric]
+            change = (after - before) / before if before else 0.0
+            flag = ""
+            if change > threshold:
+                flag = " REGRESSION"
+                regressions += 1
+            line += f"  {metric}: {before:.3f} -> {after:.3f} ({change:+.1%}){flag}"
+        print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline per-tier benchmarks with stand-in models.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="rows in the synthetic rules/memory DBs (e.g. 1000 10000 100000 1000000)")
+    parser.add_argument("--tiers", nargs="+", choices=TIERS, default=TIERS)
+    parser.add_argument("--queries", type=int, default=1000, help="measured calls per tier")
+    parser.add_argument("--data-dir", type=Path, default=DEFAULT_DATA_DIR, help="where synthetic DBs are kept")
+    parser.add_argument("--llm-token-ms", type=float, default=5.0, help="stand-in LLM latency per token")
+    parser.add_argument("--output", type=Path, help="write JSON results here")
+    parser.add_argument("--compare", type=Path, nargs=2, metavar=("OLD", "NEW"), help="compare two result files")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--prepare", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--worker", choices=TIERS, help=argparse.SUPPRESS)
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level, format='%(asctime)s [%(levelname)s] %(message)s')
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare) else 0)
+    if args.prepare:
+        prepare_data(args.size, args.data_dir)
+        return
+    if args.worker:
+        print(json.dumps(run_tier(args.worker, args.size, args.data_dir, args.queries, args.llm_token_ms)))
+        return
+
+    report = run_all(args)
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+        print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
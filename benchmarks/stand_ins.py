@@ -0,0 +1,113 @@
+# benchmarks/stand_ins.py
+
+import hashlib
+import time
+import numpy as np
+
+DIM = 384
+
+
+class HashEmbedder:
+    """
+    Deterministic stand-in for SentenceTransformer.
+    Each lowercase word maps to a fixed pseudo-random unit vector (seeded from
+    its hash); a text embeds to the normalized sum of its word vectors, so texts
+    that share words are similar, as with a real embedding model.
+    """
+
+    def __init__(self, dim: int = DIM, latency_ms: float = 0.0):
+        self.dim = dim
+        self.latency = latency_ms / 1000
+        self._words = {}
+
+    def word_vector(self, word: str) -> np.ndarray:
+        vector = self._words.get(word)
+        if vector is None:
+            seed = int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+            vector = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+            vector /= np.linalg.norm(vector)
+            self._words[word] = vector
+        return vector
+
+    def _encode_one(self, text: str) -> np.ndarray:
+        words = text.lower().split()
+        if not words:
+            return np.zeros(self.dim, dtype=np.float32)
+        vector = np.sum([self.word_vector(w) for w in words], axis=0)
+        return (vector / np.linalg.norm(vector)).astype(np.float32)
+
+    def encode(self, texts, batch_size: int = 32, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        if isinstance(texts, str):
+            return self._encode_one(texts)
+        if len(texts) == 0:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.stack([self._encode_one(t) for t in texts])
+
+
+class FakeLlamaState:
+    def __init__(self, input_ids: list):
+        self.input_ids = input_ids
+
+
+class FakeLlama:
+    """
+    Stand-in for llama_cpp.Llama: returns a canned answer after a fixed
+    prompt-evaluation delay plus a fixed delay per generated token.
+    Supports the calls llm.py makes (streaming, tokenize/eval, save/load_state).
+    """
+
+    def __init__(self, prompt_ms: float = 20.0, token_ms: float = 5.0, answer_tokens: int = 24):
+        self.prompt_latency = prompt_ms / 1000
+        self.token_latency = token_ms / 1000
+        self.answer_tokens = answer_tokens
+        self.n_tokens = 0
+        self.input_ids = []
+
+    def n_ctx(self) -> int:
+        return 512
+
+    def tokenize(self, text: bytes, add_bos: bool = True, special: bool = False):
+        return list(range(len(text.split()) + int(add_bos)))
+
+    def reset(self):
+        self.n_tokens = 0
+        self.input_ids = []
+
+    def eval(self, tokens):
+        time.sleep(self.prompt_latency)
+        self.input_ids = self.input_ids[:self.n_tokens] + list(tokens)
+        self.n_tokens = len(self.input_ids)
+
+    def save_state(self):
+        return FakeLlamaState(self.input_ids[:self.n_tokens])
+
+    def load_state(self, state):
+        self.input_ids = list(state.input_ids)
+        self.n_tokens = len(self.input_ids)
+
+    def _pieces(self, prompt: str, max_tokens: int):
+        time.sleep(self.prompt_latency)
+        question = prompt.rsplit("User:", 1)[-1].split("\n", 1)[0].strip()
+        words = f"Here is a canned answer about {question} for benchmarking".split()
+        for i in range(min(self.answer_tokens, max_tokens)):
+            time.sleep(self.token_latency)
+            yield {"choices": [{"text": " " + words[i % len(words)]}]}
+
+    def __call__(self, prompt: str, max_tokens: int = 16, stop=None, echo: bool = False, stream: bool = False, **kwargs):
+        self.input_ids = self.tokenize(prompt.encode("utf-8"))
+        self.n_tokens = len(self.input_ids)
+        pieces = self._pieces(prompt, max_tokens)
+        if stream:
+            return pieces
+        return {"choices": [{"text": "".join(p["choices"][0]["text"] for p in pieces)}]}
+
+
+def install(embedder=None, llama=None):
+    """Swap the stand-ins into the lazy model handles used by memory.py and llm.py."""
+    import memory
+    import llm
+
+    memory.embedding_model.override(embedder or HashEmbedder())
+    llm.llm_model.override(llama or FakeLlama())
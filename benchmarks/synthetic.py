@@ -0,0 +1,78 @@
+# benchmarks/synthetic.py
+
+import logging
+import sqlite3
+import numpy as np
+
+LETTERS = np.array(list("abcdefghijklmnopqrstuvwxyz"))
+
+
+def make_vocabulary(size: int = 5000, seed: int = 7) -> list:
+    """Deterministic pseudo-words, distinct from each other."""
+    rng = np.random.default_rng(seed)
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(LETTERS, size=int(rng.integers(3, 9)))))
+    return sorted(words)
+
+
+def make_texts(vocabulary: list, count: int, seed: int, min_words: int = 4, max_words: int = 10) -> list:
+    """`count` random sentences drawn from the vocabulary."""
+    rng = np.random.default_rng(seed)
+    lengths = rng.integers(min_words, max_words + 1, size=count)
+    ids = rng.integers(0, len(vocabulary), size=int(lengths.sum()))
+    texts = []
+    pos = 0
+    for length in lengths:
+        texts.append(" ".join(vocabulary[i] for i in ids[pos:pos + length]))
+        pos += length
+    return texts
+
+
+def embed_texts(embedder, texts: list, chunk_size: int = 10000) -> np.ndarray:
+    """Vectorized HashEmbedder encoding for large synthetic sets."""
+    out = np.empty((len(texts), embedder.dim), dtype=np.float32)
+    for start in range(0, len(texts), chunk_size):
+        chunk = texts[start:start + chunk_size]
+        words = [t.split() for t in chunk]
+        flat = [w for ws in words for w in ws]
+        vectors = np.stack([embedder.word_vector(w) for w in flat])
+        offsets = np.cumsum([0] + [len(ws) for ws in words[:-1]])
+        sums = np.add.reduceat(vectors, offsets, axis=0)
+        out[start:start + len(chunk)] = sums / np.linalg.norm(sums, axis=1, keepdims=True)
+    return out
+
+
+def generate(size: int, rules_db, memory_db, embedder, keyword_rules: int = 50, batch_size: int = 10000):
+    """
+    Fill rules_db and memory_db (tables must already exist) with `size` rows each.
+    Rules are exact-match inputs plus a few keyword rules; memory rows carry
+    float32 vector BLOBs from the embedder.
+    """
+    vocabulary = make_vocabulary()
+
+    rule_inputs = make_texts(vocabulary, size, seed=1)
+    with sqlite3.connect(rules_db) as conn:
+        conn.executemany(
+            "INSERT INTO rules (input, response, tags) VALUES (?, ?, ?)",
+            ((text, f"rule answer {i}", None) for i, text in enumerate(rule_inputs))
+        )
+        conn.executemany(
+            "INSERT INTO rules (input, response, tags) VALUES (?, ?, ?)",
+            ((f"kw{i}", f"keyword answer {i}", "keyword") for i in range(keyword_rules))
+        )
+        conn.commit()
+    logging.info(f"Generated {size} rules in {rules_db}")
+
+    memory_inputs = list(dict.fromkeys(make_texts(vocabulary, size, seed=2)))
+    with sqlite3.connect(memory_db) as conn:
+        for start in range(0, len(memory_inputs), batch_size):
+            chunk = memory_inputs[start:start + batch_size]
+            vectors = embed_texts(embedder, chunk)
+            conn.executemany(
+                "INSERT OR IGNORE INTO memory (input, response, vector) VALUES (?, ?, ?)",
+                ((text, f"memory answer for {text}", vec.tobytes()) for text, vec in zip(chunk, vectors))
+            )
+            conn.commit()
+    logging.info(f"Generated {len(memory_inputs)} memory rows in {memory_db}")
+    return vocabulary, rule_inputs, memory_inputs
@@ -0,0 +1,250 @@
+# compact.py
+"""
+Offline compaction of vector memory (stop the chatbot first).
+
+    python compact.py --dry-run
+    python compact.py --similarity 0.95 --capacity 100000 --policy lfu
+
+Inputs whose embeddings are at least --similarity alike are grouped, and only
+the most used entry of each group is kept (most hits, then most recently used).
+It inherits the group's hits and latest last_used. The table can then be
+trimmed to --capacity with the LRU/LFU eviction policy. In segment storage mode
+the segment file is rewritten without the removed rows.
+"""
+
+import argparse
+import logging
+import os
+import numpy as np
+from config import (
+    VECTOR_MEMORY_DB_PATH, VECTOR_DIM, VECTOR_STORAGE, VECTOR_SEGMENT_PATH, VECTOR_SEGMENT_DTYPE,
+    COMPACT_SIMILARITY, MEMORY_CAPACITY, MEMORY_EVICTION_POLICY,
+)
+from db import get_connection
+from vector_index import VectorIndex
+from vector_store import VectorSegment, decode_blob
+from ann_index import spherical_kmeans, assign_clusters
+
+
+def load_rows():
+    """Return (ids, hits, last_used, normalized float32 vectors) for every memory row with a vector."""
+    with get_connection(VECTOR_MEMORY_DB_PATH) as conn:
+        if VECTOR_STORAGE == "segment":
+            meta = conn.execute("SELECT id, hits, last_used FROM memory ORDER BY id").fetchall()
+        else:
+            rows = conn.execute(
+                "SELECT id, hits, last_used, vector FROM memory WHERE vector IS NOT NULL ORDER BY id"
+            ).fetchall()
+            meta = [row[:3] for row in rows]
+
+    ids = np.array([row[0] for row in meta], dtype=np.int64)
+    hits = np.array([row[1] for row in meta], dtype=np.int64)
+    last_used = np.array([row[2] for row in meta], dtype=np.float64)
+
+    if VECTOR_STORAGE == "segment":
+        segment = VectorSegment(VECTOR_SEGMENT_PATH, VECTOR_DIM, VECTOR_SEGMENT_DTYPE)
+        positions = {row_id: position for position, row_id in enumerate(segment.ids.tolist())}
+        present = np.array([row_id in positions for row_id in ids.tolist()], dtype=bool)
+        ids, hits, last_used = ids[present], hits[present], last_used[present]
+        vectors = segment.vectors[[positions[row_id] for row_id in ids.tolist()]].astype(np.float32)
+    else:
+        vectors = np.empty((len(rows), VECTOR_DIM), dtype=np.float32)
+        keep = np.ones(len(rows), dtype=bool)
+        for i, row in enumerate(rows):
+            vector = decode_blob(row[3], VECTOR_DIM)
+            if vector.shape[0] != VECTOR_DIM:
+                keep[i] = False
+                continue
+            vectors[i] = VectorIndex.normalize(vector)
+        ids, hits, last_used, vectors = ids[keep], hits[keep], last_used[keep], vectors[keep]
+    return ids, hits, last_used, vectors
+
+
+def _group_partition(vectors: np.ndarray, members: np.ndarray, cutoff: float, representative: np.ndarray,
+                     block_size: int = 1024) -> np.ndarray:
+    """
+    Leader clustering of `members` (in priority order): each row joins the first
+    representative it is at least `cutoff` similar to, or becomes one.
+    Returns the positions of the representatives.
+    """
+    rep_positions = np.empty(len(members), dtype=np.int64)
+    rep_matrix = np.empty((len(members), vectors.shape[1]), dtype=np.float32)
+    n_reps = 0
+    for start in range(0, len(members), block_size):
+        block = members[start:start + block_size]
+        block_vectors = vectors[block]
+        if n_reps:
+            sims = block_vectors @ rep_matrix[:n_reps].T
+            best = np.argmax(sims, axis=1)
+            best_scores = sims[np.arange(len(block)), best]
+        else:
+            best = np.zeros(len(block), dtype=np.int64)
+            best_scores = np.full(len(block), -np.inf, dtype=np.float32)
+        block_reps_start = n_reps
+        for j, position in enumerate(block.tolist()):
+            if best_scores[j] >= cutoff:
+                representative[position] = rep_positions[best[j]]
+                continue
+            # Representatives created earlier in this block were not in the batched product
+            if n_reps > block_reps_start:
+                sims = rep_matrix[block_reps_start:n_reps] @ block_vectors[j]
+                nearest = int(np.argmax(sims))
+                if sims[nearest] >= cutoff:
+                    representative[position] = rep_positions[block_reps_start + nearest]
+                    continue
+            rep_positions[n_reps] = position
+            rep_matrix[n_reps] = block_vectors[j]
+            n_reps += 1
+    return rep_positions[:n_reps]
+
+
+def _nearest_clusters(vectors: np.ndarray, centroids: np.ndarray, probes: int, chunk_size: int = 65536) -> np.ndarray:
+    """The `probes` closest centroids of every row, closest first."""
+    nearest = np.empty((len(vectors), probes), dtype=np.int64)
+    for start in range(0, len(vectors), chunk_size):
+        sims = vectors[start:start + chunk_size] @ centroids.T
+        top = np.argpartition(-sims, probes - 1, axis=1)[:, :probes]
+        order = np.argsort(-np.take_along_axis(sims, top, axis=1), axis=1)
+        nearest[start:start + len(sims)] = np.take_along_axis(top, order, axis=1)
+    return nearest
+
+
+def find_duplicates(vectors: np.ndarray, priority: np.ndarray, cutoff: float, partition_size: int = 2000,
+                    probes: int = 3, seed: int = 0) -> np.ndarray:
+    """
+    Group rows that are at least `cutoff` similar to a group leader, visiting
+    rows in `priority` order; each group then keeps its highest-priority row.
+    Large sets are split into k-means partitions first. A row is grouped within
+    its own partition and also checked against the representatives of its next
+    `probes - 1` closest partitions, so only rare boundary duplicates are missed.
+    Returns, for every row, the position of the row that represents it (itself if kept).
+    """
+    n = len(vectors)
+    representative = np.arange(n)
+    if n <= 2 * partition_size:
+        _group_partition(vectors, priority, cutoff, representative)
+        return representative
+
+    rng = np.random.default_rng(seed)
+    sample = vectors[np.sort(rng.choice(n, size=min(n, 100000), replace=False))]
+    centroids = spherical_kmeans(sample, max(1, n // partition_size), rng=rng)
+    probes = min(probes, len(centroids))
+    nearest = _nearest_clusters(vectors, centroids, probes)
+    home = nearest[:, 0]
+    # Keep priority order inside each partition
+    ordered = priority[np.argsort(home[priority], kind="stable")]
+    bounds = np.searchsorted(home[ordered], np.arange(len(centroids) + 1))
+
+    reps = [None] * len(centroids)  # partition -> (positions, vectors) of its representatives
+    for cluster in range(len(centroids)):
+        members = ordered[bounds[cluster]:bounds[cluster + 1]]
+        best_scores = np.full(len(members), -np.inf, dtype=np.float32)
+        best_reps = np.full(len(members), -1, dtype=np.int64)
+        for probe in range(1, probes):
+            neighbours = nearest[members, probe]
+            for other in np.unique(neighbours).tolist():
+                if reps[other] is None or not len(reps[other][0]):
+                    continue
+                rows = np.flatnonzero(neighbours == other)
+                sims = vectors[members[rows]] @ reps[other][1].T
+                best = np.argmax(sims, axis=1)
+                scores = sims[np.arange(len(rows)), best]
+                better = scores > best_scores[rows]
+                best_scores[rows[better]] = scores[better]
+                best_reps[rows[better]] = reps[other][0][best[better]]
+        matched = best_scores >= cutoff
+        representative[members[matched]] = best_reps[matched]
+        leaders = _group_partition(vectors, members[~matched], cutoff, representative)
+        reps[cluster] = (leaders, vectors[leaders])
+
+    # A group found across partitions may have been led by a lower-priority row
+    rank = np.empty(n, dtype=np.int64)
+    rank[priority] = np.arange(n)
+    best_rank = np.full(n, n, dtype=np.int64)
+    np.minimum.at(best_rank, representative, rank)
+    return priority[best_rank[representative]]
+
+
+def rewrite_segment():
+    """Rewrite the segment file with only the vectors whose memory row still exists."""
+    segment = VectorSegment(VECTOR_SEGMENT_PATH, VECTOR_DIM, VECTOR_SEGMENT_DTYPE)
+    with get_connection(VECTOR_MEMORY_DB_PATH) as conn:
+        live = np.array([row[0] for row in conn.execute("SELECT id FROM memory")], dtype=np.int64)
+    keep = np.flatnonzero(np.isin(segment.ids, live))
+    if len(keep) == len(segment):
+        return 0
+    tmp_path = VECTOR_SEGMENT_PATH.with_suffix(VECTOR_SEGMENT_PATH.suffix + ".tmp")
+    tmp_path.unlink(missing_ok=True)
+    compacted = VectorSegment(tmp_path, VECTOR_DIM, segment.dtype.name)
+    for start in range(0, len(keep), 65536):
+        chunk = keep[start:start + 65536]
+        compacted.append(segment.ids[chunk], segment.vectors[chunk])
+    removed = len(segment) - len(keep)
+    os.replace(tmp_path, VECTOR_SEGMENT_PATH)
+    logging.info(f"Rewrote {VECTOR_SEGMENT_PATH}: {len(keep)} vectors kept, {removed} removed.")
+    return removed
+
+
+def compact(similarity: float = COMPACT_SIMILARITY, capacity: int = MEMORY_CAPACITY,
+            policy: str = MEMORY_EVICTION_POLICY, dry_run: bool = False) -> dict:
+    """Merge near-duplicates, then evict down to `capacity` (0 = no limit). Returns counts."""
+    from memory import ensure_table, evict
+
+    ensure_table()
+    ids, hits, last_used, vectors = load_rows()
+    logging.info(f"Loaded {len(ids)} memory vectors.")
+    # Most hits first, then most recently used, then oldest id
+    priority = np.lexsort((ids, -last_used, -hits))
+    representative = find_duplicates(vectors, priority, similarity)
+
+    merged = np.flatnonzero(representative != np.arange(len(ids)))
+    total_hits = hits.copy()
+    np.add.at(total_hits, representative[merged], hits[merged])
+    latest = last_used.copy()
+    np.maximum.at(latest, representative[merged], last_used[merged])
+    absorbing = np.unique(representative[merged])
+    logging.info(f"{len(merged)} near-duplicates (similarity >= {similarity}) fold into {len(absorbing)} entries.")
+
+    if dry_run:
+        with get_connection(VECTOR_MEMORY_DB_PATH) as conn:
+            for position in merged[:10].tolist():
+                (kept,) = conn.execute("SELECT input FROM memory WHERE id = ?", (int(ids[representative[position]]),)).fetchone()
+                (dropped,) = conn.execute("SELECT input FROM memory WHERE id = ?", (int(ids[position]),)).fetchone()
+                print(f"  '{dropped}'  ->  '{kept}'")
+        return {"rows": len(ids), "merged": len(merged), "evicted": 0}
+
+    with get_connection(VECTOR_MEMORY_DB_PATH) as conn:
+        conn.executemany(
+            "UPDATE memory SET hits = ?, last_used = ? WHERE id = ?",
+            ((int(total_hits[p]), float(latest[p]), int(ids[p])) for p in absorbing.tolist())
+        )
+        conn.executemany("DELETE FROM memory WHERE id = ?", ((int(ids[p]),) for p in merged.tolist()))
+
+    evicted = 0
+    remaining = len(ids) - len(merged)
+    if capacity and remaining > capacity:
+        evicted = evict(remaining - capacity, policy)
+
+    if VECTOR_STORAGE == "segment":
+        rewrite_segment()
+    with get_connection(VECTOR_MEMORY_DB_PATH) as conn:
+        conn.execute("VACUUM")
+    logging.info(f"Compaction done: {len(ids) - len(merged) - evicted} rows kept, "
+                 f"{len(merged)} merged, {evicted} evicted.")
+    return {"rows": len(ids), "merged": len(merged), "evicted": evicted}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge near-duplicate vector memories and trim to a capacity.")
+    parser.add_argument("--similarity", type=float, default=COMPACT_SIMILARITY, help="merge inputs at least this similar")
+    parser.add_argument("--capacity", type=int, default=MEMORY_CAPACITY, help="rows to keep after merging (0 = no limit)")
+    parser.add_argument("--policy", choices=["lru", "lfu"], default=MEMORY_EVICTION_POLICY)
+    parser.add_argument("--dry-run", action="store_true", help="report what would be merged without changing anything")
+    args = parser.parse_args()
+
+    compact(args.similarity, args.capacity, args.policy, dry_run=args.dry_run)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s', force=True)
+    main()
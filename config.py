@@ -1,8 +1,10 @@
 import logging
+import os
 from pathlib import Path
 
 # === Paths ===
 BASE_DIR = Path(__file__).parent.resolve()
+CACHE_DIR = Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "neurochat"  # Generated state, kept out of the repo
 
 # Database file locations
 RULES_DB_PATH = BASE_DIR / "rules.db"
@@ -11,6 +13,14 @@ VECTOR_MEMORY_DB_PATH = BASE_DIR / "vector_memory.db"
 # Your LLM model file path
 MODEL_PATH = BASE_DIR / "models" / "notus-7b-v1.Q4_0.gguf"
 
+# === SQLite Connection Settings (applied to every connection, see db.py) ===
+SQLITE_JOURNAL_MODE = "WAL"  # WAL: readers never block on the writer
+SQLITE_SYNCHRONOUS = "NORMAL"  # Safe with WAL, far fewer fsyncs than FULL
+SQLITE_MMAP_SIZE = 256 * 1024 * 1024  # Bytes of each DB file read through mmap
+SQLITE_CACHE_SIZE_KB = 64 * 1024  # Page cache per connection
+SQLITE_BUSY_TIMEOUT_MS = 5000  # Wait this long for a lock before failing
+SQLITE_STATEMENT_CACHE = 256  # Prepared statements kept per connection
+
 # === Model & Embedding Config ===
 EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'  # SentenceTransformer model for vector memory
 VECTOR_DIM = 384  # Make sure this matches the output dimension of the embedding model
@@ -18,9 +28,109 @@ VECTOR_DIM = 384  # Make sure this matches the output dimension of the embedding
 # Similarity threshold for vector memory matching (between 0 and 1)
 SIMILARITY_THRESHOLD = 0.7
 
+# Concurrent tiers (pipeline.py)
+PIPELINE_PARALLEL_TIERS = True  # Compute the embedding while the rules are checked (after a response cache miss)
+PIPELINE_TIER_THREADS = 4  # Threads shared by all requests for background embeddings
+# Start the LLM while the memory search is still running when a provisional best score is in
+# [threshold - margin, threshold); 0 = off. Provisional scores come from the lexical prefilter (before the full
+# scan it falls back to) and from a float16/int8 index (before re-ranking). With the default exact float32 index
+# and LEXICAL_PREFILTER_MIN_ROWS = 0 no search work is left to overlap, so it has no effect.
+LLM_SPECULATIVE_MARGIN = 0.05
+
+# Embedding cache (keyed on utils.clean_text of the input, LRU eviction)
+EMBED_CACHE_SIZE = 4096  # Max cached embeddings; 0 disables the cache
+EMBED_CACHE_TTL = 0  # Seconds before a cached embedding expires; 0 = never
+
+# Micro-batching: concurrent embedding requests are encoded together
+EMBED_BATCHING = True
+EMBED_BATCH_MAX_SIZE = 32  # Flush a batch at this many texts...
+EMBED_BATCH_MAX_WAIT_MS = 3  # ...or this long after the first text arrived
+
+# Response cache: final answers keyed on utils.clean_text of the input, checked before every tier
+RESPONSE_CACHE_SIZE = 1024  # Max cached answers (LRU); 0 disables the cache
+RESPONSE_CACHE_TTL = 3600  # Seconds an answer is reused; 0 = until evicted or invalidated
+
+# === Rules ===
+# Seconds between checks of rules.db for external changes (0 = only reload after save_rule)
+RULES_RELOAD_INTERVAL = 2.0
+
+# === Vector Memory Size ===
+MEMORY_CAPACITY = 0  # Max rows kept in vector memory; 0 = unlimited
+MEMORY_EVICTION_POLICY = "lru"  # "lru" (least recently matched) or "lfu" (fewest matches, then oldest)
+MEMORY_EVICTION_SLACK = 0.05  # Evict this fraction of capacity extra per pass, so eviction runs rarely
+MEMORY_HIT_FLUSH_INTERVAL = 5.0  # Seconds between batched writes of hit counts / last-used times
+COMPACT_SIMILARITY = 0.95  # compact.py merges inputs at least this similar
+
+# Write-behind: save_to_memory queues the row and returns; a background thread inserts batches
+MEMORY_WRITE_BEHIND = True  # False = insert on the caller's thread, as before
+MEMORY_WRITE_BATCH = 64  # Rows per transaction at most
+MEMORY_WRITE_MAX_DELAY = 0.2  # Seconds a queued row waits for others to share its transaction
+MEMORY_WRITE_MAX_PENDING = 1000  # save_to_memory blocks once this many rows are waiting
+
+# === Lexical Index (lexical_index.py) ===
+LEXICAL_INDEX = True  # FTS5 index on memory.input, kept in sync by triggers; False drops it
+LEXICAL_THRESHOLD = 0.75  # Word-overlap score (0..1) a lexical match needs when embeddings are unavailable; every query word must also be in the match
+LEXICAL_PREFILTER_MIN_ROWS = 0  # Score only lexical candidates once memory has this many rows; 0 = never
+LEXICAL_PREFILTER_CANDIDATES = 256  # BM25 candidates scored by the prefilter
+
+# === Vector Storage ===
+VECTOR_STORAGE = "sqlite"  # "sqlite" (BLOB column) or "segment" (memory-mapped file; run vector_store.py to migrate)
+VECTOR_SEGMENT_PATH = BASE_DIR / "vector_memory.vseg"
+VECTOR_SEGMENT_DTYPE = "float32"  # "float32" or "float16" (half the size, used when creating a new segment)
+
+# === Vector Index ===
+VECTOR_INDEX_BACKEND = "exact"  # "exact" (brute-force matrix scan) or "ivf" (approximate, for very large memories)
+IVF_INDEX_PATH = BASE_DIR / "vector_memory.ivf.npz"  # Persisted IVF centroids/assignments
+IVF_NLIST = 1024  # Number of clusters; roughly sqrt(rows) to 4*sqrt(rows)
+IVF_NPROBE = 16  # Clusters scanned per query: higher = better recall, slower lookups
+IVF_MIN_TRAIN_SIZE = 10000  # Below this many rows the IVF index just does an exact scan
+IVF_TRAIN_SAMPLE = 100000  # Vectors sampled for k-means training
+
+# Precision of the in-RAM index matrix (sqlite storage): "float32", "float16" (1/2 the RAM) or "int8" (~1/4).
+# With float16/int8 the top candidates are re-scored from the full-precision BLOBs before the threshold check.
+VECTOR_INDEX_DTYPE = "float32"
+VECTOR_RERANK_CANDIDATES = 8
+VECTOR_BLOB_DTYPE = "float32"  # Format of new memory.vector BLOBs: "float32" or "float16" (see quantize.py)
+
+# === CPU Budget (cpu_budget.py; tune with benchmarks/cpu_budget.py) ===
+CPU_BUDGET_EMBED_CORES = 0  # Cores reserved for the embedding model, the LLM gets the rest; 0 = library defaults
+CPU_BUDGET_PIN = False  # Also pin each engine's threads to its cores (Linux only)
+LLM_N_THREADS = None  # llama.cpp generation threads; None = from the budget (or llama.cpp's default)
+LLM_N_THREADS_BATCH = None  # llama.cpp prompt-evaluation threads; None = LLM_N_THREADS
+LLM_N_BATCH = None  # Prompt tokens evaluated per llama.cpp batch; None = llama.cpp default (512)
+EMBED_TORCH_THREADS = None  # torch intra-op threads for the embedding model; None = from the budget (or torch's default)
+EMBED_TORCH_INTEROP_THREADS = None  # torch inter-op threads; None = torch default
+
+# === LLM Scheduling ===
+LLM_MAX_QUEUE = 8  # Requests allowed to wait for the model; more are rejected with a busy reply
+LLM_REQUEST_TIMEOUT = 60  # Seconds from enqueue until a request is dropped or its generation stopped
+
+# Reuse the evaluated system-prompt state instead of re-evaluating it per request
+LLM_PREFIX_CACHE = True
+LLM_PREFIX_CACHE_PATH = CACHE_DIR / "llm_prefix_state.pkl"  # Persist across restarts; None keeps it in RAM only
+
+# === Chat UI (app.py) ===
+CHAT_WINDOW_MESSAGES = 200  # Messages a session keeps and renders; older ones are paged out
+CHAT_PAGE_MESSAGES = 50  # Messages paged out at once when the window is full (keeps re-renders rare)
+CHAT_ARCHIVE_PATH = CACHE_DIR / "chat_history.txt"  # Paged-out turns are appended here as User:/Bot: lines; None drops them
+
+# === Multi-process serving (serve.py) ===
+SERVE_WORKERS = 2  # Worker processes; each loads its own models and a read-only vector index
+SERVE_CPU_SHARES = True  # Give each worker its own slice of the cores (pinned on Linux); the CPU budget splits that slice
+SERVE_WORKER_CONCURRENCY = 4  # Requests one worker handles at a time (its LLM queue still runs one generation)
+SERVE_HOST = "127.0.0.1"
+SERVE_PORT = 8000  # POST http://SERVE_HOST:SERVE_PORT/chat
+SERVE_REQUEST_TIMEOUT = 120  # Seconds the front end waits for a worker to finish an answer
+
 # === Logging Configuration ===
-LOG_LEVEL = logging.DEBUG
+LOG_LEVEL = logging.INFO  # DEBUG adds per-request detail; keep INFO when serving
 LOG_FORMAT = "%(asctime)s [%(levelname)s] %(message)s"
+DEBUG_LOG_SAMPLE_RATE = 0.0  # Fraction of vector lookups that log their top candidates at DEBUG level
+
+# === Metrics ===
+METRICS_ENABLED = True  # Prometheus text endpoint served next to the Gradio app
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9464  # GET http://METRICS_HOST:METRICS_PORT/metrics
 
 # === Other settings ===
 # Add more config options here if needed later
@@ -1,30 +1,47 @@
 import logging
-from rules import check_rules
-from memory import check_vector_memory
+from rules import check_rules, refresh_rules
+from memory import check_vector_memory, embedding_cache, record_hit
+from response_cache import response_cache
+from metrics import RESPONSE_CACHE_TOTAL
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
 
 def get_response(user_input: str, vector_threshold: float = 0.7):
     """
-    Core function to get response by checking rules first,
-    then vector memory if no rule matches.
+    Core function to get response by checking the response cache first,
+    then rules, then vector memory if no rule matches.
 
     Returns:
-        dict with keys: 'response' and 'source' (either 'rule' or 'memory'),
-        or None if no response found.
+        dict with keys: 'response', 'source' (either 'rule' or 'memory', also for
+        cached answers) and 'cached', or None if no response found.
     """
 
+    # 0. Repeated question: answer from the response cache
+    # Rule changes clear the cache; with unreadable rules it may be stale, so it is skipped
+    cached = response_cache.get(user_input) if refresh_rules() else None
+    if cached and cached["source"] not in ("rule", "memory"):
+        cached = None  # LLM answers cached by the pipeline are not core's to give
+    RESPONSE_CACHE_TOTAL.inc(result="hit" if cached else "miss")
+    if cached:
+        logging.info(f"Response found in response cache (from {cached['source']}).")
+        record_hit(cached["row_id"])
+        return {"response": cached["response"], "source": cached["source"], "cached": True}
+
     # 1. Check rules database
     rule_response = check_rules(user_input)
     if rule_response:
         logging.info("Response found from rules.")
-        return {"response": rule_response["response"], "source": "rule"}
+        response_cache.put(user_input, rule_response["response"], "rule")
+        return {"response": rule_response["response"], "source": "rule", "cached": False}
 
     # 2. Check vector memory database
     vector_response = check_vector_memory(user_input, threshold=vector_threshold)
     if vector_response:
         logging.info("Response found from vector memory.")
-        return {"response": vector_response["response"], "source": "memory"}
+        # The lookup just embedded the input, so its vector is in the embedding cache
+        response_cache.put(user_input, vector_response["response"], "memory", vector=embedding_cache.peek(user_input),
+                           score=vector_response["score"], row_id=vector_response["id"])
+        return {"response": vector_response["response"], "source": "memory", "cached": False}
 
     # 3. No matching response found
     logging.info("No matching response found in rules or vector memory.")
@@ -0,0 +1,146 @@
+# cpu_budget.py
+"""
+Splits the CPU between llama.cpp and the embedding model.
+
+With CPU_BUDGET_EMBED_CORES = k the last k usable cores go to the embedding
+model (torch intra-op threads = k) and the rest to the LLM (n_threads and
+n_threads_batch = the remaining core count), so neither engine starts more
+threads than it has cores. LLM_N_THREADS, LLM_N_THREADS_BATCH, LLM_N_BATCH,
+EMBED_TORCH_THREADS and EMBED_TORCH_INTEROP_THREADS override single values.
+With CPU_BUDGET_PIN each engine's threads are also pinned to its cores
+(Linux only): the LLM scheduler thread and the embedding batcher thread are
+pinned before their first call, and the threads each engine starts from
+there inherit the mask. Embeddings computed on other threads (EMBED_BATCHING
+off, batch.py) get the thread counts but no pinning.
+Under serve.py each worker process first takes its own slice of the cores
+(use_share) and the budget splits that slice, so N workers do not each
+start threads for every core.
+benchmarks/cpu_budget.py sweeps these settings for the host.
+"""
+
+import logging
+import os
+import threading
+import config
+
+
+def available_cpus() -> list:
+    """CPU ids the calling thread may run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+# Read once at import, before any thread is pinned to a subset
+_PROCESS_CPUS = available_cpus()
+_shared = False
+
+
+def use_share(index: int, count: int):
+    """
+    Restrict this process to slice `index` of `count` disjoint slices of its
+    cores (one per serve.py worker) and pin it there. Call before any model
+    is loaded or thread started; threads started later inherit the mask.
+    """
+    global _PROCESS_CPUS, _shared
+    cpus = available_cpus()
+    if count <= 1:
+        return
+    if len(cpus) >= count:
+        size, extra = divmod(len(cpus), count)
+        start = index * size + min(index, extra)
+        share = cpus[start:start + size + (1 if index < extra else 0)]
+    else:
+        share = [cpus[index % len(cpus)]]  # More workers than cores: some have to share one
+    _PROCESS_CPUS = share
+    _shared = True
+    if hasattr(os, "sched_setaffinity"):
+        try:
+            os.sched_setaffinity(0, share)
+        except OSError as e:
+            logging.warning(f"Could not pin process to CPUs {share}: {e}")
+    logging.info(f"Using CPUs {share} (share {index + 1} of {count}).")
+
+
+def plan() -> dict:
+    """
+    Resolve the configured budget into per-engine settings:
+    {'llm': {'cpus', 'n_threads', 'n_threads_batch', 'n_batch'},
+     'embed': {'cpus', 'threads', 'interop_threads'}}.
+    None means the library default (and, for cpus, no pinning).
+    """
+    cpus = _PROCESS_CPUS
+    # Inside a share the library defaults would still count every core on the host
+    whole = len(cpus) if _shared else None
+    reserved = max(0, min(config.CPU_BUDGET_EMBED_CORES, len(cpus) - 1))
+    llm_cpus, embed_cpus = (cpus[:-reserved], cpus[-reserved:]) if reserved else (None, None)
+
+    def pick(override, default):
+        return override if override is not None else default
+
+    llm_threads = pick(config.LLM_N_THREADS, len(llm_cpus) if llm_cpus else whole)
+    pinned = config.CPU_BUDGET_PIN and reserved
+    return {
+        "llm": {
+            "cpus": llm_cpus if pinned else None,
+            "n_threads": llm_threads,
+            "n_threads_batch": pick(config.LLM_N_THREADS_BATCH, llm_threads),
+            "n_batch": config.LLM_N_BATCH,
+        },
+        "embed": {
+            "cpus": embed_cpus if pinned else None,
+            "threads": pick(config.EMBED_TORCH_THREADS, len(embed_cpus) if embed_cpus else whole),
+            "interop_threads": config.EMBED_TORCH_INTEROP_THREADS,
+        },
+    }
+
+
+def llama_kwargs() -> dict:
+    """Keyword arguments for llama_cpp.Llama (only the settings that are not left to the default)."""
+    settings = plan()["llm"]
+    return {name: settings[name] for name in ("n_threads", "n_threads_batch", "n_batch") if settings[name] is not None}
+
+
+def configure_torch():
+    """Apply the embedding model's torch thread counts. Call before the model is loaded."""
+    settings = plan()["embed"]
+    if settings["threads"] is None and settings["interop_threads"] is None:
+        return
+    import torch
+    if settings["threads"] is not None:
+        torch.set_num_threads(settings["threads"])
+    if settings["interop_threads"] is not None:
+        try:
+            torch.set_num_interop_threads(settings["interop_threads"])
+        except RuntimeError as e:
+            # Only allowed before torch has run any inter-op parallel work
+            logging.warning(f"Could not set torch inter-op threads: {e}")
+    logging.info(f"Embedding model threads: intra-op {torch.get_num_threads()}, "
+                 f"inter-op {torch.get_num_interop_threads()}.")
+
+
+_pinned = threading.local()
+
+
+def pin_thread(engine: str):
+    """Pin the calling thread to the cores budgeted for `engine` ('llm' or 'embed'); cheap after the first call."""
+    if getattr(_pinned, "engine", None) == engine:
+        return
+    _pinned.engine = engine
+    cpus = plan()[engine]["cpus"]
+    if not cpus or not hasattr(os, "sched_setaffinity"):
+        return
+    try:
+        os.sched_setaffinity(0, cpus)  # 0 = the calling thread on Linux
+        logging.debug(f"Pinned {threading.current_thread().name} to CPUs {cpus} for {engine}.")
+    except OSError as e:
+        logging.warning(f"Could not pin {engine} thread to CPUs {cpus}: {e}")
+
+
+def describe() -> str:
+    """One-line summary of the budget for logs, e.g. 'llm: n_threads=6 ..., embed: threads=2'."""
+    parts = []
+    for engine, settings in plan().items():
+        values = " ".join(f"{name}={value}" for name, value in settings.items() if value is not None)
+        if values:
+            parts.append(f"{engine}: {values}")
+    return ", ".join(parts) or "library defaults"
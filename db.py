@@ -0,0 +1,54 @@
+# db.py
+
+import logging
+import sqlite3
+import threading
+from config import (
+    SQLITE_JOURNAL_MODE, SQLITE_SYNCHRONOUS, SQLITE_MMAP_SIZE, SQLITE_CACHE_SIZE_KB,
+    SQLITE_BUSY_TIMEOUT_MS, SQLITE_STATEMENT_CACHE,
+)
+
+# One open connection per (thread, database file); reused for every query
+_local = threading.local()
+
+
+def _configure(conn: sqlite3.Connection):
+    """Apply connection pragmas. WAL lets readers proceed while a writer commits."""
+    mode = conn.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}").fetchone()[0]
+    if mode.lower() != SQLITE_JOURNAL_MODE.lower():
+        logging.warning(f"SQLite journal_mode is '{mode}', requested '{SQLITE_JOURNAL_MODE}'.")
+    conn.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    conn.execute(f"PRAGMA mmap_size={int(SQLITE_MMAP_SIZE)}")
+    conn.execute(f"PRAGMA cache_size={-int(SQLITE_CACHE_SIZE_KB)}")
+    conn.execute(f"PRAGMA busy_timeout={int(SQLITE_BUSY_TIMEOUT_MS)}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+
+
+def get_connection(db_path) -> sqlite3.Connection:
+    """
+    Return this thread's persistent connection to db_path, opening it on first use.
+    Statements are compiled once and kept in the connection's statement cache.
+    Use it as `with get_connection(path) as conn:` to commit (or roll back) without closing.
+    """
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    key = str(db_path)
+    conn = connections.get(key)
+    if conn is None:
+        conn = sqlite3.connect(key, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000, cached_statements=SQLITE_STATEMENT_CACHE)
+        _configure(conn)
+        connections[key] = conn
+        logging.debug(f"Opened SQLite connection to {key} in thread {threading.current_thread().name}")
+    return conn
+
+
+def close_connections():
+    """Close every connection opened by the calling thread. Call it when the thread is done with SQLite."""
+    connections = getattr(_local, "connections", None) or {}
+    for conn in connections.values():
+        try:
+            conn.close()
+        except Exception as e:
+            logging.warning(f"Error closing SQLite connection: {e}")
+    connections.clear()
@@ -2,6 +2,7 @@ import logging
 from rules import create_or_fix_rules_table
 from memory import ensure_table
 from config import RULES_DB_PATH, VECTOR_MEMORY_DB_PATH
+from db import get_connection
 
 def initialize_all_databases():
     """
@@ -11,6 +12,9 @@ def initialize_all_databases():
     logging.info("Initializing all databases...")
 
     try:
+        # Opening through db.py switches both files to WAL with the configured pragmas
+        for db_path in (RULES_DB_PATH, VECTOR_MEMORY_DB_PATH):
+            get_connection(db_path)
         create_or_fix_rules_table()
         ensure_table()
         logging.info("All databases initialized successfully.")
@@ -0,0 +1,85 @@
+# embedding_cache.py
+
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from utils import clean_text
+
+
+class EmbeddingCache:
+    """
+    Bounded LRU cache of embeddings keyed on normalized text (utils.clean_text).
+    Cached vectors are read-only so callers cannot corrupt each other's copy.
+    """
+
+    def __init__(self, max_size: int = 4096, ttl: float = 0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(text: str) -> str:
+        return clean_text(text)
+
+    def get(self, text: str):
+        """Return the cached vector for text, or None."""
+        if self.max_size <= 0:
+            return None
+        key = self.key(text)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl and time.monotonic() - entry[1] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def peek(self, text: str):
+        """Like get(), but not counted as a hit or miss and without refreshing the LRU order."""
+        if self.max_size <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(self.key(text))
+        if entry is None or (self.ttl and time.monotonic() - entry[1] > self.ttl):
+            return None
+        return entry[0]
+
+    def put(self, text: str, vector: np.ndarray) -> np.ndarray:
+        """Store a vector for text and return the (read-only) cached copy."""
+        vector = np.array(vector, dtype=np.float32)
+        vector.setflags(write=False)
+        if self.max_size <= 0:
+            return vector
+        key = self.key(text)
+        with self._lock:
+            self._entries[key] = (vector, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return vector
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
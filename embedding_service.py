@@ -0,0 +1,114 @@
+# embedding_service.py
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
+
+
+class EmbeddingBatcher:
+    """
+    Coalesces concurrent embedding requests into one encode(list) call.
+    A background thread takes the first queued text and, if others are
+    already waiting, keeps collecting until `max_batch_size` texts or
+    `max_wait_ms` have passed; a lone text is encoded at once (texts that
+    arrive while it is encoded form the next batch). Each caller's Future is
+    resolved with its own vector.
+    """
+
+    def __init__(self, encode_fn, max_batch_size: int = 32, max_wait_ms: float = 3.0):
+        self.encode_fn = encode_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._largest_batch = 0
+        self._encode_seconds = 0.0
+        self._wait_seconds = 0.0
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, text: str) -> Future:
+        """Queue one text; the Future resolves to its float32 vector."""
+        if self._stopped:
+            raise RuntimeError("Embedding batcher has been shut down.")
+        future = Future()
+        self._queue.put((text, future, time.perf_counter()))
+        return future
+
+    def embed(self, text: str, timeout: float = None) -> np.ndarray:
+        return self.submit(text).result(timeout=timeout)
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        if self._queue.empty():
+            return batch  # Nobody else is waiting: do not hold a lone request for max_wait
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)  # let the run loop see the shutdown marker
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            # Identical texts in one batch are encoded once
+            texts = list(dict.fromkeys(text for text, _, _ in batch))
+            started = time.perf_counter()
+            try:
+                vectors = np.asarray(self.encode_fn(texts), dtype=np.float32).reshape(len(texts), -1)
+            except Exception as e:
+                logging.error(f"Batch embedding of {len(texts)} texts failed: {e}")
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            finished = time.perf_counter()
+            by_text = dict(zip(texts, vectors))
+            for text, future, _ in batch:
+                future.set_result(by_text[text])
+
+            with self._stats_lock:
+                self._batches += 1
+                self._items += len(batch)
+                self._largest_batch = max(self._largest_batch, len(batch))
+                self._encode_seconds += finished - started
+                self._wait_seconds += sum(started - queued for _, _, queued in batch)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            batches = self._batches or 1
+            items = self._items or 1
+            return {
+                "batches": self._batches,
+                "items": self._items,
+                "queued": self._queue.qsize(),
+                "avg_batch_size": self._items / batches,
+                "max_batch_size": self._largest_batch,
+                "avg_encode_ms": self._encode_seconds / batches * 1000,
+                "avg_queue_wait_ms": self._wait_seconds / items * 1000,
+            }
+
+    def shutdown(self, timeout: float = 5.0):
+        """Stop the worker after the queued requests are served."""
+        if self._stopped:
+            return
+        self._stopped = True
+        self._queue.put(None)
+        self._thread.join(timeout=timeout)
@@ -0,0 +1,284 @@
+# ingest.py
+"""
+Bulk import and export of rules and vector memory.
+
+    python ingest.py import memory pairs.jsonl
+    python ingest.py import rules rules.csv
+    python ingest.py import memory chat_history.txt        # "User:/Bot:" transcript
+    python ingest.py export memory memory.jsonl
+
+Imports embed in large batches (one encode(list) call per chunk) and insert
+each chunk with executemany in a single transaction. The number of records
+consumed is committed in the same transaction, so an interrupted import
+resumes where it stopped (--restart ignores saved progress).
+A running chatbot picks up imported memory on its next start.
+"""
+
+import argparse
+import csv
+import json
+import logging
+import re
+import sys
+import time
+from itertools import islice
+from pathlib import Path
+import numpy as np
+from config import RULES_DB_PATH, VECTOR_MEMORY_DB_PATH, VECTOR_STORAGE, VECTOR_SEGMENT_PATH, VECTOR_SEGMENT_DTYPE, VECTOR_DIM
+from db import get_connection
+
+FORMATS = ("jsonl", "csv", "chat")
+
+# "User: ..." / "Bot: ..." lines, optionally "You [23:48:56]: ..." as written by older versions
+_USER_LINE = re.compile(r"^(?:User|You)(?: \[[^\]]*\])?:\s?(.*)$")
+_BOT_LINE = re.compile(r"^Bot(?: \[[^\]]*\])?:\s?(.*)$")
+
+
+def detect_format(path: Path) -> str:
+    suffix = Path(path).suffix.lower()
+    if suffix in (".jsonl", ".json", ".ndjson"):
+        return "jsonl"
+    if suffix in (".csv", ".tsv"):
+        return "csv"
+    return "chat"
+
+
+def _pair(user_input, response, tags=None):
+    user_input = (user_input or "").strip()
+    response = (response or "").strip()
+    if not user_input or not response:
+        return None
+    return user_input, response, (tags or None)
+
+
+def read_jsonl(path: Path):
+    """Yield (input, response, tags) from objects with input/response (or user/bot) keys."""
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                pair = _pair(record.get("input", record.get("user")), record.get("response", record.get("bot")),
+                             record.get("tags"))
+            except (ValueError, AttributeError) as e:
+                logging.warning(f"{path}:{line_no}: skipping unreadable line ({e})")
+                continue
+            if pair:
+                yield pair
+
+
+def read_csv(path: Path):
+    """Yield (input, response, tags) from a CSV with an input,response[,tags] header (or those columns in order)."""
+    with open(path, encoding="utf-8", newline="") as f:
+        dialect = "excel-tab" if Path(path).suffix.lower() == ".tsv" else "excel"
+        reader = csv.reader(f, dialect)
+        header = next(reader, None)
+        if header is None:
+            return
+        names = [h.strip().lower() for h in header]
+        if "input" in names and "response" in names:
+            columns = (names.index("input"), names.index("response"), names.index("tags") if "tags" in names else None)
+        else:
+            # No header row: the first line is data
+            columns = (0, 1, 2 if len(header) > 2 else None)
+            pair = _pair(header[0], header[1] if len(header) > 1 else None, header[2] if len(header) > 2 else None)
+            if pair:
+                yield pair
+        for row in reader:
+            if len(row) <= max(columns[0], columns[1]):
+                continue
+            tags = row[columns[2]] if columns[2] is not None and columns[2] < len(row) else None
+            pair = _pair(row[columns[0]], row[columns[1]], tags)
+            if pair:
+                yield pair
+
+
+def read_chat(path: Path):
+    """
+    Yield (input, response, None) from a "User: ... / Bot: ..." transcript such as
+    chat_history.txt. A bot reply runs until the next user line and may span lines.
+    """
+    user_input, reply = None, None
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip("\r\n")
+            user_match = _USER_LINE.match(line)
+            if user_match:
+                if reply is not None:
+                    pair = _pair(user_input, "\n".join(reply))
+                    if pair:
+                        yield pair
+                user_input, reply = user_match.group(1), None
+                continue
+            bot_match = _BOT_LINE.match(line)
+            if bot_match and user_input is not None and reply is None:
+                reply = [bot_match.group(1)]
+            elif reply is not None:
+                reply.append(line)
+    if reply is not None:
+        pair = _pair(user_input, "\n".join(reply))
+        if pair:
+            yield pair
+
+
+def read_pairs(path: Path, fmt: str = None):
+    fmt = fmt or detect_format(path)
+    readers = {"jsonl": read_jsonl, "csv": read_csv, "chat": read_chat}
+    return readers[fmt](path)
+
+
+def _ensure_progress_table(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS ingest_progress (
+        source TEXT PRIMARY KEY,
+        records INTEGER NOT NULL,
+        updated_at REAL
+    )
+    """)
+    conn.commit()
+
+
+def _progress(conn, source: str) -> int:
+    row = conn.execute("SELECT records FROM ingest_progress WHERE source = ?", (source,)).fetchone()
+    return row[0] if row else 0
+
+
+def _chunks(pairs, size: int):
+    pairs = iter(pairs)
+    while True:
+        chunk = list(islice(pairs, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def ingest(target: str, path: Path, fmt: str = None, chunk_size: int = 2048, encode_batch_size: int = 128,
+           restart: bool = False) -> dict:
+    """
+    Import pairs from `path` into the rules or memory DB.
+    Memory inputs already stored are ignored (the input column is unique).
+    Returns counts of records read and rows inserted.
+    """
+    path = Path(path)
+    db_path = VECTOR_MEMORY_DB_PATH if target == "memory" else RULES_DB_PATH
+    if target == "memory":
+        from memory import ensure_table, embedding_model, vector_to_blob
+        ensure_table()
+        model = embedding_model.get()
+        if model is None:
+            raise RuntimeError(f"Embedding model not loaded: {embedding_model.error}")
+    else:
+        from rules import create_or_fix_rules_table
+        create_or_fix_rules_table()
+
+    conn = get_connection(db_path)
+    _ensure_progress_table(conn)
+    source = f"{target}:{path.resolve()}"
+    done = 0 if restart else _progress(conn, source)
+    if done:
+        logging.info(f"Resuming {path} after {done} records.")
+
+    read, inserted = 0, 0
+    started = time.perf_counter()
+    for chunk in _chunks(islice(read_pairs(path, fmt), done, None), chunk_size):
+        if target == "memory":
+            inputs = [user_input for user_input, _, _ in chunk]
+            vectors = np.asarray(model.encode(inputs, batch_size=encode_batch_size), dtype=np.float32)
+            now = time.time()
+            rows = [(user_input, response, vector_to_blob(vector), now)
+                    for (user_input, response, _), vector in zip(chunk, vectors)]
+            sql = "INSERT OR IGNORE INTO memory (input, response, vector, last_used) VALUES (?, ?, ?, ?)"
+        else:
+            rows = chunk
+            sql = "INSERT INTO rules (input, response, tags) VALUES (?, ?, ?)"
+
+        with conn:
+            before = conn.total_changes
+            conn.executemany(sql, rows)
+            inserted += conn.total_changes - before
+            done += len(chunk)
+            conn.execute(
+                "INSERT OR REPLACE INTO ingest_progress (source, records, updated_at) VALUES (?, ?, ?)",
+                (source, done, time.time())
+            )
+        read += len(chunk)
+        elapsed = time.perf_counter() - started
+        logging.info(f"{target}: {done} records processed, {inserted} inserted ({read / elapsed:.0f} records/s).")
+
+    if target == "memory" and VECTOR_STORAGE == "segment":
+        # The segment file is the vector store in this mode; move the new BLOBs there
+        from vector_store import migrate
+        migrate(db_path, VECTOR_SEGMENT_PATH, VECTOR_DIM, dtype=VECTOR_SEGMENT_DTYPE, drop_blobs=True)
+    if target == "rules":
+        from rules import rule_engine
+        rule_engine.invalidate()
+
+    logging.info(f"Imported {inserted} {target} rows from {path} ({read} records read this run).")
+    return {"read": read, "inserted": inserted, "records": done}
+
+
+def export(target: str, path: Path, fmt: str = None, batch_size: int = 10000) -> int:
+    """Write every rule or memory pair to `path` (jsonl, csv or chat transcript). Returns the row count."""
+    path = Path(path)
+    fmt = fmt or detect_format(path)
+    if target == "memory":
+        db_path, query = VECTOR_MEMORY_DB_PATH, "SELECT input, response, NULL FROM memory ORDER BY id"
+    else:
+        db_path, query = RULES_DB_PATH, "SELECT input, response, tags FROM rules ORDER BY id"
+
+    count = 0
+    cursor = get_connection(db_path).execute(query)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f) if fmt == "csv" else None
+        if writer is not None:
+            writer.writerow(["input", "response", "tags"] if target == "rules" else ["input", "response"])
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for user_input, response, tags in rows:
+                if fmt == "jsonl":
+                    record = {"input": user_input, "response": response}
+                    if tags:
+                        record["tags"] = tags
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                elif fmt == "csv":
+                    writer.writerow([user_input, response, tags or ""] if target == "rules" else [user_input, response])
+                else:
+                    f.write(f"User: {user_input}\nBot: {response}\n\n")
+            count += len(rows)
+    logging.info(f"Exported {count} {target} rows to {path}.")
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import/export of rules and vector memory.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    importer = sub.add_parser("import", help="import pairs from JSONL, CSV or a User:/Bot: transcript")
+    importer.add_argument("target", choices=["memory", "rules"])
+    importer.add_argument("path", type=Path)
+    importer.add_argument("--format", choices=FORMATS, help="default: from the file extension (.txt = chat)")
+    importer.add_argument("--chunk-size", type=int, default=2048, help="pairs per transaction")
+    importer.add_argument("--encode-batch-size", type=int, default=128, help="texts per model forward pass")
+    importer.add_argument("--restart", action="store_true", help="ignore saved progress for this file")
+
+    exporter = sub.add_parser("export", help="export pairs to JSONL, CSV or a User:/Bot: transcript")
+    exporter.add_argument("target", choices=["memory", "rules"])
+    exporter.add_argument("path", type=Path)
+    exporter.add_argument("--format", choices=FORMATS, help="default: from the file extension (.txt = chat)")
+
+    args = parser.parse_args()
+    if args.command == "import":
+        if not args.path.exists():
+            sys.exit(f"No such file: {args.path}")
+        ingest(args.target, args.path, fmt=args.format, chunk_size=args.chunk_size,
+               encode_batch_size=args.encode_batch_size, restart=args.restart)
+    else:
+        export(args.target, args.path, fmt=args.format)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s', force=True)
+    main()
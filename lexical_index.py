@@ -0,0 +1,103 @@
+# lexical_index.py
+"""
+Full-text (FTS5) index over memory.input.
+
+The memory_fts table is an external-content FTS5 index: it stores only the
+tokenized inputs and reads the text from the memory table. Triggers keep it
+in sync with every insert, delete and input update, whichever tool writes
+the table (memory.py, ingest.py, compact.py). BM25 picks the candidates;
+overlap_score() turns a candidate into a 0..1 score that can be compared
+with LEXICAL_THRESHOLD (0 unless the candidate has every query word).
+"""
+
+import logging
+import re
+import sqlite3
+from utils import clean_text
+
+FTS_TABLE = "memory_fts"
+
+_TRIGGERS = {
+    "memory_fts_insert": f"""
+        CREATE TRIGGER IF NOT EXISTS memory_fts_insert AFTER INSERT ON memory BEGIN
+            INSERT INTO {FTS_TABLE} (rowid, input) VALUES (new.id, new.input);
+        END""",
+    "memory_fts_delete": f"""
+        CREATE TRIGGER IF NOT EXISTS memory_fts_delete AFTER DELETE ON memory BEGIN
+            INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, input) VALUES ('delete', old.id, old.input);
+        END""",
+    "memory_fts_update": f"""
+        CREATE TRIGGER IF NOT EXISTS memory_fts_update AFTER UPDATE OF input ON memory BEGIN
+            INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, input) VALUES ('delete', old.id, old.input);
+            INSERT INTO {FTS_TABLE} (rowid, input) VALUES (new.id, new.input);
+        END""",
+}
+
+_TOKEN = re.compile(r"[^\W_]+")
+
+
+def tokens(text: str) -> list:
+    """Distinct lowercase word tokens, in order (roughly what the unicode61 tokenizer indexes)."""
+    return list(dict.fromkeys(_TOKEN.findall(clean_text(text or ""))))
+
+
+def ensure_fts(conn) -> bool:
+    """
+    Create the FTS index and its triggers, filling it from existing rows the
+    first time. Returns False if this SQLite build has no FTS5.
+    """
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (FTS_TABLE,)).fetchone()
+    if not exists:
+        try:
+            conn.execute(
+                f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+                f"input, content='memory', content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+            )
+        except sqlite3.OperationalError as e:
+            logging.warning(f"Full-text index unavailable ({e}); lexical matching is disabled.")
+            return False
+    for sql in _TRIGGERS.values():
+        conn.execute(sql)
+    if not exists:
+        conn.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('rebuild')")
+        logging.info("Built the full-text index on memory inputs.")
+    return True
+
+
+def drop_fts(conn):
+    """Remove the FTS index and its triggers (so writes stop paying for it)."""
+    for name in _TRIGGERS:
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+    conn.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+def search(conn, text: str, limit: int = 10) -> list:
+    """
+    Return up to `limit` (id, input, response) rows sharing any word with `text`,
+    best BM25 rank first. Empty if `text` has no words or the index is missing.
+    """
+    words = tokens(text)
+    if not words:
+        return []
+    expression = " OR ".join(f'"{word}"' for word in words)
+    try:
+        return conn.execute(
+            f"SELECT m.id, m.input, m.response FROM {FTS_TABLE} f JOIN memory m ON m.id = f.rowid "
+            f"WHERE {FTS_TABLE} MATCH ? ORDER BY f.rank LIMIT ?",
+            (expression, limit)
+        ).fetchall()
+    except sqlite3.OperationalError as e:
+        logging.debug(f"Full-text search failed: {e}")
+        return []
+
+
+def overlap_score(query: str, candidate: str) -> float:
+    """
+    Word overlap between two texts as an F1 score (1.0 = same words). 0.0 unless
+    every query word is in the candidate: a single swapped word ("my name" vs
+    "your name") changes the question however many other words are shared.
+    """
+    query_words, candidate_words = set(tokens(query)), set(tokens(candidate))
+    if not query_words or not query_words <= candidate_words:
+        return 0.0
+    return 2 * len(query_words & candidate_words) / (len(query_words) + len(candidate_words))
@@ -1,40 +1,118 @@
 import logging
-from huggingface_hub import hf_hub_download
+from config import LLM_MAX_QUEUE, LLM_REQUEST_TIMEOUT, LLM_PREFIX_CACHE, LLM_PREFIX_CACHE_PATH
+from llm_scheduler import LLMScheduler, LLMQueueFull, LLMTimeout, LLMIncomplete
+from prompt_cache import PrefixCache
+from model_loader import LazyModel
+from metrics import Gauge
+import cpu_budget
 
-try:
-    from llama_cpp import Llama
-except ImportError:
-    logging.error("llama_cpp not installed. Install with `pip install llama-cpp-python`.")
-    raise
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
 
-# 🔁 Download model from Hugging Face Hub
-MODEL_PATH = hf_hub_download(
-    repo_id="Hugg-Vij04/HuggVij04notus7bv1Q40",
-    filename="notus-7b-v1.Q4_0.gguf"
-)
+# Fixed system prompt shared by every request; its evaluated state is cached
+SYSTEM_PREFIX = "You are a helpful assistant. Respond clearly.\nUser:"
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+def build_prompt(prompt: str) -> str:
+    return f"{SYSTEM_PREFIX} {prompt}\nBot:"
+
+prefix_cache = None
+
+def _load_llm():
+    """Download (if needed) and load the model, then warm the prompt prefix cache."""
+    global prefix_cache
+    try:
+        from llama_cpp import Llama
+    except ImportError:
+        logging.error("llama_cpp not installed. Install with `pip install llama-cpp-python`.")
+        raise
+    from huggingface_hub import hf_hub_download
+
+    # 🔁 Download model from Hugging Face Hub
+    model_path = hf_hub_download(
+        repo_id="Hugg-Vij04/HuggVij04notus7bv1Q40",
+        filename="notus-7b-v1.Q4_0.gguf"
+    )
 
-# 📦 Load model once
-try:
-    logging.info(f"Loading LLM model from {MODEL_PATH} ...")
-    llama_model = Llama(model_path=str(MODEL_PATH))
+    # 📦 Load model once, with the threads budgeted for it
+    logging.info(f"Loading LLM model from {model_path} ({cpu_budget.describe()}) ...")
+    model = Llama(model_path=str(model_path), **cpu_budget.llama_kwargs())
     logging.info("Loaded Notus-7B model successfully")
-except Exception as e:
-    logging.error(f"Failed to load LLM model: {e}")
-    llama_model = None
 
-def llm_generate_response(prompt: str, max_tokens: int = 256) -> str:
+    if LLM_PREFIX_CACHE:
+        try:
+            cache = PrefixCache(model, SYSTEM_PREFIX, path=LLM_PREFIX_CACHE_PATH, model_id=str(model_path))
+            cache.warm()
+            prefix_cache = cache
+        except Exception as e:
+            logging.warning(f"Prompt prefix caching disabled: {e}")
+    return model
+
+# LLM handle: loaded on first use or by model_loader.start_warmup(), never at import time
+llm_model = LazyModel("llm", _load_llm)
+
+def _stream_tokens(prompt: str, max_tokens: int):
+    """Run the model directly, yielding text pieces. Only the scheduler thread calls this."""
+    llama_model = llm_model.get()
     if llama_model is None:
+        raise RuntimeError(f"LLM model is not loaded: {llm_model.error}")
+    cpu_budget.pin_thread("llm")  # The scheduler thread; llama.cpp's worker threads inherit its CPU mask
+    if prefix_cache is not None:
+        # Start from the evaluated system prompt; only the user part is evaluated
+        prefix_cache.restore()
+    for chunk in llama_model(build_prompt(prompt), max_tokens=max_tokens, stop=["\n"], echo=False, stream=True):
+        text = chunk.get('choices', [{}])[0].get('text', '')
+        if text:
+            yield text
+
+# All generation goes through one bounded queue so bursts cannot pile up on the model
+scheduler = LLMScheduler(_stream_tokens, max_queue=LLM_MAX_QUEUE, default_timeout=LLM_REQUEST_TIMEOUT)
+Gauge("neurochat_llm_queue_depth", "LLM requests waiting for the model.", lambda: scheduler.stats()["queue_depth"])
+
+def llm_submit(prompt: str, max_tokens: int = 256, timeout: float = None):
+    """
+    Queue a generation without waiting for it and return the LLMRequest.
+    Pass it to llm_generate_response/llm_stream_response later, or cancel() it.
+    Raises LLMQueueFull if the queue is at capacity.
+    """
+    return scheduler.submit(prompt, max_tokens=max_tokens, timeout=timeout)
+
+def llm_generate_response(prompt: str, max_tokens: int = 256, timeout: float = None, request=None) -> str:
+    """
+    Generate a full response through the scheduler, or finish one already
+    started with llm_submit (`request`).
+    Returns None on failure or timeout; raises LLMQueueFull if the queue is at capacity.
+    """
+    if llm_model.failed:
         logging.error("LLM model is not loaded, cannot generate response.")
         return None
 
-    full_prompt = f"You are a helpful assistant. Respond clearly.\nUser: {prompt}\nBot:"
-    
-    try:
-        response = llama_model(full_prompt, max_tokens=max_tokens, stop=["\n"], echo=False)
-        text = response.get('choices', [{}])[0].get('text', '').strip()
-        return text if text else None
-    except Exception as e:
-        logging.error(f"Error generating response from LLM: {e}")
+    if request is None:
+        request = scheduler.submit(prompt, max_tokens=max_tokens, timeout=timeout)
+    text = request.result().strip()
+    if request.status != "done":
+        logging.warning(f"LLM request ended with status '{request.status}', discarding response.")
         return None
+    return text if text else None
+
+def llm_stream_response(prompt: str, max_tokens: int = 256, timeout: float = None, request=None, on_request=None):
+    """
+    Stream the response as it is generated, yielding text pieces
+    (of `request` if one was already started with llm_submit).
+    `on_request(request)` is called with the LLMRequest before waiting on it,
+    so another thread can cancel() it.
+    Yields nothing if the model is unavailable. Raises LLMQueueFull if the queue
+    is at capacity, LLMTimeout if the deadline cuts generation short and
+    LLMIncomplete if generation failed or was cancelled part way.
+    Closing the generator (e.g. the client disconnected) cancels generation.
+    """
+    if llm_model.failed:
+        logging.error("LLM model is not loaded, cannot generate response.")
+        return
+
+    if request is None:
+        request = scheduler.submit(prompt, max_tokens=max_tokens, timeout=timeout)
+    if on_request is not None:
+        on_request(request)
+    try:
+        yield from request
+    finally:
+        request.cancel()
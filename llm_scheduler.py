@@ -0,0 +1,206 @@
+# llm_scheduler.py
+
+import logging
+import queue
+import threading
+import time
+from metrics import LLM_QUEUE_WAIT_SECONDS, LLM_GENERATION_SECONDS, LLM_REQUESTS_TOTAL
+
+_DONE = object()
+
+
+class LLMQueueFull(RuntimeError):
+    """Raised when the LLM queue is at capacity; the caller should back off."""
+
+
+class LLMIncomplete(RuntimeError):
+    """Raised while streaming when generation stopped early (error or cancelled); text so far is partial."""
+
+
+class LLMTimeout(LLMIncomplete):
+    """Raised while streaming when a request hits its deadline; text so far is partial."""
+
+
+class LLMRequest:
+    """
+    One queued generation. Iterate it to receive text pieces as they are
+    produced, or call result() for the full text. cancel() stops generation
+    (or drops the request if it has not started yet).
+    """
+
+    def __init__(self, prompt: str, max_tokens: int, deadline: float):
+        self.prompt = prompt
+        self.max_tokens = max_tokens
+        self.enqueued_at = time.monotonic()
+        self.deadline = deadline
+        self.started_at = None
+        self.finished_at = None
+        self.status = "queued"  # queued, running, done, cancelled, timeout, error
+        self.error = None
+        self.text = ""
+        self._pieces = queue.Queue()
+        self._done = threading.Event()
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() > self.deadline
+
+    @property
+    def queue_wait(self) -> float:
+        return (self.started_at or time.monotonic()) - self.enqueued_at
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def _push(self, piece: str):
+        self.text += piece
+        self._pieces.put(piece)
+
+    def _finish(self, status: str, error: Exception = None):
+        self.status = status
+        self.error = error
+        self.finished_at = time.monotonic()
+        self._done.set()
+        self._pieces.put(_DONE)
+
+    def __iter__(self):
+        while True:
+            remaining = self.deadline - time.monotonic()
+            try:
+                piece = self._pieces.get(timeout=max(remaining, 0) + 1.0)
+            except queue.Empty:
+                self.cancel()
+                raise LLMTimeout("LLM request timed out waiting for output.")
+            if piece is _DONE:
+                if self.status == "timeout":
+                    raise LLMTimeout("LLM request hit its deadline.")
+                if self.status != "done":
+                    raise LLMIncomplete(f"LLM request ended with status '{self.status}'.")
+                return
+            yield piece
+
+    def result(self) -> str:
+        """Block until generation ends; returns the (possibly partial) text."""
+        self._done.wait(timeout=max(self.deadline - time.monotonic(), 0) + 1.0)
+        if not self._done.is_set():
+            self.cancel()
+        return self.text
+
+
+class LLMScheduler:
+    """
+    Serializes access to one model through a bounded FIFO queue.
+    Requests beyond `max_queue` are rejected immediately (LLMQueueFull);
+    each request has a deadline and can be cancelled while queued or running.
+    `stream_fn(prompt, max_tokens)` must return an iterator of text pieces.
+    """
+
+    def __init__(self, stream_fn, max_queue: int = 8, default_timeout: float = 60.0):
+        self.stream_fn = stream_fn
+        self.default_timeout = default_timeout
+        self._queue = queue.Queue(maxsize=max(1, max_queue))
+        self._stats_lock = threading.Lock()
+        self._counts = {"completed": 0, "rejected": 0, "timeout": 0, "cancelled": 0, "error": 0}
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._started = 0
+        self._running = None
+        self._thread = threading.Thread(target=self._run, name="llm-scheduler", daemon=True)
+        self._thread.start()
+
+    def submit(self, prompt: str, max_tokens: int = 256, timeout: float = None) -> LLMRequest:
+        timeout = self.default_timeout if timeout is None else timeout
+        request = LLMRequest(prompt, max_tokens, time.monotonic() + timeout)
+        try:
+            self._queue.put_nowait(request)
+        except queue.Full:
+            self._count("rejected")
+            logging.warning(f"LLM queue full ({self._queue.maxsize} waiting), rejecting request.")
+            raise LLMQueueFull("LLM is busy, try again shortly.")
+        return request
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self._counts[key] += 1
+        LLM_REQUESTS_TOTAL.inc(status=key)
+
+    def _run(self):
+        while True:
+            request = self._queue.get()
+            if request is None:
+                return
+            if request.cancelled:
+                self._count("cancelled")
+                request._finish("cancelled")
+                continue
+            if request.expired:
+                self._count("timeout")
+                request._finish("timeout")
+                logging.warning(f"LLM request expired after {request.queue_wait:.1f}s in queue.")
+                continue
+
+            request.started_at = time.monotonic()
+            request.status = "running"
+            self._running = request
+            with self._stats_lock:
+                self._started += 1
+                self._wait_total += request.queue_wait
+                self._wait_max = max(self._wait_max, request.queue_wait)
+            LLM_QUEUE_WAIT_SECONDS.observe(request.queue_wait)
+
+            status, error = "done", None
+            pieces = None
+            try:
+                pieces = iter(self.stream_fn(request.prompt, request.max_tokens))
+                for piece in pieces:
+                    request._push(piece)
+                    if request.cancelled:
+                        status = "cancelled"
+                        break
+                    if request.expired:
+                        status = "timeout"
+                        logging.warning("LLM request hit its deadline, stopping generation.")
+                        break
+            except Exception as e:
+                status, error = "error", e
+                logging.error(f"Error generating response from LLM: {e}")
+            finally:
+                # Closing the generator stops llama.cpp from producing more tokens
+                close = getattr(pieces, "close", None)
+                if close is not None:
+                    close()
+                self._running = None
+            LLM_GENERATION_SECONDS.observe(time.monotonic() - request.started_at, status=status)
+            self._count("completed" if status == "done" else status)
+            request._finish(status, error)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "queue_capacity": self._queue.maxsize,
+                "running": 1 if self._running is not None else 0,
+                "avg_queue_wait_ms": self._wait_total / self._started * 1000 if self._started else 0.0,
+                "max_queue_wait_ms": self._wait_max * 1000,
+                **self._counts,
+            }
+
+    def shutdown(self, timeout: float = 5.0):
+        """Cancel the running request and stop the worker (queued requests are dropped)."""
+        running = self._running
+        if running is not None:
+            running.cancel()
+        while True:
+            try:
+                request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is not None:
+                request._finish("cancelled")
+        self._queue.put(None)
+        self._thread.join(timeout=timeout)
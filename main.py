@@ -1,14 +1,15 @@
 
 import logging
-from core import get_response
-from handlers import handle_input
+from config import LOG_LEVEL, LOG_FORMAT
+from pipeline import stream_message
+from memory import flush_writes
+from db import close_connections
 from db_init import initialize_all_databases
+from model_loader import start_warmup
 
 def setup_logging():
-    logging.basicConfig(
-        level=logging.DEBUG,
-        format="%(asctime)s [%(levelname)s] %(message)s",
-    )
+    # force: modules imported above may already have configured the root logger
+    logging.basicConfig(level=LOG_LEVEL, format=LOG_FORMAT, force=True)
 
 def main_loop():
     logging.info("Chatbot started. Waiting for input...")
@@ -24,16 +25,25 @@ def main_loop():
         if not user_input:
             continue  # Ignore empty inputs, wait for real input
 
-        response_data = get_response(user_input)
-        if response_data:
-            print(f"Bot: {response_data['response']}")
-            continue
-
-        # If no match, fall back to handler (which does vector memory + LLM)
-        bot_response = handle_input(user_input)
-        print(f"Bot: {bot_response}")
+        # Rules -> vector memory -> LLM, each stage run once; LLM text is printed as it streams
+        print("Bot: ", end="", flush=True)
+        shown = ""
+        for result in stream_message(user_input):
+            text = result.response or ""
+            if not text.startswith(shown):
+                print("\nBot: ", end="")
+                shown = ""
+            print(text[len(shown):], end="", flush=True)
+            shown = text
+        print()
+
+    # Commit learned answers still waiting in the write-behind queue
+    if not flush_writes():
+        logging.warning("Some vector memory writes were not committed before exit.")
+    close_connections()
 
 if __name__ == "__main__":
     setup_logging()
     initialize_all_databases()  # Setup or fix all DBs before starting
+    start_warmup()  # Load models in the background; rules answer meanwhile
     main_loop()
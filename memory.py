@@ -1,59 +1,443 @@
 
 # memory.py
 
-import sqlite3
+import atexit
+import threading
+import time
 import numpy as np
 import logging
-from sentence_transformers import SentenceTransformer
-from config import VECTOR_MEMORY_DB_PATH, EMBEDDING_MODEL_NAME, SIMILARITY_THRESHOLD
-from utils import cosine_similarity
-
-# Initialize embedding model once (heavy load, don’t do this repeatedly)
-try:
-    model = SentenceTransformer(EMBEDDING_MODEL_NAME)
-    logging.info(f"Loaded embedding model '{EMBEDDING_MODEL_NAME}' successfully.")
-except Exception as e:
-    logging.error(f"Failed to load embedding model '{EMBEDDING_MODEL_NAME}': {e}")
-    model = None
+from config import (
+    VECTOR_MEMORY_DB_PATH, EMBEDDING_MODEL_NAME, SIMILARITY_THRESHOLD, VECTOR_DIM,
+    VECTOR_INDEX_BACKEND, IVF_INDEX_PATH, IVF_NLIST, IVF_NPROBE, IVF_MIN_TRAIN_SIZE, IVF_TRAIN_SAMPLE,
+    VECTOR_STORAGE, VECTOR_SEGMENT_PATH, VECTOR_SEGMENT_DTYPE, EMBED_CACHE_SIZE, EMBED_CACHE_TTL,
+    EMBED_BATCHING, EMBED_BATCH_MAX_SIZE, EMBED_BATCH_MAX_WAIT_MS, DEBUG_LOG_SAMPLE_RATE,
+    MEMORY_CAPACITY, MEMORY_EVICTION_POLICY, MEMORY_EVICTION_SLACK, MEMORY_HIT_FLUSH_INTERVAL,
+    VECTOR_INDEX_DTYPE, VECTOR_RERANK_CANDIDATES, VECTOR_BLOB_DTYPE,
+    MEMORY_WRITE_BEHIND, MEMORY_WRITE_BATCH, MEMORY_WRITE_MAX_DELAY, MEMORY_WRITE_MAX_PENDING,
+    LEXICAL_INDEX, LEXICAL_THRESHOLD, LEXICAL_PREFILTER_MIN_ROWS, LEXICAL_PREFILTER_CANDIDATES,
+)
+from embedding_cache import EmbeddingCache
+from embedding_service import EmbeddingBatcher
+from db import get_connection
+from vector_index import VectorIndex
+from ann_index import IVFIndex
+from vector_store import VectorSegment, migrate, decode_blob
+from model_loader import LazyModel
+from write_behind import WriteBehindQueue
+import lexical_index
+from response_cache import response_cache
+from metrics import (
+    EMBED_SECONDS, VECTOR_SEARCH_SECONDS, LEXICAL_SEARCH_SECONDS, DB_WRITE_SECONDS, MEMORY_EVICTIONS_TOTAL, MEMORY_WRITE_DELAY_SECONDS, Gauge,
+)
+from utils import debug_sampled
+import cpu_budget
+
+def _load_embedding_model():
+    cpu_budget.configure_torch()
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(EMBEDDING_MODEL_NAME)
+
+# Embedding model handle: loaded on first use or by model_loader.start_warmup()
+# (heavy load, don’t do this at import time)
+embedding_model = LazyModel("embedding", _load_embedding_model)
 
 def ensure_table():
     """Ensure the vector memory table exists in the DB."""
-    with sqlite3.connect(VECTOR_MEMORY_DB_PATH) as conn:
+    with get_connection(VECTOR_MEMORY_DB_PATH) as conn:
         cursor = conn.cursor()
         cursor.execute('''
         CREATE TABLE IF NOT EXISTS memory (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             input TEXT UNIQUE,
             response TEXT,
-            vector BLOB
+            vector BLOB,
+            hits INTEGER NOT NULL DEFAULT 0,
+            last_used REAL NOT NULL DEFAULT 0
         )
         ''')
+        # Usage columns for eviction; tables created before they existed get them here
+        cursor.execute("PRAGMA table_info(memory)")
+        columns = [col[1] for col in cursor.fetchall()]
+        if 'hits' not in columns:
+            cursor.execute("ALTER TABLE memory ADD COLUMN hits INTEGER NOT NULL DEFAULT 0")
+        if 'last_used' not in columns:
+            cursor.execute("ALTER TABLE memory ADD COLUMN last_used REAL NOT NULL DEFAULT 0")
+            cursor.execute("UPDATE memory SET last_used = ?", (time.time(),))
+            logging.info("Added usage columns (hits, last_used) to the memory table.")
+        cursor.execute("CREATE INDEX IF NOT EXISTS memory_last_used ON memory (last_used)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS memory_hits ON memory (hits, last_used)")
+        if LEXICAL_INDEX:
+            lexical_index.ensure_fts(conn)
+        else:
+            lexical_index.drop_fts(conn)
         conn.commit()
     logging.debug(f"Ensured vector memory table at {VECTOR_MEMORY_DB_PATH}")
 
+# Recently computed embeddings, so one message is encoded at most once
+embedding_cache = EmbeddingCache(max_size=EMBED_CACHE_SIZE, ttl=EMBED_CACHE_TTL)
+
+def _encode_batch(texts: list) -> np.ndarray:
+    """Runs on the batcher thread, which is pinned to the embedding model's cores (CPU_BUDGET_PIN)."""
+    cpu_budget.pin_thread("embed")
+    return embedding_model.get().encode(texts)
+
+# Concurrent embed() calls are coalesced into one model.encode(list) call
+embedding_batcher = EmbeddingBatcher(
+    _encode_batch, max_batch_size=EMBED_BATCH_MAX_SIZE, max_wait_ms=EMBED_BATCH_MAX_WAIT_MS
+) if EMBED_BATCHING else None
+
 def embed(text: str) -> np.ndarray:
-    """Convert input text to embedding vector (float32)."""
+    """Convert input text to embedding vector (float32), using the embedding cache."""
+    started = time.perf_counter()
+    cached = embedding_cache.get(text)
+    if cached is not None:
+        EMBED_SECONDS.observe(time.perf_counter() - started, cache="hit")
+        return cached
+    model = embedding_model.get()
     if model is None:
         raise RuntimeError("Embedding model not loaded.")
-    vec = model.encode(text)
-    return vec.astype(np.float32)
+    if embedding_batcher is not None:
+        vec = embedding_batcher.embed(text)
+    else:
+        vec = model.encode(text)
+    vec = embedding_cache.put(text, vec.astype(np.float32))
+    EMBED_SECONDS.observe(time.perf_counter() - started, cache="miss")
+    return vec
+
+def embed_many(texts: list, batch_size: int = 128) -> np.ndarray:
+    """
+    Embed many texts at once: cached ones come from the embedding cache, the
+    rest are encoded in a single encode(list) call. Returns a (len(texts), dim) array.
+    """
+    vectors = [embedding_cache.get(text) for text in texts]
+    missing = [i for i, vec in enumerate(vectors) if vec is None]
+    if missing:
+        model = embedding_model.get()
+        if model is None:
+            raise RuntimeError("Embedding model not loaded.")
+        started = time.perf_counter()
+        encoded = np.asarray(model.encode([texts[i] for i in missing], batch_size=batch_size), dtype=np.float32)
+        for i, vec in zip(missing, encoded):
+            vectors[i] = embedding_cache.put(texts[i], vec)
+        EMBED_SECONDS.observe((time.perf_counter() - started) / len(missing), cache="miss")
+    return np.stack(vectors) if vectors else np.zeros((0, VECTOR_DIM), dtype=np.float32)
 
 def vector_to_blob(vector: np.ndarray) -> bytes:
-    """Serialize numpy vector to bytes for SQLite BLOB storage."""
-    return vector.tobytes()
+    """Serialize numpy vector to bytes for SQLite BLOB storage (VECTOR_BLOB_DTYPE)."""
+    return np.asarray(vector).astype(VECTOR_BLOB_DTYPE).tobytes()
 
 def blob_to_vector(blob: bytes) -> np.ndarray:
-    """Deserialize bytes back to numpy vector."""
-    return np.frombuffer(blob, dtype=np.float32)
+    """Deserialize bytes back to a float32 numpy vector."""
+    return decode_blob(blob, VECTOR_DIM)
+
+# Multi-process serving (serve.py): worker processes forward saves and hit counts
+# to the single writer process, which publishes every change back to the workers
+_forward = None
+_publish = None
+
+def forward_writes(send):
+    """Worker mode: pass writes to send(message) instead of writing vector_memory.db here."""
+    global _forward
+    _forward = send
+
+def publish_changes(publish):
+    """Writer mode: call publish(change) after each memory row is added or removed."""
+    global _publish
+    _publish = publish
+
+# In-process vector index, loaded from the DB on first use.
+# Saves hold the same lock so a row is never missed (or added twice) while the index loads.
+_index = None
+_index_lock = threading.RLock()
+
+Gauge("neurochat_memory_vectors", "Vectors in the loaded memory index (0 until it loads).",
+      lambda: len(_index) if _index is not None else 0)
+Gauge("neurochat_memory_index_bytes", "Bytes of vector data held by the memory index (see VECTOR_INDEX_DTYPE).",
+      lambda: _index.nbytes if _index is not None else 0)
+
+def create_index(segment: VectorSegment = None) -> VectorIndex:
+    """Create an index for the configured VECTOR_INDEX_BACKEND and VECTOR_INDEX_DTYPE."""
+    dtype = VECTOR_INDEX_DTYPE
+    if segment is not None and dtype != "float32":
+        # A segment is searched as stored; its precision is VECTOR_SEGMENT_DTYPE
+        logging.warning(f"VECTOR_INDEX_DTYPE '{dtype}' is ignored with segment storage.")
+        dtype = "float32"
+    if VECTOR_INDEX_BACKEND == "ivf":
+        return IVFIndex(
+            VECTOR_DIM, nlist=IVF_NLIST, nprobe=IVF_NPROBE,
+            min_train_size=IVF_MIN_TRAIN_SIZE, train_sample=IVF_TRAIN_SAMPLE,
+            segment=segment, dtype=dtype,
+        )
+    if VECTOR_INDEX_BACKEND != "exact":
+        logging.warning(f"Unknown VECTOR_INDEX_BACKEND '{VECTOR_INDEX_BACKEND}', using exact search.")
+    return VectorIndex(VECTOR_DIM, segment=segment, dtype=dtype)
+
+def load_index() -> VectorIndex:
+    """
+    Build the vector index from the memory table.
+    In segment storage mode the vectors are memory-mapped from VECTOR_SEGMENT_PATH
+    (any rows still holding BLOBs are migrated first) and only text comes from SQLite.
+    Worker processes (see forward_writes) only read; the writer prepares the files.
+    """
+    if _forward is None:
+        ensure_table()
+    if VECTOR_STORAGE == "segment":
+        if _forward is None:
+            migrate(VECTOR_MEMORY_DB_PATH, VECTOR_SEGMENT_PATH, VECTOR_DIM, dtype=VECTOR_SEGMENT_DTYPE)
+        index = create_index(VectorSegment(VECTOR_SEGMENT_PATH, VECTOR_DIM, VECTOR_SEGMENT_DTYPE))
+        with get_connection(VECTOR_MEMORY_DB_PATH) as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id, input, response FROM memory")
+            index.set_texts({row_id: (stored_input, stored_response) for row_id, stored_input, stored_response in cursor})
+    else:
+        index = create_index()
+        with get_connection(VECTOR_MEMORY_DB_PATH) as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id, input, response, vector FROM memory ORDER BY id")
+            rows = cursor.fetchall()
+        index.add_many(
+            (row_id, stored_input, stored_response, blob_to_vector(vector_blob))
+            for row_id, stored_input, stored_response, vector_blob in rows
+            if vector_blob is not None
+        )
+    if isinstance(index, IVFIndex):
+        index.prepare(IVF_INDEX_PATH)
+    logging.info(f"Loaded {len(index)} vectors into memory index.")
+    return index
+
+def get_index() -> VectorIndex:
+    """Return the shared vector index, loading it once."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = load_index()
+                enforce_capacity()
+    return _index
+
+# Hits are counted in RAM and written in one batch every MEMORY_HIT_FLUSH_INTERVAL seconds
+_pending_hits = {}
+_hits_lock = threading.Lock()
+_last_hit_flush = time.monotonic()
+
+def record_hit(row_id: int):
+    """Count a vector memory match for eviction (hits and last_used)."""
+    if row_id is None:
+        return  # Matched a row that is still queued for writing
+    now = time.time()
+    with _hits_lock:
+        count, _ = _pending_hits.get(row_id, (0, now))
+        _pending_hits[row_id] = (count + 1, now)
+        due = time.monotonic() - _last_hit_flush >= MEMORY_HIT_FLUSH_INTERVAL
+    if due:
+        flush_hits()
+
+def flush_hits() -> int:
+    """Write buffered hit counts to the memory table. Returns the number of rows updated."""
+    global _last_hit_flush
+    with _hits_lock:
+        pending = _pending_hits.copy()
+        _pending_hits.clear()
+        _last_hit_flush = time.monotonic()
+    if not pending:
+        return 0
+    if _forward is not None:
+        _forward(("hits", pending))
+        return len(pending)
+    return write_hits(pending)
+
+def write_hits(pending: dict) -> int:
+    """Add {row_id: (count, last_used)} to the memory table's hits / last_used columns."""
+    try:
+        with DB_WRITE_SECONDS.time(table="memory"), get_connection(VECTOR_MEMORY_DB_PATH) as conn:
+            conn.executemany(
+                "UPDATE memory SET hits = hits + ?, last_used = MAX(last_used, ?) WHERE id = ?",
+                [(count, last_used, row_id) for row_id, (count, last_used) in pending.items()]
+            )
+    except Exception as e:
+        logging.error(f"Failed to record vector memory hits: {e}")
+    return len(pending)
+
+atexit.register(flush_hits)
+
+def evict(count: int, policy: str = MEMORY_EVICTION_POLICY) -> int:
+    """
+    Delete `count` rows: least recently matched first ('lru'),
+    or fewest matches first with ties broken by age ('lfu').
+    Returns the number of rows deleted.
+    """
+    if count <= 0:
+        return 0
+    if policy not in ("lru", "lfu"):
+        logging.warning(f"Unknown MEMORY_EVICTION_POLICY '{policy}', using lru.")
+        policy = "lru"
+    flush_hits()
+    order = "hits, last_used" if policy == "lfu" else "last_used"
+    with _index_lock:
+        with DB_WRITE_SECONDS.time(table="memory"), get_connection(VECTOR_MEMORY_DB_PATH) as conn:
+            cursor = conn.execute(f"SELECT id FROM memory ORDER BY {order}, id LIMIT ?", (count,))
+            row_ids = [row[0] for row in cursor.fetchall()]
+            conn.executemany("DELETE FROM memory WHERE id = ?", ((row_id,) for row_id in row_ids))
+        if _index is not None:
+            _index.remove(row_ids)
+        response_cache.memory_removed(row_ids)
+        if _publish is not None and row_ids:
+            _publish(("memory_removed", row_ids))
+    MEMORY_EVICTIONS_TOTAL.inc(len(row_ids))
+    logging.info(f"Evicted {len(row_ids)} vector memory rows ({policy}).")
+    return len(row_ids)
+
+def enforce_capacity():
+    """Evict down to MEMORY_CAPACITY (minus some slack) once the index has grown past it."""
+    if MEMORY_CAPACITY <= 0 or _forward is not None:
+        return
+    with _index_lock:
+        if _index is not None or _publish is None:
+            size = len(get_index())
+        else:
+            # The writer process keeps no index of its own in sqlite mode
+            size = get_connection(VECTOR_MEMORY_DB_PATH).execute("SELECT COUNT(*) FROM memory").fetchone()[0]
+        if size > MEMORY_CAPACITY:
+            evict(size - MEMORY_CAPACITY + int(MEMORY_CAPACITY * MEMORY_EVICTION_SLACK))
+
+def find_best_match(vec: np.ndarray, on_candidates=None, text: str = None):
+    """
+    Return the closest stored entry for an already-computed embedding as a dict
+    with 'id', 'input', 'response' and 'score', or None if memory is empty.
+    Rows still queued for writing are included, with 'id' None.
+    on_candidates(score) is called with a provisional best score while search
+    work that may still change it is pending: the full scan after a lexical
+    prefilter miss, or the re-ranking of a quantized index. With the exact
+    float32 index and no prefilter nothing is pending and it is never called.
+    With the input `text` and a memory of LEXICAL_PREFILTER_MIN_ROWS or more,
+    only its lexical candidates are scored; the full index is searched when
+    none of them reaches SIMILARITY_THRESHOLD.
+    """
+    index = get_index()
+    # Reduced-precision scores only shortlist candidates; the final order uses float32
+    quantized = index.dtype != np.float32
+    k = max(VECTOR_RERANK_CANDIDATES, 1) if quantized else 1
+    with VECTOR_SEARCH_SECONDS.time():
+        matches = None
+        if text and LEXICAL_INDEX and 0 < LEXICAL_PREFILTER_MIN_ROWS <= len(index):
+            matches = index.search_ids(vec, lexical_candidates(text, LEXICAL_PREFILTER_CANDIDATES), k=k)
+            if not matches or matches[0]["score"] < SIMILARITY_THRESHOLD:
+                if matches and on_candidates is not None:
+                    on_candidates(matches[0]["score"])  # The full scan below may still find a better row
+                matches = None
+        if matches is None:
+            matches = index.search(vec, k=k)
+        if quantized and len(matches) > 1:
+            if on_candidates is not None:
+                on_candidates(matches[0]["score"])  # Re-ranking may still change the best score
+            matches = rerank(vec, matches)
+        unsaved = _search_unsaved(vec) if _unsaved else None
+    if unsaved is not None and (not matches or unsaved["score"] > matches[0]["score"]):
+        return unsaved
+    if debug_sampled(DEBUG_LOG_SAMPLE_RATE):
+        # Sampled replacement for the old per-row similarity log
+        for candidate in index.search(vec, k=5):
+            logging.debug(f"Similarity between input and '{candidate['input']}': {candidate['score']:.4f}")
+    if not matches or matches[0]["response"] is None:
+        return None
+    return matches[0]
+
+def find_best_matches(vectors: np.ndarray, texts: list = None) -> list:
+    """
+    find_best_match for many embeddings: one matrix-matrix search over the
+    index instead of a scan per query. Returns a match dict (or None) per row.
+    """
+    index = get_index()
+    quantized = index.dtype != np.float32
+    if texts is not None and LEXICAL_INDEX and 0 < LEXICAL_PREFILTER_MIN_ROWS <= len(index):
+        return [find_best_match(vec, text=text) for vec, text in zip(vectors, texts)]
+    with VECTOR_SEARCH_SECONDS.time():
+        all_matches = index.search_many(vectors, k=max(VECTOR_RERANK_CANDIDATES, 1) if quantized else 1)
+    best = []
+    for vec, matches in zip(vectors, all_matches):
+        if quantized and len(matches) > 1:
+            matches = rerank(vec, matches)
+        unsaved = _search_unsaved(vec) if _unsaved else None
+        if unsaved is not None and (not matches or unsaved["score"] > matches[0]["score"]):
+            best.append(unsaved)
+        elif not matches or matches[0]["response"] is None:
+            best.append(None)
+        else:
+            best.append(matches[0])
+    return best
+
+def rerank(vec: np.ndarray, matches: list) -> list:
+    """
+    Re-score candidates against their full-precision BLOBs, best first.
+    Candidates without a BLOB (segment storage) keep their approximate score.
+    """
+    ids = [match["id"] for match in matches]
+    with get_connection(VECTOR_MEMORY_DB_PATH) as conn:
+        rows = conn.execute(
+            f"SELECT id, vector FROM memory WHERE id IN ({','.join('?' * len(ids))})", ids
+        ).fetchall()
+    blobs = {row_id: blob for row_id, blob in rows if blob is not None}
+    query = VectorIndex.normalize(vec)
+    for match in matches:
+        blob = blobs.get(match["id"])
+        if blob is not None:
+            match["score"] = float(VectorIndex.normalize(blob_to_vector(blob)) @ query)
+    matches.sort(key=lambda match: match["score"], reverse=True)
+    return matches
+
+def lexical_candidates(text: str, limit: int) -> list:
+    """Ids of up to `limit` memory rows sharing words with `text`, best BM25 rank first."""
+    with LEXICAL_SEARCH_SECONDS.time():
+        rows = lexical_index.search(get_connection(VECTOR_MEMORY_DB_PATH), text, limit)
+    return [row[0] for row in rows]
+
+def find_best_lexical_match(text: str, candidates: int = 10):
+    """
+    Word-overlap match for when no embedding is available: the stored input
+    among the top BM25 candidates with the highest lexical_index.overlap_score.
+    Returns a dict like find_best_match, or None.
+    """
+    if not LEXICAL_INDEX:
+        return None
+    with LEXICAL_SEARCH_SECONDS.time():
+        rows = lexical_index.search(get_connection(VECTOR_MEMORY_DB_PATH), text, candidates)
+    if not rows:
+        return None
+    scored = [(lexical_index.overlap_score(text, stored_input), row_id, stored_input, stored_response)
+              for row_id, stored_input, stored_response in rows]
+    score, row_id, stored_input, stored_response = max(scored, key=lambda item: item[0])
+    return {"id": row_id, "input": stored_input, "response": stored_response, "score": score}
+
+def check_lexical_memory(user_input: str, threshold: float = LEXICAL_THRESHOLD):
+    """
+    Degraded-mode memory check used while the embedding model is loading or failed.
+    Returns dict with 'input', 'response', 'id' and 'score' or None.
+    """
+    try:
+        best = find_best_lexical_match(user_input)
+    except Exception as e:
+        logging.error(f"Error during lexical memory lookup: {e}")
+        return None
+    if best is None or best["score"] < threshold:
+        logging.info(f"No lexical memory match above threshold ({threshold}).")
+        return None
+    logging.info(f"Lexical memory matched '{best['input']}' with score {best['score']:.3f}")
+    record_hit(best["id"])
+    return best
 
 def check_vector_memory(user_input: str, threshold: float = SIMILARITY_THRESHOLD):
     """
     Check vector memory for best match above similarity threshold.
-    Returns dict with 'input' and 'response' or None.
+    Returns dict with 'input', 'response', 'id' and 'score' or None.
+    Without an embedding model it falls back to check_lexical_memory.
     """
-    if model is None:
-        logging.error("Embedding model not available, skipping vector memory check.")
-        return None
+    if embedding_model.failed:
+        logging.error("Embedding model not available, using lexical memory matching.")
+        return check_lexical_memory(user_input)
+    if not embedding_model.ready and embedding_cache.peek(user_input) is None:
+        embedding_model.loading()  # Starts the load if nothing has yet
+        logging.info("Embedding model still loading, using lexical memory matching.")
+        return check_lexical_memory(user_input)
 
     try:
         vec = embed(user_input)
@@ -61,26 +445,13 @@ def check_vector_memory(user_input: str, threshold: float = SIMILARITY_THRESHOLD
         logging.error(f"Error generating embedding for input '{user_input}': {e}")
         return None
 
-    best_match = None
-    best_score = -1
-
     try:
-        with sqlite3.connect(VECTOR_MEMORY_DB_PATH) as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT input, response, vector FROM memory")
-            rows = cursor.fetchall()
-
-        for stored_input, stored_response, vector_blob in rows:
-            stored_vec = blob_to_vector(vector_blob)
-            sim = cosine_similarity(vec, stored_vec)
-            logging.debug(f"Similarity between input and '{stored_input}': {sim:.4f}")
-            if sim > best_score:
-                best_score = sim
-                best_match = {"input": stored_input, "response": stored_response}
-
+        best = find_best_match(vec, text=user_input)
+        best_score = best["score"] if best else -1
         if best_score >= threshold:
-            logging.info(f"Vector memory matched '{best_match['input']}' with similarity {best_score:.3f}")
-            return best_match
+            logging.info(f"Vector memory matched '{best['input']}' with similarity {best_score:.3f}")
+            record_hit(best["id"])
+            return {"input": best["input"], "response": best["response"], "id": best["id"], "score": best_score}
         else:
             logging.info(f"No vector memory match above threshold ({threshold}). Best similarity: {best_score:.3f}")
             return None
@@ -89,29 +460,147 @@ def check_vector_memory(user_input: str, threshold: float = SIMILARITY_THRESHOLD
         logging.error(f"Error during vector memory lookup: {e}")
         return None
 
-def save_to_memory(user_input: str, response: str):
+# Rows saved but not yet committed: input -> (response, normalized vector).
+# find_best_match searches them too, so a new entry matches as soon as it is queued.
+_unsaved = {}
+_unsaved_lock = threading.Lock()
+
+def _search_unsaved(vec: np.ndarray):
+    with _unsaved_lock:
+        items = list(_unsaved.items())
+    if not items:
+        return None
+    scores = np.stack([vector for _, (_, vector) in items]) @ VectorIndex.normalize(vec)
+    best = int(np.argmax(scores))
+    return {"id": None, "input": items[best][0], "response": items[best][1][0], "score": float(scores[best])}
+
+def _write_rows(rows: list):
+    """
+    Insert (input, response, vector or None, queued_at) rows in one transaction,
+    then add the new ones to the index. Missing vectors are computed here.
+    """
+    ready = []
+    for user_input, response, vec, queued_at in rows:
+        if vec is None:
+            try:
+                vec = embed(user_input)
+            except Exception as e:
+                logging.error(f"Failed to embed '{user_input}' for vector memory: {e}")
+                continue
+        ready.append((user_input, response, vec))
+
+    try:
+        with _index_lock:
+            added = []
+            now = time.time()
+            with DB_WRITE_SECONDS.time(table="memory"), get_connection(VECTOR_MEMORY_DB_PATH) as conn:
+                for user_input, response, vec in ready:
+                    # In segment mode the vector goes to the segment file and SQLite keeps only the text
+                    blob = None if VECTOR_STORAGE == "segment" else vector_to_blob(vec)
+                    cursor = conn.execute(
+                        "INSERT OR IGNORE INTO memory (input, response, vector, last_used) VALUES (?, ?, ?, ?)",
+                        (user_input, response, blob, now)
+                    )
+                    if cursor.rowcount == 1:
+                        added.append((cursor.lastrowid, user_input, response, vec))
+            for row_id, user_input, response, vec in added:
+                # Segment mode always appends (the segment file is the vector store)
+                if _index is not None or VECTOR_STORAGE == "segment":
+                    get_index().add(row_id, user_input, response, vec)
+                if _publish is not None:
+                    _publish(("memory_added", row_id, user_input, response, np.asarray(vec, dtype=np.float32)))
+                response_cache.memory_added(vec, response)
+                logging.info(f"Saved new input to vector memory: '{user_input}'")
+            if added and (_index is not None or _publish is not None):
+                enforce_capacity()
+    finally:
+        with _unsaved_lock:
+            for user_input, _, _, _ in rows:
+                _unsaved.pop(user_input, None)
+        committed = time.monotonic()
+        for _, _, _, queued_at in rows:
+            MEMORY_WRITE_DELAY_SECONDS.observe(committed - queued_at)
+
+# Started on the first queued save: serve.py workers forward their writes and never need one
+memory_writer = None
+_writer_lock = threading.Lock()
+
+def _get_writer():
+    global memory_writer
+    if memory_writer is None and MEMORY_WRITE_BEHIND:
+        with _writer_lock:
+            if memory_writer is None:
+                memory_writer = WriteBehindQueue(
+                    _write_rows, max_batch_size=MEMORY_WRITE_BATCH, max_delay=MEMORY_WRITE_MAX_DELAY,
+                    max_pending=MEMORY_WRITE_MAX_PENDING, name="memory-writer",
+                )
+    return memory_writer
+
+Gauge("neurochat_memory_write_queue_depth", "Rows queued by save_to_memory and not yet committed.",
+      lambda: memory_writer.depth() if memory_writer is not None else 0)
+Gauge("neurochat_memory_write_oldest_seconds", "Age of the oldest row waiting to be committed.",
+      lambda: memory_writer.oldest_age() if memory_writer is not None else 0)
+
+def flush_writes(timeout: float = 10.0) -> bool:
+    """Commit every row queued by save_to_memory. Returns False if it did not finish in time."""
+    if memory_writer is None:
+        return True
+    return memory_writer.flush(timeout)
+
+atexit.register(flush_writes)
+
+def save_to_memory(user_input: str, response: str, vector: np.ndarray = None):
     """
     Save user input, response, and embedding vector to memory.
+    Pass `vector` to reuse an embedding already computed for the lookup.
+    With MEMORY_WRITE_BEHIND the row is queued and written in the background
+    and is matchable right away. Without a vector it is embedded here first;
+    only while the embedding model is still loading is it queued unembedded,
+    and then it becomes matchable once the writer has stored it.
     Ignores if input already exists.
     """
-    if model is None:
+    if vector is None and embedding_model.failed:
         logging.error("Embedding model not available, skipping save to vector memory.")
         return
 
     try:
-        vec = embed(user_input)
-        blob = vector_to_blob(vec)
-        with sqlite3.connect(VECTOR_MEMORY_DB_PATH) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "INSERT OR IGNORE INTO memory (input, response, vector) VALUES (?, ?, ?)",
-                (user_input, response, blob)
-            )
-            conn.commit()
-        logging.info(f"Saved new input to vector memory: '{user_input}'")
+        if _forward is not None:
+            vec = embed(user_input) if vector is None else vector
+            _forward(("memory", user_input, response, np.asarray(vec, dtype=np.float32)))
+            logging.info(f"Sent new input to the memory writer: '{user_input}'")
+            return
+        writer = _get_writer()
+        if writer is None:
+            vec = embed(user_input) if vector is None else vector
+            _write_rows([(user_input, response, vec, time.monotonic())])
+            return
+        if vector is None and (embedding_model.ready or embedding_cache.peek(user_input) is not None):
+            vector = embed(user_input)
+        if vector is not None:
+            with _unsaved_lock:
+                _unsaved[user_input] = (response, VectorIndex.normalize(np.asarray(vector).reshape(-1)))
+            response_cache.memory_added(vector, response)
+        writer.put((user_input, response, vector, time.monotonic()))
+        logging.debug(f"Queued new input for vector memory: '{user_input}'")
     except Exception as e:
         logging.error(f"Failed to save to vector memory: {e}")
 
-# Ensure table exists on import
-ensure_table()
-
+def apply_change(change: tuple):
+    """Apply a change published by the writer process (see serve.py) to this worker's index."""
+    with _index_lock:
+        if _index is None:
+            return  # The index is read from the DB, which already has the change, when it loads
+        if change[0] == "memory_added":
+            _, row_id, stored_input, stored_response, vec = change
+            if VECTOR_STORAGE == "segment":
+                # The writer appended the vector; map it along with any rows published before it
+                cursor = get_connection(VECTOR_MEMORY_DB_PATH).execute(
+                    "SELECT id, input, response FROM memory WHERE id > ?", (_index.last_id,)
+                )
+                _index.refresh_segment({row[0]: (row[1], row[2]) for row in cursor})
+            elif row_id not in _index:
+                _index.add(row_id, stored_input, stored_response, vec)
+            response_cache.memory_added(vec, stored_response)
+        elif change[0] == "memory_removed":
+            _index.remove(change[1])
+            response_cache.memory_removed(change[1])
@@ -0,0 +1,191 @@
+# metrics.py
+
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Every metric registers itself here in creation order; render() walks this list
+_registry = []
+
+# Latency buckets in seconds: sub-millisecond rule lookups up to minute-long LLM generations
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(labelnames, values, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter, optionally split by label values: inc(source='rule')."""
+
+    def __init__(self, name: str, help_text: str, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(str(labels.get(name, "")) for name in self.labelnames), 0)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram (Prometheus semantics: cumulative buckets, _sum and _count).
+    observe() is a bisect plus a few additions under a lock, cheap enough for the request path.
+    """
+
+    def __init__(self, name: str, help_text: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        slot = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[slot] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall time of a `with` block."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels) -> int:
+        series = self._series.get(tuple(str(labels.get(name, "")) for name in self.labelnames))
+        return series[-1] if series else 0
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        for key, series in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), series):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{labels} {series[-1]}")
+        return lines
+
+
+class Gauge:
+    """Value read from a callback at scrape time (queue depth, index size...)."""
+
+    def __init__(self, name: str, help_text: str, fn):
+        self.name = name
+        self.help = help_text
+        self.fn = fn
+        _registry.append(self)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        try:
+            lines.append(f"{self.name} {_format_value(float(self.fn()))}")
+        except Exception as e:
+            logging.warning(f"Could not read gauge {self.name}: {e}")
+        return lines
+
+
+# === Application metrics (observed where the work happens) ===
+RULE_LOOKUP_SECONDS = Histogram("neurochat_rule_lookup_seconds", "Time to match input against the rules.")
+EMBED_SECONDS = Histogram("neurochat_embed_seconds", "Time to embed one input, by embedding cache result.",
+                          labelnames=("cache",))
+VECTOR_SEARCH_SECONDS = Histogram("neurochat_vector_search_seconds", "Nearest-neighbour search over vector memory.")
+LEXICAL_SEARCH_SECONDS = Histogram("neurochat_lexical_search_seconds", "Full-text search over memory inputs.")
+LLM_QUEUE_WAIT_SECONDS = Histogram("neurochat_llm_queue_wait_seconds", "Time LLM requests spent queued before generation.")
+LLM_GENERATION_SECONDS = Histogram("neurochat_llm_generation_seconds", "LLM generation time, by final request status.",
+                                   labelnames=("status",))
+DB_WRITE_SECONDS = Histogram("neurochat_db_write_seconds", "Time to write (and commit) a row, by table.",
+                             labelnames=("table",))
+REQUEST_SECONDS = Histogram("neurochat_request_seconds", "End-to-end pipeline time, by answering tier.",
+                            labelnames=("source",))
+RESPONSES_TOTAL = Counter("neurochat_responses_total", "Requests answered, by tier (cache, rule, memory, llm, busy, warming, fallback).",
+                          labelnames=("source",))
+RESPONSE_CACHE_TOTAL = Counter("neurochat_response_cache_total", "Response cache lookups by result (hit, miss).",
+                               labelnames=("result",))
+MEMORY_WRITE_DELAY_SECONDS = Histogram("neurochat_memory_write_delay_seconds",
+                                       "Time from save_to_memory until the row is committed (write-behind lag).")
+MEMORY_EVICTIONS_TOTAL = Counter("neurochat_memory_evictions_total", "Vector memory rows evicted to stay within MEMORY_CAPACITY.")
+LLM_SPECULATIVE_TOTAL = Counter("neurochat_llm_speculative_total",
+                                "LLM requests started before memory missed, by outcome (used, cancelled).",
+                                labelnames=("outcome",))
+LLM_REQUESTS_TOTAL = Counter("neurochat_llm_requests_total", "LLM requests by outcome (completed, rejected, timeout, cancelled, error).",
+                             labelnames=("status",))
+
+
+def render() -> str:
+    """All registered metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in list(_registry):
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes every few seconds would flood the application log
+        pass
+
+
+def start_metrics_server(host: str = "127.0.0.1", port: int = 9464) -> ThreadingHTTPServer:
+    """Serve GET /metrics from a daemon thread. Returns the server (call shutdown() to stop it)."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True)
+    thread.start()
+    logging.info(f"Serving metrics on http://{host}:{server.server_address[1]}/metrics")
+    return server
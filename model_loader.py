@@ -0,0 +1,109 @@
+# model_loader.py
+
+import logging
+import threading
+import time
+
+# Every LazyModel registers itself here so readiness can be reported in one place
+_registry = {}
+
+
+class LazyModel:
+    """
+    Deferred handle for a heavy model. Nothing is loaded at import time;
+    the model loads on the first get() or in a background warm-up thread.
+    State is one of: not_loaded, loading, ready, failed.
+    """
+
+    def __init__(self, name: str, loader):
+        self.name = name
+        self.loader = loader
+        self.state = "not_loaded"
+        self.error = None
+        self.load_seconds = None
+        self._model = None
+        self._lock = threading.Lock()
+        self._starting = threading.Lock()
+        self._loaded = threading.Event()
+        _registry[name] = self
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    @property
+    def failed(self) -> bool:
+        return self.state == "failed"
+
+    def _load(self):
+        with self._lock:
+            if self.state in ("ready", "failed"):
+                return
+            self.state = "loading"
+            started = time.perf_counter()
+            try:
+                logging.info(f"Loading {self.name} model...")
+                self._model = self.loader()
+                self.state = "ready"
+                logging.info(f"Loaded {self.name} model in {time.perf_counter() - started:.1f}s.")
+            except Exception as e:
+                self.error = str(e)
+                self.state = "failed"
+                logging.error(f"Failed to load {self.name} model: {e}")
+            finally:
+                self.load_seconds = time.perf_counter() - started
+                self._loaded.set()
+
+    def get(self, timeout: float = None):
+        """Return the model, loading it (or waiting for the warm-up) if needed. None if loading failed."""
+        if self.state == "ready":
+            return self._model
+        if self.state == "not_loaded":
+            self._load()
+        else:
+            self._loaded.wait(timeout)
+        return self._model if self.state == "ready" else None
+
+    def override(self, model):
+        """Use an already-constructed model (e.g. a stand-in for benchmarks) instead of loading one."""
+        with self._lock:
+            self._model = model
+            self.state = "ready"
+            self.error = None
+            self.load_seconds = 0.0
+            self._loaded.set()
+
+    def start_warmup(self) -> threading.Thread:
+        """Load the model in a background thread. Returns None if it is already loading or loaded."""
+        with self._starting:
+            if self.state != "not_loaded":
+                return None
+            self.state = "loading"  # Set here so concurrent callers do not start a second thread
+        thread = threading.Thread(target=self._load, name=f"warmup-{self.name}", daemon=True)
+        thread.start()
+        return thread
+
+    def loading(self) -> bool:
+        """
+        True while the model is loading. A model nobody has started loading
+        is started in the background here, so callers that only answer
+        "still warming up" in the meantime never wait on a load that never runs.
+        """
+        if self.state == "not_loaded":
+            self.start_warmup()
+        return self.state == "loading"
+
+    def status(self) -> dict:
+        return {"state": self.state, "load_seconds": self.load_seconds, "error": self.error}
+
+
+def start_warmup():
+    """Start background loading of every registered model."""
+    for lazy_model in _registry.values():
+        lazy_model.start_warmup()
+
+
+def health() -> dict:
+    """Readiness summary: {'ready': bool, 'models': {name: status}}."""
+    models = {name: lazy_model.status() for name, lazy_model in _registry.items()}
+    return {"ready": all(m["state"] == "ready" for m in models.values()), "models": models}
@@ -0,0 +1,431 @@
+# pipeline.py
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+import numpy as np
+from config import SIMILARITY_THRESHOLD, LEXICAL_THRESHOLD, PIPELINE_PARALLEL_TIERS, PIPELINE_TIER_THREADS, LLM_SPECULATIVE_MARGIN
+from rules import check_rules, refresh_rules
+from memory import (
+    embed, embed_many, find_best_match, find_best_matches, find_best_lexical_match, save_to_memory, record_hit,
+    embedding_model, embedding_cache,
+)
+from llm import llm_generate_response, llm_stream_response, llm_submit, llm_model, LLMQueueFull, LLMIncomplete
+from response_cache import response_cache
+from metrics import RESPONSES_TOTAL, REQUEST_SECONDS, RESPONSE_CACHE_TOTAL, LLM_SPECULATIVE_TOTAL
+
+# Background embeddings for requests still in the cache/rules stages
+_tier_executor = ThreadPoolExecutor(max_workers=max(1, PIPELINE_TIER_THREADS), thread_name_prefix="tier")
+
+FALLBACK_RESPONSE = "Sorry, I don't know how to respond. Can you teach me something new?"
+BUSY_RESPONSE = "I'm handling a lot of questions right now. Please try again in a moment."
+WARMING_RESPONSE = "I'm still starting up. Please ask again in a few moments."
+
+
+@dataclass
+class PipelineResult:
+    """
+    Outcome of one request: the answer, which tier produced it
+    ('cache', 'rule', 'memory', 'llm', 'busy', 'warming' or 'fallback') and per-stage timings in seconds.
+    For a cached answer `cached_source` is the tier that originally produced it.
+    Intermediate results (embedding, best memory match) are kept for reuse.
+    `speculative` is set when the LLM answer was started before memory missed.
+    """
+    user_input: str
+    response: str = None
+    source: str = None
+    cached_source: str = None
+    vector: np.ndarray = None
+    similarity: float = None
+    matched_id: int = None
+    matched_input: str = None
+    saved: bool = False
+    truncated: bool = False
+    complete: bool = False
+    speculative: bool = False
+    timings: dict = field(default_factory=dict)
+    llm_request: object = field(default=None, repr=False)  # Speculative LLMRequest not yet handed to an LLM stage
+
+    def as_dict(self) -> dict:
+        return {
+            "response": self.response,
+            "source": self.source,
+            "cached_source": self.cached_source,
+            "similarity": self.similarity,
+            "matched_input": self.matched_input,
+            "timings": dict(self.timings),
+        }
+
+
+class ResponsePipeline:
+    """
+    Single-pass request pipeline: rules -> vector memory -> LLM -> learn.
+    Each stage runs at most once per request and hands its result to the next,
+    so the rule query, the embedding and the nearest-neighbour search are never repeated.
+    With `parallel` the embedding is computed while the rules are checked (once the cache missed).
+    When a provisional best memory score (lexical prefilter, or a quantized
+    index before re-ranking) falls within `speculative_margin` below the
+    threshold, the LLM request is started while the rest of the search runs
+    and cancelled if memory answers after all.
+    Without an embedding (model loading or failed) memory is matched on words
+    through the full-text index, against `lexical_threshold`.
+    """
+
+    def __init__(self, vector_threshold: float = SIMILARITY_THRESHOLD, use_llm: bool = True, learn: bool = True,
+                 parallel: bool = PIPELINE_PARALLEL_TIERS, speculative_margin: float = LLM_SPECULATIVE_MARGIN,
+                 lexical_threshold: float = LEXICAL_THRESHOLD):
+        self.vector_threshold = vector_threshold
+        self.lexical_threshold = lexical_threshold
+        self.use_llm = use_llm
+        self.learn = learn
+        self.parallel = parallel
+        self.speculative_margin = speculative_margin
+
+    def run(self, user_input: str) -> PipelineResult:
+        result = PipelineResult(user_input=user_input)
+        started = time.perf_counter()
+        pending = None
+        try:
+            if self._cache_stage(result):
+                return result
+            pending = self._start_embedding(result)  # Overlaps the rules check
+            if self._rules_stage(result):
+                return result
+            if self._memory_stage(result, pending):
+                return result
+            if self.use_llm and self._llm_stage(result):
+                if result.source == "llm":
+                    self._learn_stage(result)
+                return result
+            self._fallback(result)
+            return result
+        finally:
+            self._drop_speculation(result, pending)
+            self._remember(result)
+            self._finish(result, started)
+
+    def stream(self, user_input: str, on_llm_request=None):
+        """
+        Like run(), but yields the result repeatedly while the LLM is generating,
+        with `response` holding the text so far. The last yield has `complete` set;
+        the answer is saved to memory only once the full text exists.
+        `on_llm_request` receives the LLMRequest if one is started (see llm_stream_response).
+        """
+        result = PipelineResult(user_input=user_input)
+        started = time.perf_counter()
+        pending = None
+        try:
+            answered = self._cache_stage(result)
+            if not answered:
+                pending = self._start_embedding(result)  # Overlaps the rules check
+                answered = self._rules_stage(result) or self._memory_stage(result, pending)
+            if not answered:
+                if self.use_llm:
+                    yield from self._llm_stream_stage(result, on_llm_request)
+                if result.source == "llm":
+                    self._learn_stage(result)
+                elif result.source is None:
+                    self._fallback(result)
+            # Only a fully generated answer gets here (a closed stream skips this)
+            self._remember(result)
+            result.complete = True
+            yield result
+        finally:
+            self._drop_speculation(result, pending)
+            self._finish(result, started)
+
+    def run_batch(self, user_inputs: list) -> list:
+        """
+        Answer many inputs at once, in order. Cache and rule hits are resolved
+        first; the rest are embedded in one encode(list) call and searched as
+        one matrix-matrix product; only the remaining misses go to the LLM,
+        one after another (once per distinct input). Waits for models that
+        are still loading instead of answering 'warming'. Bulk stage timings
+        are shared equally by the items.
+        """
+        results = [PipelineResult(user_input=text) for text in user_inputs]
+        for result in results:
+            started = time.perf_counter()
+            self._cache_stage(result) or self._rules_stage(result)
+            result.timings["total"] = time.perf_counter() - started
+        pending = [result for result in results if result.source is None]
+        if pending:
+            self._memory_batch_stage(pending)
+        if self.use_llm and any(result.source is None for result in pending):
+            llm_model.get()
+        generated = {}  # Repeated inputs in the batch get one LLM call
+        for result in pending:
+            if result.source is not None:
+                continue
+            started = time.perf_counter()
+            first = generated.setdefault(response_cache.key(result.user_input), result)
+            if first is not result and first.source == "llm":
+                result.response = first.response
+                result.source = "llm"
+            elif self.use_llm and self._llm_stage(result):
+                if result.source == "llm":
+                    self._learn_stage(result)
+            else:
+                self._fallback(result)
+            result.timings["total"] += time.perf_counter() - started
+        for result in results:
+            self._remember(result)
+            self._finish(result, total=result.timings["total"])
+        return results
+
+    def _memory_batch_stage(self, results: list):
+        if embedding_model.get() is None:
+            for result in results:
+                started = time.perf_counter()
+                self._lexical_stage(result)
+                result.timings["total"] += time.perf_counter() - started
+            return
+        texts = [result.user_input for result in results]
+        started = time.perf_counter()
+        try:
+            vectors = embed_many(texts)
+        except Exception as e:
+            logging.error(f"Error generating embeddings for a batch of {len(texts)} inputs: {e}")
+            return
+        embedded = time.perf_counter()
+        try:
+            matches = find_best_matches(vectors, texts)
+        except Exception as e:
+            logging.error(f"Error during batched vector memory lookup: {e}")
+            matches = [None] * len(results)
+        searched = time.perf_counter()
+        for result, vector, best in zip(results, vectors, matches):
+            result.vector = vector
+            result.timings["embed"] = (embedded - started) / len(results)
+            result.timings["vector_search"] = (searched - embedded) / len(results)
+            result.timings["total"] += (searched - started) / len(results)
+            if best is not None:
+                self._use_match(result, best)
+
+    def _fallback(self, result: PipelineResult):
+        result.response = FALLBACK_RESPONSE
+        result.source = "fallback"
+        logging.warning("→ No match from rules, memory, or LLM.")
+
+    def _finish(self, result: PipelineResult, started: float = None, total: float = None):
+        result.complete = True
+        result.timings["total"] = time.perf_counter() - started if total is None else total
+        RESPONSES_TOTAL.inc(source=result.source)
+        REQUEST_SECONDS.observe(result.timings["total"], source=result.source)
+        logging.info(
+            f"Answered by {result.source} in {result.timings['total'] * 1000:.1f} ms "
+            f"({', '.join(f'{k}={v * 1000:.1f}ms' for k, v in result.timings.items() if k != 'total')})"
+        )
+
+    def _timed(self, result: PipelineResult, stage: str, fn, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            result.timings[stage] = time.perf_counter() - started
+
+    def _cache_stage(self, result: PipelineResult) -> bool:
+        if response_cache.max_size <= 0:
+            return False
+        started = time.perf_counter()
+        # Picks up rule changes, which clear the cache; with unreadable rules the cache may be stale
+        cached = response_cache.get(result.user_input) if refresh_rules() else None
+        result.timings["cache"] = time.perf_counter() - started
+        RESPONSE_CACHE_TOTAL.inc(result="hit" if cached else "miss")
+        if cached is None:
+            return False
+        result.response = cached["response"]
+        result.source = "cache"
+        result.cached_source = cached["source"]
+        result.similarity = cached["score"]
+        record_hit(cached["row_id"])  # Keeps a popular memory row from being evicted
+        return True
+
+    def _remember(self, result: PipelineResult):
+        if result.truncated or result.source not in ("rule", "memory", "llm"):
+            return
+        response_cache.put(result.user_input, result.response, result.source, vector=result.vector,
+                           score=result.similarity, row_id=result.matched_id if result.source == "memory" else None)
+
+    def _rules_stage(self, result: PipelineResult) -> bool:
+        rule = self._timed(result, "rules", check_rules, result.user_input)
+        if rule:
+            result.response = rule["response"]
+            result.source = "rule"
+            return True
+        return False
+
+    def _embedding_available(self, result: PipelineResult) -> bool:
+        # Never block on a model that is still warming up; rules keep answering meanwhile
+        if embedding_model.ready or embedding_cache.peek(result.user_input) is not None:
+            return True
+        embedding_model.loading()  # Starts the load if nothing has yet
+        return False
+
+    def _start_embedding(self, result: PipelineResult):
+        """Start embedding the input in the background; returns the future, or None."""
+        if not self.parallel or not self._embedding_available(result):
+            return None
+        return _tier_executor.submit(embed, result.user_input)
+
+    def _speculate(self, result: PipelineResult, score: float):
+        """find_best_match callback: start the LLM early if the provisional best score is just under the threshold."""
+        if (not self.use_llm or self.speculative_margin <= 0 or not llm_model.ready or result.llm_request is not None
+                or not self.vector_threshold - self.speculative_margin <= score < self.vector_threshold):
+            return
+        try:
+            result.llm_request = llm_submit(result.user_input)
+        except LLMQueueFull:
+            return  # The LLM stage will report busy if the queue is still full
+        logging.debug(f"Started LLM speculatively (provisional best similarity {score:.3f}).")
+
+    def _take_speculation(self, result: PipelineResult):
+        request, result.llm_request = result.llm_request, None
+        if request is not None:
+            result.speculative = True
+            LLM_SPECULATIVE_TOTAL.inc(outcome="used")
+        return request
+
+    def _drop_speculation(self, result: PipelineResult, pending):
+        if pending is not None:
+            pending.cancel()  # Only stops it if it has not started; a finished embedding stays cached
+        if result.llm_request is not None:
+            result.llm_request.cancel()
+            result.llm_request = None
+            LLM_SPECULATIVE_TOTAL.inc(outcome="cancelled")
+
+    def _memory_stage(self, result: PipelineResult, pending=None) -> bool:
+        if pending is None and not self._embedding_available(result):
+            logging.info("Embedding model not ready, using lexical memory matching.")
+            return self._lexical_stage(result)
+        try:
+            if pending is not None:
+                # Started before the rules stage; only the remaining wait is on the critical path
+                result.vector = self._timed(result, "embed", pending.result)
+            else:
+                result.vector = self._timed(result, "embed", embed, result.user_input)
+        except Exception as e:
+            logging.error(f"Error generating embedding for input '{result.user_input}': {e}")
+            return self._lexical_stage(result)
+
+        try:
+            best = self._timed(result, "vector_search", find_best_match, result.vector, text=result.user_input,
+                               on_candidates=lambda score: self._speculate(result, score))
+        except Exception as e:
+            logging.error(f"Error during vector memory lookup: {e}")
+            return False
+        if best is None:
+            return False
+        return self._use_match(result, best)
+
+    def _use_match(self, result: PipelineResult, best: dict) -> bool:
+        """Record the best memory match; answer from it if it clears the threshold."""
+        result.similarity = best["score"]
+        result.matched_id = best["id"]
+        result.matched_input = best["input"]
+        if best["score"] >= self.vector_threshold:
+            logging.info(f"Vector memory matched '{best['input']}' with similarity {best['score']:.3f}")
+            result.response = best["response"]
+            result.source = "memory"
+            record_hit(best["id"])
+            return True
+        logging.info(f"No vector memory match above threshold ({self.vector_threshold}). "
+                     f"Best similarity: {best['score']:.3f}")
+        return False
+
+    def _lexical_stage(self, result: PipelineResult) -> bool:
+        """Word-overlap match on the full-text index, for when no embedding can be computed."""
+        try:
+            best = self._timed(result, "lexical_search", find_best_lexical_match, result.user_input)
+        except Exception as e:
+            logging.error(f"Error during lexical memory lookup: {e}")
+            return False
+        if best is None or best["score"] < self.lexical_threshold:
+            logging.info(f"No lexical memory match above threshold ({self.lexical_threshold}).")
+            return False
+        logging.info(f"Lexical memory matched '{best['input']}' with score {best['score']:.3f}")
+        result.similarity = best["score"]
+        result.matched_id = best["id"]
+        result.matched_input = best["input"]
+        result.response = best["response"]
+        result.source = "memory"
+        record_hit(best["id"])
+        return True
+
+    def _llm_not_ready(self, result: PipelineResult) -> bool:
+        if not llm_model.loading():
+            return False
+        result.response = WARMING_RESPONSE
+        result.source = "warming"
+        return True
+
+    def _llm_stage(self, result: PipelineResult) -> bool:
+        logging.debug("→ Falling back to LLM generation.")
+        if self._llm_not_ready(result):
+            return True
+        try:
+            llm_response = self._timed(result, "llm", llm_generate_response, result.user_input,
+                                       request=self._take_speculation(result))
+        except LLMQueueFull:
+            self._busy(result)
+            return True
+        if llm_response:
+            result.response = llm_response
+            result.source = "llm"
+            return True
+        logging.warning(f"LLM response discarded: '{llm_response}'")
+        return False
+
+    def _llm_stream_stage(self, result: PipelineResult, on_llm_request=None):
+        logging.debug("→ Falling back to streamed LLM generation.")
+        if self._llm_not_ready(result):
+            return
+        started = time.perf_counter()
+        text = ""
+        try:
+            for piece in llm_stream_response(result.user_input, request=self._take_speculation(result),
+                                             on_request=on_llm_request):
+                if not text:
+                    result.timings["llm_first_token"] = time.perf_counter() - started
+                text += piece
+                if text.strip():
+                    result.response = text.strip()
+                    result.source = "llm"
+                    yield result
+        except LLMQueueFull:
+            self._busy(result)
+            return
+        except LLMIncomplete as e:
+            # Keep what the user already saw, but never learn a cut-off answer
+            logging.warning(f"{e} Returning partial response.")
+            result.truncated = True
+        finally:
+            result.timings["llm"] = time.perf_counter() - started
+        if not text.strip():
+            result.response = None
+            result.source = None
+            logging.warning(f"LLM response discarded: '{text}'")
+
+    def _busy(self, result: PipelineResult):
+        result.response = BUSY_RESPONSE
+        result.source = "busy"
+
+    def _learn_stage(self, result: PipelineResult):
+        if not self.learn or result.truncated:
+            return
+        # Reuse the lookup embedding so the input is not encoded again
+        self._timed(result, "save", save_to_memory, result.user_input, result.response, vector=result.vector)
+        result.saved = True
+
+
+# Shared default pipeline used by the entry points
+default_pipeline = ResponsePipeline()
+
+def process_message(user_input: str) -> PipelineResult:
+    """Run one message through the default pipeline."""
+    return default_pipeline.run(user_input)
+
+def stream_message(user_input: str, on_llm_request=None):
+    """Stream one message through the default pipeline (see ResponsePipeline.stream)."""
+    return default_pipeline.stream(user_input, on_llm_request)
@@ -0,0 +1,94 @@
+# prompt_cache.py
+
+import hashlib
+import logging
+import os
+import pickle
+from pathlib import Path
+
+
+class PrefixCache:
+    """
+    Keeps the evaluated llama.cpp state for the fixed system-prompt prefix.
+    restore() loads it into the model before a request, so llama.cpp only
+    evaluates the tokens after the prefix (it skips the longest common prefix
+    of its current state). Once a request has run, the model's tokens already
+    start with the prefix and restore() leaves them alone. With `path` set the state is also kept on disk and
+    reused across restarts as long as the model, context size and prefix match.
+    """
+
+    def __init__(self, model, prefix: str, path: Path = None, model_id: str = ""):
+        self.model = model
+        self.prefix = prefix
+        self.path = Path(path) if path else None
+        self.model_id = model_id
+        self.state = None
+        self.tokens = None
+        self.hits = 0
+
+    def _key(self) -> str:
+        n_ctx = self.model.n_ctx() if callable(getattr(self.model, "n_ctx", None)) else None
+        return hashlib.sha256(f"{self.model_id}|{n_ctx}|{self.prefix}".encode("utf-8")).hexdigest()
+
+    def _load_from_disk(self) -> bool:
+        if self.path is None or not self.path.exists():
+            return False
+        try:
+            with open(self.path, "rb") as f:
+                saved = pickle.load(f)
+            if saved.get("key") != self._key():
+                logging.info(f"Prompt prefix cache {self.path} is for a different model or prompt, rebuilding.")
+                return False
+            self.state = saved["state"]
+            logging.info(f"Loaded prompt prefix state from {self.path}")
+            return True
+        except Exception as e:
+            logging.warning(f"Could not read prompt prefix cache {self.path}: {e}")
+            return False
+
+    def _save_to_disk(self):
+        if self.path is None:
+            return
+        try:
+            # Per-process temp file: serve.py workers may all save the state at startup
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(f"{self.path.suffix}.{os.getpid()}.tmp")
+            with open(tmp_path, "wb") as f:
+                pickle.dump({"key": self._key(), "state": self.state}, f)
+            tmp_path.replace(self.path)
+            logging.info(f"Saved prompt prefix state to {self.path}")
+        except Exception as e:
+            logging.warning(f"Could not write prompt prefix cache {self.path}: {e}")
+
+    def warm(self):
+        """Evaluate the prefix once (or load it from disk) and keep its state."""
+        tokens = self.model.tokenize(self.prefix.encode("utf-8"), add_bos=True)
+        self.tokens = list(tokens)
+        if self._load_from_disk():
+            return
+        self.model.reset()
+        self.model.eval(tokens)
+        self.state = self.model.save_state()
+        logging.info(f"Cached evaluated prompt prefix ({len(tokens)} tokens).")
+        self._save_to_disk()
+
+    def _model_has_prefix(self) -> bool:
+        current = getattr(self.model, "input_ids", None)
+        n_tokens = getattr(self.model, "n_tokens", 0)
+        if current is None or self.tokens is None or n_tokens < len(self.tokens):
+            return False
+        return list(current[:len(self.tokens)]) == self.tokens
+
+    def restore(self):
+        """
+        Load the prefix state into the model, unless its current tokens already
+        start with the prefix. Must run on the thread that owns the model.
+        """
+        if self.state is None or self._model_has_prefix():
+            return
+        try:
+            self.model.load_state(self.state)
+            self.hits += 1
+        except Exception as e:
+            logging.warning(f"Could not restore prompt prefix state, evaluating from scratch: {e}")
+            self.state = None
@@ -0,0 +1,90 @@
+# quantize.py
+"""
+Convert stored vectors to a different precision.
+
+    python quantize.py --blobs float16       # memory.vector BLOBs: 1536 -> 768 bytes each
+    python quantize.py --segment float16     # rewrite the segment file as float16
+
+BLOBs of either precision can be mixed while a conversion runs; they are told
+apart by length. Set VECTOR_BLOB_DTYPE / VECTOR_SEGMENT_DTYPE in config.py to
+match, so new rows are written the same way. The in-RAM index precision
+(VECTOR_INDEX_DTYPE) needs no conversion: it is quantized when loaded.
+See benchmarks/quantization.py for memory saved versus match agreement.
+"""
+
+import argparse
+import logging
+import os
+import numpy as np
+from config import VECTOR_MEMORY_DB_PATH, VECTOR_DIM, VECTOR_SEGMENT_PATH, VECTOR_SEGMENT_DTYPE
+from db import get_connection
+from vector_store import VectorSegment, decode_blob
+
+BLOB_DTYPES = ("float32", "float16")
+
+
+def convert_blobs(dtype: str, batch_size: int = 10000) -> int:
+    """Rewrite every memory.vector BLOB that is not already `dtype`. Returns the number converted."""
+    target_size = VECTOR_DIM * np.dtype(dtype).itemsize
+    converted = 0
+    last_id = 0
+    conn = get_connection(VECTOR_MEMORY_DB_PATH)
+    while True:
+        rows = conn.execute(
+            "SELECT id, vector FROM memory WHERE id > ? AND vector IS NOT NULL ORDER BY id LIMIT ?",
+            (last_id, batch_size)
+        ).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        updates = [
+            (decode_blob(blob, VECTOR_DIM).astype(dtype).tobytes(), row_id)
+            for row_id, blob in rows
+            if len(blob) != target_size
+        ]
+        with conn:
+            conn.executemany("UPDATE memory SET vector = ? WHERE id = ?", updates)
+        converted += len(updates)
+        logging.info(f"Converted {converted} BLOBs to {dtype} so far...")
+    if converted:
+        conn.execute("VACUUM")
+    logging.info(f"BLOB conversion complete: {converted} vectors now stored as {dtype}.")
+    return converted
+
+
+def convert_segment(dtype: str, chunk_size: int = 65536) -> int:
+    """Rewrite the segment file with `dtype` vectors. Returns the number of vectors written."""
+    if not VECTOR_SEGMENT_PATH.exists():
+        logging.error(f"No segment file at {VECTOR_SEGMENT_PATH} (run vector_store.py to create one).")
+        return 0
+    segment = VectorSegment(VECTOR_SEGMENT_PATH, VECTOR_DIM, VECTOR_SEGMENT_DTYPE)
+    if segment.dtype == np.dtype(dtype):
+        logging.info(f"{VECTOR_SEGMENT_PATH} already stores {dtype}.")
+        return 0
+    tmp_path = VECTOR_SEGMENT_PATH.with_suffix(VECTOR_SEGMENT_PATH.suffix + ".tmp")
+    tmp_path.unlink(missing_ok=True)
+    converted = VectorSegment(tmp_path, VECTOR_DIM, dtype)
+    for start in range(0, len(segment), chunk_size):
+        converted.append(segment.ids[start:start + chunk_size], segment.vectors[start:start + chunk_size])
+    os.replace(tmp_path, VECTOR_SEGMENT_PATH)
+    logging.info(f"Rewrote {VECTOR_SEGMENT_PATH} as {dtype} ({len(converted)} vectors).")
+    return len(converted)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert stored memory vectors to float16 (or back to float32).")
+    parser.add_argument("--blobs", choices=BLOB_DTYPES, help="convert memory.vector BLOBs in the SQLite DB")
+    parser.add_argument("--segment", choices=BLOB_DTYPES, help="rewrite the vector segment file")
+    args = parser.parse_args()
+    if not args.blobs and not args.segment:
+        parser.error("nothing to do: pass --blobs and/or --segment")
+
+    if args.blobs:
+        convert_blobs(args.blobs)
+    if args.segment:
+        convert_segment(args.segment)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s', force=True)
+    main()
@@ -0,0 +1,137 @@
+# response_cache.py
+
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from config import RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL, SIMILARITY_THRESHOLD
+from utils import clean_text
+
+# Tiers whose answers are worth repeating; busy/warming/fallback replies are not cached
+CACHEABLE_SOURCES = ("rule", "memory", "llm")
+
+
+class ResponseCache:
+    """
+    Bounded LRU cache of final answers keyed on normalized input (utils.clean_text),
+    checked before any tier. Each entry records the tier that produced it.
+    Memory and LLM entries also keep the input's embedding, so a new memory row
+    invalidates only the entries it would now answer differently; any change to
+    the rules clears the cache (rules.py calls clear() on every reload).
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 3600, threshold: float = SIMILARITY_THRESHOLD):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> dict(response, source, row_id, score, vector, stored_at)
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def key(text: str) -> str:
+        return clean_text(text)
+
+    def get(self, text: str):
+        """Return {'response', 'source', 'row_id', 'score'} for a cached answer, or None."""
+        key = self.key(text)
+        if self.max_size <= 0 or not key:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl and time.monotonic() - entry["stored_at"] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return {name: entry[name] for name in ("response", "source", "row_id", "score")}
+
+    def put(self, text: str, response: str, source: str, vector: np.ndarray = None, score: float = None,
+            row_id: int = None):
+        """
+        Cache an answer. Memory and LLM answers need the input's `vector` (memory
+        answers also the matched `score` and `row_id`); without it they are not cached.
+        """
+        if self.max_size <= 0 or source not in CACHEABLE_SOURCES or not response:
+            return
+        if source != "rule":
+            if vector is None:
+                return
+            vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+            norm = np.linalg.norm(vector)
+            vector = vector / norm if norm else vector
+        key = self.key(text)
+        if not key:
+            return  # Punctuation-only inputs would all share the empty key
+        with self._lock:
+            self._entries[key] = {
+                "response": response, "source": source, "row_id": row_id, "score": score,
+                "vector": vector, "stored_at": time.monotonic(),
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def memory_added(self, vector: np.ndarray, response: str) -> int:
+        """
+        Drop entries a new memory row would now answer: memory answers it beats,
+        and LLM answers it matches above the threshold. Returns the number dropped.
+        """
+        with self._lock:
+            keyed = [(key, entry) for key, entry in self._entries.items()
+                     if entry["vector"] is not None and entry["response"] != response]
+            if not keyed:
+                return 0
+            vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+            norm = np.linalg.norm(vector)
+            scores = np.stack([entry["vector"] for _, entry in keyed]) @ (vector / norm if norm else vector)
+            stale = [
+                key for (key, entry), score in zip(keyed, scores.tolist())
+                if (entry["source"] == "memory" and score > entry["score"])
+                or (entry["source"] == "llm" and score >= self.threshold)
+            ]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+        return len(stale)
+
+    def memory_removed(self, row_ids) -> int:
+        """Drop memory answers that came from removed rows. Returns the number dropped."""
+        removed = set(row_ids)
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if entry["row_id"] in removed]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+        return len(stale)
+
+    def invalidate(self, text: str):
+        with self._lock:
+            if self._entries.pop(self.key(text), None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+# Shared by the pipeline, core.get_response, and the invalidation hooks in rules.py and memory.py
+response_cache = ResponseCache(max_size=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL)
@@ -0,0 +1,186 @@
+# rule_engine.py
+
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from utils import clean_text
+from db import get_connection
+
+# Rules tagged with one of these (comma-separated in the `tags` column) are not exact-match rules
+KEYWORD_TAG = "keyword"  # `input` is a word/phrase that may appear anywhere in the message
+REGEX_TAG = "regex"      # `input` is a regular expression searched in the raw message
+
+
+def parse_tags(tags: str) -> set:
+    if not tags:
+        return set()
+    return {tag.strip().lower() for tag in tags.split(",") if tag.strip()}
+
+
+class KeywordMatcher:
+    """
+    Aho-Corasick automaton over normalized keywords.
+    Finds every keyword occurrence in a single pass over the text;
+    only whole-word matches are reported.
+    """
+
+    def __init__(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+
+    def add(self, keyword: str, value):
+        node = 0
+        for ch in keyword:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        self._out[node].append((len(keyword), value))
+
+    def build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def find_all(self, text: str):
+        """Yield (start, length, value) for each whole-word keyword occurrence."""
+        node = 0
+        for end, ch in enumerate(text):
+            while node and ch not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(ch, 0)
+            for length, value in self._out[node]:
+                start = end - length + 1
+                if (start == 0 or text[start - 1] == " ") and (end + 1 == len(text) or text[end + 1] == " "):
+                    yield start, length, value
+
+
+class RuleEngine:
+    """
+    In-memory compiled view of the rules table.
+    Lookup order: exact input, normalized input (utils.clean_text),
+    keyword rules (longest match wins), then regex rules.
+    Reloads after save_rule() or when the DB file changes on disk,
+    then calls `on_reload` (if given).
+    """
+
+    def __init__(self, db_path, reload_interval: float = 2.0, on_reload=None):
+        self.db_path = db_path
+        self.reload_interval = reload_interval
+        self.on_reload = on_reload
+        self._lock = threading.Lock()
+        self._compiled = None
+        self._signature = None
+        self._last_check = 0.0
+
+    def _db_signature(self):
+        signature = []
+        for path in (str(self.db_path), f"{self.db_path}-wal"):
+            try:
+                st = os.stat(path)
+                signature.append((st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def _compile(self, rows):
+        exact = {}
+        normalized = {}
+        keywords = KeywordMatcher()
+        regexes = []
+        keyword_count = 0
+
+        for rule_id, rule_input, response, tags in rows:
+            if rule_input is None:
+                continue
+            tag_set = parse_tags(tags)
+            if REGEX_TAG in tag_set:
+                try:
+                    regexes.append((re.compile(rule_input, re.IGNORECASE), response))
+                except re.error as e:
+                    logging.warning(f"Skipping rule {rule_id}: invalid regex '{rule_input}': {e}")
+            elif KEYWORD_TAG in tag_set:
+                keyword = clean_text(rule_input)
+                if keyword:
+                    keywords.add(keyword, (rule_id, response))
+                    keyword_count += 1
+            else:
+                exact.setdefault(rule_input, response)
+                normalized.setdefault(clean_text(rule_input), response)
+
+        keywords.build()
+        logging.info(f"Compiled {len(exact)} exact, {keyword_count} keyword and {len(regexes)} regex rules.")
+        return {"exact": exact, "normalized": normalized, "keywords": keywords, "regexes": regexes}
+
+    def reload(self):
+        """Recompile all rules from the database."""
+        with self._lock:
+            signature = self._db_signature()
+            with get_connection(self.db_path) as conn:
+                rows = conn.execute("SELECT id, input, response, tags FROM rules ORDER BY id").fetchall()
+            compiled = self._compile(rows)
+            self._compiled = compiled
+            self._signature = signature
+            self._last_check = time.monotonic()
+        if self.on_reload is not None:
+            self.on_reload()
+        return compiled
+
+    def invalidate(self):
+        """Force a reload on the next lookup."""
+        self._compiled = None
+
+    def _current(self):
+        compiled = self._compiled
+        if compiled is None:
+            return self.reload()
+        if self.reload_interval and time.monotonic() - self._last_check >= self.reload_interval:
+            self._last_check = time.monotonic()
+            if self._db_signature() != self._signature:
+                logging.info("Rules DB changed on disk, reloading rules.")
+                return self.reload()
+        return compiled
+
+    def refresh(self):
+        """Reload now if the rules were invalidated or changed on disk (the check match() does)."""
+        self._current()
+
+    def match(self, user_input: str):
+        """Return {'response', 'match'} for the best rule, or None."""
+        compiled = self._current()
+
+        response = compiled["exact"].get(user_input)
+        if response is not None:
+            return {"response": response, "match": "exact"}
+
+        cleaned = clean_text(user_input)
+        response = compiled["normalized"].get(cleaned)
+        if response is not None:
+            return {"response": response, "match": "normalized"}
+
+        best = None
+        for start, length, (rule_id, response) in compiled["keywords"].find_all(cleaned):
+            if best is None or (length, -rule_id) > (best[0], -best[1]):
+                best = (length, rule_id, response)
+        if best is not None:
+            return {"response": best[2], "match": "keyword"}
+
+        for pattern, response in compiled["regexes"]:
+            if pattern.search(user_input):
+                return {"response": response, "match": "regex"}
+        return None
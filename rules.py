@@ -1,15 +1,18 @@
 # rules.py
 
-import sqlite3
 import logging
-from config import RULES_DB_PATH
+from config import RULES_DB_PATH, RULES_RELOAD_INTERVAL
+from rule_engine import RuleEngine
+from response_cache import response_cache
+from db import get_connection
+from metrics import RULE_LOOKUP_SECONDS, DB_WRITE_SECONDS
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
 
 def create_or_fix_rules_table():
     """Create 'rules' table if missing, ensure 'input' column exists."""
     try:
-        conn = sqlite3.connect(RULES_DB_PATH)
+        conn = get_connection(RULES_DB_PATH)
         cursor = conn.cursor()
 
         cursor.execute('''
@@ -33,36 +36,58 @@ def create_or_fix_rules_table():
 
     except Exception as e:
         logging.error(f"Error creating or fixing 'rules' table: {e}")
-    finally:
-        conn.close()
+
+# Compiled in-memory copy of the rules table (see rule_engine.py).
+# A new or changed rule can change the answer to any input, so each reload empties the response cache.
+rule_engine = RuleEngine(RULES_DB_PATH, reload_interval=RULES_RELOAD_INTERVAL, on_reload=response_cache.clear)
+
+def refresh_rules() -> bool:
+    """Pick up rule changes (which clear the response cache). False if the rules DB could not be read."""
+    try:
+        rule_engine.refresh()
+        return True
+    except Exception as e:
+        logging.error(f"Error querying rules DB: {e}")
+        return False
 
 def check_rules(user_input: str):
-    """Return the response from rules DB if exact input matches."""
+    """
+    Return the response for the best matching rule: exact input, normalized
+    input, keyword rules (tag 'keyword') or regex rules (tag 'regex').
+    """
     try:
-        with sqlite3.connect(RULES_DB_PATH) as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT response FROM rules WHERE input = ?", (user_input,))
-            result = cursor.fetchone()
-            if result:
-                logging.info(f"Rule matched for input: '{user_input}'")
-                return {"response": result[0]}
+        with RULE_LOOKUP_SECONDS.time():
+            result = rule_engine.match(user_input)
+        if result:
+            logging.info(f"Rule matched ({result['match']}) for input: '{user_input}'")
+            return result
     except Exception as e:
         logging.error(f"Error querying rules DB: {e}")
     return None
 
+# Worker processes under serve.py send rule edits to the writer process instead of writing rules.db
+_forward = None
+
+def forward_writes(send):
+    """Worker mode: pass new rules to send(message) instead of inserting them here."""
+    global _forward
+    _forward = send
+
 def save_rule(input_text: str, response_text: str, tags: str = None):
     """Insert a new rule into the rules table."""
+    if _forward is not None:
+        _forward(("rule", input_text, response_text, tags))
+        logging.info(f"Sent new rule to the writer: '{input_text}'")
+        return
     try:
-        with sqlite3.connect(RULES_DB_PATH) as conn:
+        with DB_WRITE_SECONDS.time(table="rules"), get_connection(RULES_DB_PATH) as conn:
             cursor = conn.cursor()
             cursor.execute(
                 "INSERT INTO rules (input, response, tags) VALUES (?, ?, ?)",
                 (input_text, response_text, tags)
             )
             conn.commit()
+        rule_engine.invalidate()
         logging.info(f"Saved new rule: '{input_text}' -> '{response_text}'")
     except Exception as e:
         logging.error(f"Error saving rule: {e}")
-
-# Ensure the rules table is ready on import
-create_or_fix_rules_table()
@@ -0,0 +1,443 @@
+# serve.py
+"""
+Multi-process serving: N worker processes answer requests and a single
+writer process owns every write to vector_memory.db and rules.db.
+
+    python serve.py --workers 4
+    curl -s localhost:8000/chat -d '{"input": "hello"}'
+    curl -sN localhost:8000/chat -d '{"input": "hello", "stream": true}'   # one JSON object per line
+    curl -s localhost:8000/health
+
+Each worker loads its own models and builds its own vector index, and never
+writes: memory saves, hit counts and new rules go to the writer over a queue.
+The writer commits them and publishes every memory change (and a reload
+notice for rules) back to all workers, which apply it to their index.
+A streaming client that disconnects (or a request that times out) is
+cancelled in its worker, which stops the LLM generation.
+With VECTOR_STORAGE = "segment" the workers map the same segment file, so the
+vectors are held once in the page cache instead of once per worker.
+With SERVE_CPU_SHARES each worker is pinned to its own slice of the cores and
+sizes its model threads to that slice (see cpu_budget.py).
+"""
+
+import argparse
+import collections
+import itertools
+import json
+import logging
+import multiprocessing
+import queue
+import signal
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from db import close_connections
+from config import (
+    LOG_LEVEL, LOG_FORMAT, VECTOR_STORAGE, SERVE_WORKERS, SERVE_WORKER_CONCURRENCY, SERVE_CPU_SHARES,
+    SERVE_HOST, SERVE_PORT, SERVE_REQUEST_TIMEOUT,
+)
+
+
+def _setup_child(role: str):
+    logging.basicConfig(level=LOG_LEVEL, format=LOG_FORMAT.replace("%(message)s", f"[{role}] %(message)s"), force=True)
+    # Ctrl+C reaches the whole process group; the front end stops the children in order
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+# === Writer process ===
+def writer_main(writes, updates, ready):
+    """Apply writes sent by the workers, publishing memory changes to every worker's update queue."""
+    _setup_child("writer")
+    from db_init import initialize_all_databases
+    import memory
+    import rules
+
+    initialize_all_databases()
+    if VECTOR_STORAGE == "segment":
+        # Migrates leftover BLOBs and creates the segment file before any worker maps it
+        memory.get_index()
+
+    for update_queue in updates:
+        # A worker that already exited must not keep this process from exiting
+        update_queue.cancel_join_thread()
+
+    def publish(change):
+        for update_queue in updates:
+            update_queue.put(change)
+
+    memory.publish_changes(publish)
+    memory.enforce_capacity()
+    ready.set()
+    logging.info("Memory writer ready.")
+
+    while True:
+        message = writes.get()
+        if message is None:
+            break
+        try:
+            if message[0] == "memory":
+                _, user_input, response, vector = message
+                memory.save_to_memory(user_input, response, vector=vector)
+            elif message[0] == "rule":
+                _, input_text, response_text, tags = message
+                rules.save_rule(input_text, response_text, tags)
+                publish(("rules_changed",))
+            elif message[0] == "hits":
+                memory.write_hits(message[1])
+            else:
+                logging.warning(f"Unknown write message '{message[0]}'")
+        except Exception as e:
+            logging.error(f"Failed to apply '{message[0]}' write: {e}")
+    memory.flush_writes()
+    close_connections()
+    logging.info("Memory writer stopped.")
+
+
+# === Worker processes ===
+class _Job:
+    """A request a worker is answering; cancel() stops it, including its LLM generation."""
+
+    def __init__(self):
+        self.cancelled = threading.Event()
+        self._llm_request = None
+        self._lock = threading.Lock()
+
+    def attach(self, llm_request):
+        with self._lock:
+            self._llm_request = llm_request
+            if self.cancelled.is_set():
+                llm_request.cancel()
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled.set()
+            if self._llm_request is not None:
+                self._llm_request.cancel()
+
+
+_jobs = {}  # request id -> _Job, for the requests this worker is answering
+_jobs_lock = threading.Lock()
+_cancelled_ids = collections.OrderedDict()  # Cancelled before any worker took them; bounded
+
+
+def _cancel_job(request_id: int):
+    with _jobs_lock:
+        job = _jobs.get(request_id)
+        if job is None:
+            _cancelled_ids[request_id] = True
+            while len(_cancelled_ids) > 1000:
+                _cancelled_ids.popitem(last=False)
+            return
+    logging.info(f"Request {request_id} cancelled, the client went away.")
+    job.cancel()
+
+
+def _apply_updates(updates):
+    import memory
+    from rules import rule_engine
+
+    while True:
+        change = updates.get()
+        if change is None:
+            return
+        try:
+            if change[0] == "cancel":
+                _cancel_job(change[1])
+            elif change[0] == "rules_changed":
+                rule_engine.invalidate()
+            else:
+                memory.apply_change(change)
+        except Exception as e:
+            logging.error(f"Failed to apply '{change[0]}' from the writer: {e}")
+
+
+def _report_health(worker_id: int, results):
+    """Send this worker's model readiness to the front end whenever it changes."""
+    from model_loader import health
+
+    last = None
+    while True:
+        status = health()
+        states = {name: model["state"] for name, model in status["models"].items()}
+        if states != last:
+            results.put(("health", worker_id, status))
+            last = states
+        if all(state in ("ready", "failed") for state in states.values()):
+            return
+        time.sleep(0.5)
+
+
+def _answer(request, results, slots):
+    from pipeline import stream_message
+
+    request_id, user_input = request
+    job = _Job()
+    with _jobs_lock:
+        if _cancelled_ids.pop(request_id, None):
+            slots.release()
+            return
+        _jobs[request_id] = job
+    stream = stream_message(user_input, on_llm_request=job.attach)
+    try:
+        for result in stream:
+            if job.cancelled.is_set():
+                break
+            results.put(("result", request_id, dict(result.as_dict(), complete=result.complete)))
+    except Exception as e:
+        logging.error(f"Request {request_id} failed: {e}")
+        results.put(("result", request_id, {"response": None, "source": "error", "complete": True}))
+    finally:
+        stream.close()  # Cancels a generation still running (see llm_stream_response)
+        with _jobs_lock:
+            _jobs.pop(request_id, None)
+        slots.release()
+
+
+def worker_main(worker_id: int, workers: int, requests, results, writes, updates, concurrency: int):
+    """Answer requests from the shared queue, at most `concurrency` at a time."""
+    _setup_child(f"worker {worker_id}")
+    if SERVE_CPU_SHARES:
+        import cpu_budget
+        cpu_budget.use_share(worker_id, workers)  # Before any model or thread exists
+    import memory
+    import rules
+    import pipeline  # Registers every model (embedding, llm) before the warm-up starts
+    from model_loader import start_warmup
+
+    memory.forward_writes(writes.put)
+    rules.forward_writes(writes.put)
+    threading.Thread(target=_apply_updates, args=(updates,), name="writer-updates", daemon=True).start()
+    start_warmup()
+    threading.Thread(target=_report_health, args=(worker_id, results), name="health", daemon=True).start()
+
+    # Take a request off the shared queue only with a free slot, so idle workers get the rest
+    slots = threading.BoundedSemaphore(concurrency)
+    while True:
+        slots.acquire()
+        request = requests.get()
+        if request is None:
+            break
+        threading.Thread(target=_answer, args=(request, results, slots), daemon=True).start()
+
+    for _ in range(concurrency - 1):
+        slots.acquire()  # Let in-flight answers finish
+    memory.flush_hits()
+    close_connections()
+    logging.info("Worker stopped.")
+
+
+# === Front end ===
+class WorkerPool:
+    """Starts the writer and worker processes and routes requests to the workers."""
+
+    def __init__(self, workers: int = SERVE_WORKERS, concurrency: int = SERVE_WORKER_CONCURRENCY):
+        # spawn: the parent may already run threads (HTTP server, dispatcher), which fork would copy mid-state
+        self._ctx = multiprocessing.get_context("spawn")
+        self.workers = max(1, workers)
+        self.concurrency = max(1, concurrency)
+        self.requests = self._ctx.Queue()
+        self.results = self._ctx.Queue()
+        self.writes = self._ctx.Queue()
+        self.updates = [self._ctx.Queue() for _ in range(self.workers)]
+        self._writer = None
+        self._dispatcher = None
+        self._processes = []
+        self._pending = {}  # request id -> queue.Queue of result dicts
+        self._pending_lock = threading.Lock()
+        self._request_ids = itertools.count(1)
+        self._health = {}
+
+    def start(self, ready_timeout: float = 300):
+        ready = self._ctx.Event()
+        # daemon: if the front end dies without stop(), its children go with it
+        self._writer = self._ctx.Process(target=writer_main, args=(self.writes, self.updates, ready),
+                                         name="neurochat-writer", daemon=True)
+        self._writer.start()
+        if not ready.wait(ready_timeout) or not self._writer.is_alive():
+            self._writer.terminate()
+            raise RuntimeError("Memory writer process did not start.")
+
+        for worker_id in range(self.workers):
+            process = self._ctx.Process(
+                target=worker_main,
+                args=(worker_id, self.workers, self.requests, self.results, self.writes, self.updates[worker_id], self.concurrency),
+                name=f"neurochat-worker-{worker_id}",
+                daemon=True,
+            )
+            process.start()
+            self._processes.append(process)
+        self._dispatcher = threading.Thread(target=self._dispatch, name="worker-results", daemon=True)
+        self._dispatcher.start()
+        logging.info(f"Started {self.workers} workers and the memory writer.")
+        return self
+
+    def _dispatch(self):
+        while True:
+            message = self.results.get()
+            if message is None:
+                return
+            if message[0] == "health":
+                self._health[message[1]] = message[2]
+                continue
+            _, request_id, payload = message
+            with self._pending_lock:
+                waiter = self._pending.get(request_id)
+            if waiter is not None:
+                waiter.put(payload)
+
+    def stream(self, user_input: str, timeout: float = SERVE_REQUEST_TIMEOUT):
+        """
+        Yield result dicts (see PipelineResult.as_dict, plus 'complete') as a worker produces them.
+        Raises TimeoutError if the answer is not complete within `timeout` seconds.
+        Closing the generator before the last result cancels the request.
+        """
+        request_id = next(self._request_ids)
+        waiter = queue.Queue()
+        with self._pending_lock:
+            self._pending[request_id] = waiter
+        deadline = time.monotonic() + timeout
+        complete = False
+        try:
+            self.requests.put((request_id, user_input))
+            while True:
+                try:
+                    payload = waiter.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    raise TimeoutError(f"No complete answer within {timeout}s.")
+                complete = bool(payload.get("complete"))
+                yield payload
+                if complete:
+                    return
+        finally:
+            with self._pending_lock:
+                self._pending.pop(request_id, None)
+            if not complete:
+                self.cancel(request_id)  # Timed out or the caller stopped reading
+
+    def cancel(self, request_id: int):
+        """Stop answering a request: whichever worker has it (or takes it later) drops it."""
+        for update_queue in self.updates:
+            update_queue.put(("cancel", request_id))
+
+    def ask(self, user_input: str, timeout: float = SERVE_REQUEST_TIMEOUT) -> dict:
+        """Return the complete result dict for one message."""
+        payload = None
+        for payload in self.stream(user_input, timeout):
+            pass
+        return payload
+
+    def health(self) -> dict:
+        """Readiness of every worker: {'ready': bool, 'workers': {id: model_loader.health() or None}}."""
+        workers = {worker_id: self._health.get(worker_id) for worker_id in range(self.workers)}
+        alive = all(process.is_alive() for process in self._processes) and self._writer.is_alive()
+        ready = alive and all(status is not None and status["ready"] for status in workers.values())
+        return {"ready": ready, "writer_alive": self._writer.is_alive(), "workers": workers}
+
+    def stop(self, timeout: float = 30):
+        """Stop the workers (letting in-flight answers finish), then the writer once it has every write."""
+        for _ in self._processes:
+            self.requests.put(None)
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                logging.warning(f"{process.name} did not stop, terminating it.")
+                process.terminate()
+        self.writes.put(None)
+        self._writer.join(timeout)
+        if self._writer.is_alive():
+            self._writer.terminate()
+        self.results.put(None)
+        if self._dispatcher is not None:
+            self._dispatcher.join(timeout)
+        logging.info("Worker pool stopped.")
+
+
+class _ChatHandler(BaseHTTPRequestHandler):
+    def _send_json(self, status: int, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/health":
+            self.send_error(404)
+            return
+        status = self.server.pool.health()
+        self._send_json(200 if status["ready"] else 503, status)
+
+    def do_POST(self):
+        if self.path.split("?", 1)[0] != "/chat":
+            self.send_error(404)
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+            user_input = str(body["input"]).strip()
+        except (ValueError, KeyError, TypeError):
+            self._send_json(400, {"error": 'expected a JSON object {"input": "..."}'})
+            return
+        if not user_input:
+            self._send_json(400, {"error": "input is empty"})
+            return
+
+        pool = self.server.pool
+        try:
+            if not body.get("stream"):
+                self._send_json(200, pool.ask(user_input))
+                return
+            # Newline-delimited JSON, one object per update; the connection closes after the last one
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson; charset=utf-8")
+            self.end_headers()
+            stream = pool.stream(user_input)
+            try:
+                for payload in stream:
+                    self.wfile.write((json.dumps(payload, ensure_ascii=False) + "\n").encode("utf-8"))
+                    self.wfile.flush()
+            finally:
+                stream.close()  # Cancels the worker's job if the client went away mid-answer
+        except (BrokenPipeError, ConnectionResetError):
+            logging.info(f"{self.address_string()} disconnected before the answer was complete.")
+        except TimeoutError as e:
+            if body.get("stream"):
+                self.wfile.write((json.dumps({"error": str(e), "complete": True}) + "\n").encode("utf-8"))
+            else:
+                self._send_json(504, {"error": str(e)})
+
+    def log_message(self, format, *args):
+        logging.debug(f"{self.address_string()} {format % args}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the chatbot from several worker processes.")
+    parser.add_argument("--workers", type=int, default=SERVE_WORKERS)
+    parser.add_argument("--concurrency", type=int, default=SERVE_WORKER_CONCURRENCY, help="requests per worker")
+    parser.add_argument("--host", default=SERVE_HOST)
+    parser.add_argument("--port", type=int, default=SERVE_PORT)
+    args = parser.parse_args()
+
+    pool = WorkerPool(args.workers, args.concurrency).start()
+    server = ThreadingHTTPServer((args.host, args.port), _ChatHandler)
+    server.daemon_threads = True
+    server.pool = pool
+    signal.signal(signal.SIGTERM, _interrupt)
+    logging.info(f"Serving POST http://{args.host}:{server.server_address[1]}/chat")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logging.info("Shutting down...")
+    finally:
+        signal.signal(signal.SIGINT, signal.SIG_IGN)  # A second Ctrl+C must not cut the shutdown short
+        server.server_close()
+        pool.stop()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=LOG_LEVEL, format=LOG_FORMAT.replace("%(message)s", "[front] %(message)s"), force=True)
+    main()
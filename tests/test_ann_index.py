@@ -0,0 +1,73 @@
+import numpy as np
+from ann_index import IVFIndex, evaluate_recall
+from vector_index import VectorIndex
+
+DIM = 16
+
+
+def clustered(rows: int = 400, seed: int = 0):
+    """Rows around 8 well-separated directions, with ids 1..rows."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((8, DIM))
+    vectors = centers[rng.integers(0, 8, rows)] + 0.05 * rng.standard_normal((rows, DIM))
+    return vectors.astype(np.float32)
+
+
+def trained(vectors, **kwargs) -> IVFIndex:
+    index = IVFIndex(DIM, nlist=8, nprobe=2, min_train_size=1, **kwargs)
+    for row_id, vector in enumerate(vectors, 1):
+        index.add(row_id, f"input {row_id}", f"response {row_id}", vector)
+    index.prepare()
+    return index
+
+
+def test_untrained_index_is_exact():
+    vectors = clustered(50)
+    index = IVFIndex(DIM, nlist=8, min_train_size=1000)
+    for row_id, vector in enumerate(vectors, 1):
+        index.add(row_id, "i", "r", vector)
+    index.prepare()
+    assert not index.is_trained
+    assert index.search(vectors[7])[0]["id"] == 8
+
+
+def test_trained_index_agrees_with_exact_search():
+    vectors = clustered()
+    index = trained(vectors)
+    assert index.is_trained
+    result = evaluate_recall(index, vectors[:100], threshold=0.9)
+    assert result["recall_at_1"] == 1.0 and result["decision_agreement"] == 1.0
+
+
+def test_rows_added_after_training_are_found():
+    vectors = clustered()
+    index = trained(vectors[:300])
+    for row_id, vector in enumerate(vectors[300:], 301):
+        index.add(row_id, "late", "r", vector)
+    assert index.search(vectors[350])[0]["id"] == 351
+
+
+def test_removed_rows_leave_the_inverted_lists():
+    vectors = clustered()
+    index = trained(vectors)
+    assert index.remove([11, 12]) == 2
+    assert index.search(vectors[10])[0]["id"] != 11
+    # Positions shifted by the compaction still point at the right rows
+    assert index.search(vectors[200])[0]["id"] == 201
+    assert VectorIndex.search(index, vectors[200])[0]["input"] == "input 201"
+
+
+def test_saved_structure_is_reused(tmp_path):
+    vectors = clustered()
+    index = trained(vectors[:300])
+    index.save(tmp_path / "ivf.npz")
+    reloaded = IVFIndex(DIM, nlist=8, nprobe=2)
+    for row_id, vector in enumerate(vectors, 1):
+        reloaded.add(row_id, f"input {row_id}", "r", vector)
+    assert reloaded.load_structure(tmp_path / "ivf.npz")
+    np.testing.assert_array_equal(reloaded.centroids, index.centroids)
+    assert reloaded.search(vectors[399])[0]["id"] == 400
+
+    stale = IVFIndex(DIM, nlist=8)
+    stale.add(7, "other", "r", vectors[0])
+    assert not stale.load_structure(tmp_path / "ivf.npz")
@@ -0,0 +1,32 @@
+import sqlite3
+import pytest
+import lexical_index
+from config import LEXICAL_THRESHOLD
+
+
+@pytest.mark.parametrize("query, candidate", [
+    ("what is my name", "what is your name"),
+    ("do you like cats", "do you like dogs"),
+])
+def test_one_swapped_word_is_not_a_match(query, candidate):
+    assert lexical_index.overlap_score(query, candidate) < LEXICAL_THRESHOLD
+
+
+@pytest.mark.parametrize("query, candidate", [
+    ("What is my name?", "what is my name"),
+    ("is my name", "what is my name"),
+])
+def test_same_question_is_a_match(query, candidate):
+    assert lexical_index.overlap_score(query, candidate) >= LEXICAL_THRESHOLD
+
+
+def test_search_follows_memory_writes():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE memory (id INTEGER PRIMARY KEY, input TEXT, response TEXT)")
+    if not lexical_index.ensure_fts(conn):
+        pytest.skip("SQLite built without FTS5")
+    conn.execute("INSERT INTO memory (input, response) VALUES ('what is my name', 'Sam')")
+    assert [row[1] for row in lexical_index.search(conn, "name")] == ["what is my name"]
+    conn.execute("UPDATE memory SET input = 'where do I live'")
+    assert lexical_index.search(conn, "name") == []
+    assert [row[2] for row in lexical_index.search(conn, "live")] == ["Sam"]
@@ -0,0 +1,137 @@
+import threading
+import time
+import pytest
+from llm_scheduler import LLMIncomplete, LLMQueueFull, LLMScheduler, LLMTimeout
+
+
+class GatedStream:
+    """stream_fn stand-in: yields one piece, then one more per release() call."""
+
+    def __init__(self, pieces: int = 3):
+        self.pieces = pieces
+        self.started = threading.Event()
+        self.closed = threading.Event()
+        self._gate = threading.Semaphore(0)
+
+    def release(self, count: int = 1):
+        for _ in range(count):
+            self._gate.release()
+
+    def __call__(self, prompt, max_tokens):
+        self.started.set()
+        try:
+            for i in range(self.pieces):
+                if i:
+                    self._gate.acquire(timeout=5)
+                yield f"{prompt}{i} "
+        finally:
+            self.closed.set()
+
+
+@pytest.fixture
+def make_scheduler():
+    schedulers = []
+
+    def make(stream_fn, **kwargs):
+        scheduler = LLMScheduler(stream_fn, **kwargs)
+        schedulers.append(scheduler)
+        return scheduler
+
+    yield make
+    for scheduler in schedulers:
+        scheduler.shutdown()
+
+
+def test_streams_every_piece(make_scheduler):
+    stream = GatedStream(pieces=3)
+    scheduler = make_scheduler(stream)
+    stream.release(2)
+    request = scheduler.submit("p")
+    assert list(request) == ["p0 ", "p1 ", "p2 "]
+    assert request.status == "done"
+    assert scheduler.stats()["completed"] == 1
+
+
+def test_deadline_stops_generation(make_scheduler):
+    stream = GatedStream(pieces=3)
+    scheduler = make_scheduler(stream)
+    request = scheduler.submit("p", timeout=0.05)
+    assert stream.started.wait(timeout=5)
+    time.sleep(0.1)
+    stream.release()
+    with pytest.raises(LLMTimeout):
+        list(request)
+    assert request.status == "timeout"
+    assert request.text == "p0 p1 "
+    assert stream.closed.wait(timeout=5)
+
+
+def test_expired_request_is_dropped_before_it_starts(make_scheduler):
+    first = GatedStream(pieces=2)
+    scheduler = make_scheduler(first)
+    running = scheduler.submit("a")
+    assert first.started.wait(timeout=5)
+    queued = scheduler.submit("b", timeout=0.01)
+    time.sleep(0.05)
+    first.release()
+    assert running.result() == "a0 a1 "
+    with pytest.raises(LLMTimeout):
+        list(queued)
+    assert queued.started_at is None
+
+
+def test_cancel_while_running(make_scheduler):
+    stream = GatedStream(pieces=5)
+    scheduler = make_scheduler(stream)
+    request = scheduler.submit("p")
+    pieces = iter(request)
+    assert next(pieces) == "p0 "
+    request.cancel()
+    stream.release()
+    with pytest.raises(LLMIncomplete):
+        list(pieces)
+    assert request.status == "cancelled"
+    assert stream.closed.wait(timeout=5)
+    assert scheduler.stats()["cancelled"] == 1
+
+
+def test_cancel_while_queued(make_scheduler):
+    stream = GatedStream(pieces=2)
+    scheduler = make_scheduler(stream)
+    running = scheduler.submit("a")
+    assert stream.started.wait(timeout=5)
+    queued = scheduler.submit("b")
+    queued.cancel()
+    stream.release()
+    running.result()
+    with pytest.raises(LLMIncomplete):
+        list(queued)
+    assert queued.status == "cancelled"
+    assert queued.text == ""
+
+
+def test_error_ends_the_request(make_scheduler):
+    def failing(prompt, max_tokens):
+        yield "partial "
+        raise RuntimeError("model crashed")
+
+    scheduler = make_scheduler(failing)
+    request = scheduler.submit("p")
+    with pytest.raises(LLMIncomplete):
+        list(request)
+    assert request.status == "error"
+    assert str(request.error) == "model crashed"
+    assert request.text == "partial "
+
+
+def test_full_queue_rejects(make_scheduler):
+    stream = GatedStream(pieces=2)
+    scheduler = make_scheduler(stream, max_queue=1)
+    running = scheduler.submit("a")
+    assert stream.started.wait(timeout=5)
+    scheduler.submit("b")
+    with pytest.raises(LLMQueueFull):
+        scheduler.submit("c")
+    assert scheduler.stats()["rejected"] == 1
+    stream.release(2)
+    running.result()
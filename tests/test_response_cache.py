@@ -0,0 +1,90 @@
+import sqlite3
+from benchmarks.stand_ins import HashEmbedder
+from response_cache import ResponseCache
+from rule_engine import RuleEngine
+
+embedder = HashEmbedder()
+
+
+def test_rule_answers_are_cached_without_a_vector():
+    cache = ResponseCache(threshold=0.8)
+    cache.put("Hello!", "Hi there", "rule")
+    assert cache.get("hello") == {"response": "Hi there", "source": "rule", "row_id": None, "score": None}
+    cache.put("tell me a story", "Once upon a time", "llm")  # No vector: not cached
+    assert cache.get("tell me a story") is None
+
+
+def test_busy_replies_and_empty_keys_are_skipped():
+    cache = ResponseCache(threshold=0.8)
+    cache.put("hello", "The server is busy", "busy", vector=embedder.encode("hello"))
+    cache.put("?!", "Punctuation", "rule")
+    assert cache.get("hello") is None
+    assert cache.get("?!") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    cache = ResponseCache(ttl=10, threshold=0.8)
+    now = [1000.0]
+    monkeypatch.setattr("response_cache.time.monotonic", lambda: now[0])
+    cache.put("hello", "Hi", "rule")
+    now[0] += 5
+    assert cache.get("hello")["response"] == "Hi"
+    now[0] += 6
+    assert cache.get("hello") is None
+
+
+def test_lru_eviction():
+    cache = ResponseCache(max_size=2, threshold=0.8)
+    cache.put("one", "1", "rule")
+    cache.put("two", "2", "rule")
+    cache.get("one")
+    cache.put("three", "3", "rule")
+    assert cache.get("two") is None
+    assert cache.get("one")["response"] == "1"
+
+
+def test_memory_added_drops_only_answers_it_would_change():
+    cache = ResponseCache(threshold=0.8)
+    capital = embedder.encode("what is the capital of france")
+    cache.put("what is the capital of france", "I think it is Paris", "llm", vector=capital)
+    cache.put("what is the capital of spain", "Madrid", "memory", vector=embedder.encode("what is the capital of spain"),
+              score=0.99, row_id=7)
+    cache.put("how are you", "Fine, thanks", "llm", vector=embedder.encode("how are you"))
+
+    assert cache.memory_added(capital, "Paris") == 1
+    assert cache.get("what is the capital of france") is None
+    assert cache.get("what is the capital of spain")["response"] == "Madrid"  # Its own match scores higher
+    assert cache.get("how are you")["response"] == "Fine, thanks"
+
+
+def test_memory_added_drops_weaker_memory_answers():
+    cache = ResponseCache(threshold=0.8)
+    vec = embedder.encode("what is the capital of france")
+    cache.put("what is the capital of france", "Lyon", "memory", vector=vec, score=0.85, row_id=3)
+    assert cache.memory_added(vec, "Paris") == 1
+    assert cache.get("what is the capital of france") is None
+
+
+def test_memory_removed_drops_answers_from_those_rows():
+    cache = ResponseCache(threshold=0.8)
+    for row_id, text in [(1, "first question"), (2, "second question")]:
+        cache.put(text, f"answer {row_id}", "memory", vector=embedder.encode(text), score=0.9, row_id=row_id)
+    assert cache.memory_removed([1, 99]) == 1
+    assert cache.get("first question") is None
+    assert cache.get("second question")["row_id"] == 2
+
+
+def test_rule_reload_clears_the_cache(tmp_path):
+    path = tmp_path / "rules.db"
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE rules (id INTEGER PRIMARY KEY, input TEXT, response TEXT, tags TEXT)")
+    cache = ResponseCache(threshold=0.8)
+    engine = RuleEngine(path, reload_interval=0, on_reload=cache.clear)
+    engine.refresh()
+    cache.put("hello", "Hi", "rule")
+    engine.refresh()  # Nothing changed: no reload
+    assert cache.get("hello")["response"] == "Hi"
+    engine.invalidate()
+    engine.refresh()
+    assert cache.get("hello") is None
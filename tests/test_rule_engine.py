@@ -0,0 +1,76 @@
+import sqlite3
+import time
+import pytest
+from rule_engine import KeywordMatcher, RuleEngine
+
+
+def matcher(*keywords) -> KeywordMatcher:
+    keywords_matcher = KeywordMatcher()
+    for keyword in keywords:
+        keywords_matcher.add(keyword, keyword)
+    keywords_matcher.build()
+    return keywords_matcher
+
+
+def test_keyword_matcher_finds_every_whole_word_occurrence():
+    found = list(matcher("he", "she", "hers", "his").find_all("she said his and hers"))
+    assert found == [(0, 3, "she"), (9, 3, "his"), (17, 4, "hers")]
+
+
+def test_keyword_matcher_follows_failure_links():
+    # "york" is only reached through the failure link out of the "new york city" branch
+    assert list(matcher("new york city", "york").find_all("new york state")) == [(4, 4, "york")]
+
+
+def test_keyword_matcher_skips_partial_words():
+    assert list(matcher("cat").find_all("concatenate cats")) == []
+
+
+@pytest.fixture
+def rules_db(tmp_path):
+    path = tmp_path / "rules.db"
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE rules (id INTEGER PRIMARY KEY, input TEXT, response TEXT, tags TEXT)")
+    conn.executemany("INSERT INTO rules (input, response, tags) VALUES (?, ?, ?)", [
+        ("Hello", "exact hello", None),
+        ("weather", "keyword weather", "keyword"),
+        ("weather today", "keyword weather today", "keyword"),
+        (r"^\d+ \+ \d+$", "regex sum", "regex"),
+        ("([", "broken regex", "regex"),
+    ])
+    conn.commit()
+    yield path, conn
+    conn.close()
+
+
+def test_lookup_order(rules_db):
+    engine = RuleEngine(rules_db[0])
+    assert engine.match("Hello") == {"response": "exact hello", "match": "exact"}
+    assert engine.match("hello!!") == {"response": "exact hello", "match": "normalized"}
+    assert engine.match("how is the weather today?")["response"] == "keyword weather today"  # Longest keyword wins
+    assert engine.match("weather") == {"response": "keyword weather", "match": "keyword"}
+    assert engine.match("2 + 3") == {"response": "regex sum", "match": "regex"}
+    assert engine.match("nothing matches this") is None
+
+
+def test_reloads_when_the_db_changes_on_disk(rules_db):
+    path, conn = rules_db
+    reloads = []
+    engine = RuleEngine(path, reload_interval=0.01, on_reload=lambda: reloads.append(1))
+    assert engine.match("goodbye") is None
+    conn.execute("INSERT INTO rules (input, response) VALUES ('goodbye', 'bye')")
+    conn.commit()
+    time.sleep(0.02)
+    assert engine.match("goodbye") == {"response": "bye", "match": "exact"}
+    assert len(reloads) == 2
+
+
+def test_invalidate_forces_a_reload(rules_db):
+    path, conn = rules_db
+    engine = RuleEngine(path, reload_interval=0)  # No on-disk checks
+    engine.refresh()
+    conn.execute("INSERT INTO rules (input, response) VALUES ('goodbye', 'bye')")
+    conn.commit()
+    assert engine.match("goodbye") is None
+    engine.invalidate()
+    assert engine.match("goodbye")["response"] == "bye"
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+from vector_index import VectorIndex
+from vector_store import VectorSegment
+
+DIM = 8
+
+
+def unit(i: int) -> np.ndarray:
+    vector = np.zeros(DIM, dtype=np.float32)
+    vector[i] = 1.0
+    return vector
+
+
+def filled(dtype: str = "float32", segment=None) -> VectorIndex:
+    index = VectorIndex(DIM, initial_capacity=2, segment=segment, dtype=dtype)  # Small, so add() has to grow it
+    for i in range(5):
+        index.add(i + 1, f"input {i}", f"response {i}", unit(i) * (i + 1))
+    return index
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16", "int8"])
+def test_search_finds_the_nearest_row(dtype):
+    index = filled(dtype)
+    query = unit(2) + 0.1 * unit(3)
+    best = index.search(query)[0]
+    assert (best["id"], best["input"], best["response"]) == (3, "input 2", "response 2")
+    assert best["score"] == pytest.approx(1 / np.linalg.norm(query), abs=0.02)  # Vectors are normalized
+    assert [match["id"] for match in index.search(query, k=2)] == [3, 4]
+
+
+def test_search_many_matches_search():
+    index = filled()
+    queries = np.stack([unit(4), unit(0) + unit(1), unit(3)])
+    assert index.search_many(queries, k=2) == [index.search(query, k=2) for query in queries]
+
+
+def test_search_ids_scores_only_the_given_rows():
+    index = filled()
+    assert [match["id"] for match in index.search_ids(unit(2), [1, 5, 99], k=3)] == [1, 5]
+    assert index.search_ids(unit(2), [99]) == []
+
+
+def test_wrong_dimension_is_rejected():
+    index = filled()
+    assert not index.add(9, "x", "y", np.ones(DIM + 1))
+    assert index.search(np.ones(DIM + 1)) == []
+
+
+def test_remove_compacts_in_ram_rows():
+    index = filled()
+    assert index.remove([3, 42]) == 1
+    assert len(index) == 4 and 3 not in index
+    assert index.search(unit(2))[0]["id"] != 3
+    # Texts stay aligned with their vectors after the compaction
+    assert {m["id"]: m["input"] for m in index.search(unit(4), k=4)}[5] == "input 4"
+    assert index.remove([3]) == 0
+
+
+def test_remove_masks_segment_rows(tmp_path):
+    index = filled(segment=VectorSegment(tmp_path / "memory.vseg", DIM))
+    assert index.remove([3]) == 1
+    assert len(index) == 4
+    assert len(index.segment) == 5  # The file is append-only; the row is only masked
+    assert index.search(unit(2))[0]["id"] != 3
+    assert 3 not in [m["id"] for m in index.search(unit(2), k=5)]
+    assert index.search_ids(unit(2), [3]) == []
+    assert 3 not in [m["id"] for m in index.search_many(unit(2)[None], k=5)[0]]
+    assert index.remove([3]) == 0
+
+
+def test_segment_rows_without_text_are_masked(tmp_path):
+    index = filled(segment=VectorSegment(tmp_path / "memory.vseg", DIM))
+    reopened = VectorIndex(DIM, segment=VectorSegment(tmp_path / "memory.vseg", DIM))
+    reopened.set_texts({row_id: (f"input {row_id - 1}", "r") for row_id in (1, 2, 4, 5)})
+    assert len(reopened) == len(index) - 1
+    assert reopened.search(unit(2))[0]["id"] != 3
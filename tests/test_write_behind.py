@@ -0,0 +1,90 @@
+import threading
+import numpy as np
+import pytest
+import memory
+from benchmarks.stand_ins import HashEmbedder
+from write_behind import WriteBehindQueue
+
+
+def test_flush_writes_everything_in_batches():
+    batches = []
+    queue = WriteBehindQueue(batches.append, max_batch_size=3, max_delay=10)
+    for i in range(7):
+        queue.put(i)
+    assert queue.flush(timeout=5)
+    assert [item for batch in batches for item in batch] == list(range(7))
+    assert all(len(batch) <= 3 for batch in batches)
+    assert queue.depth() == 0
+    queue.shutdown()
+
+
+def test_batch_is_written_after_max_delay():
+    written = threading.Event()
+    queue = WriteBehindQueue(lambda batch: written.set(), max_batch_size=100, max_delay=0.05)
+    queue.put("item")
+    assert written.wait(timeout=5)
+    queue.shutdown()
+
+
+def test_failed_batch_does_not_stop_the_writer():
+    batches = []
+
+    def write(batch):
+        if batch == ["bad"]:
+            raise ValueError("boom")
+        batches.append(batch)
+
+    queue = WriteBehindQueue(write, max_batch_size=1, max_delay=0)
+    queue.put("bad")
+    queue.put("good")
+    assert queue.flush(timeout=5)
+    assert batches == [["good"]]
+    queue.shutdown()
+
+
+def test_shutdown_writes_pending_items_and_refuses_new_ones():
+    batches = []
+    queue = WriteBehindQueue(batches.append, max_delay=10)
+    queue.put("last")
+    queue.shutdown()
+    assert batches == [["last"]]
+    with pytest.raises(RuntimeError):
+        queue.put("late")
+
+
+@pytest.fixture
+def scratch_memory(tmp_path, monkeypatch):
+    """memory.py on an empty DB in tmp_path, with a writer that holds each batch until released."""
+    monkeypatch.setattr(memory, "VECTOR_MEMORY_DB_PATH", tmp_path / "vector_memory.db")
+    monkeypatch.setattr(memory, "_index", None)
+    release = threading.Event()
+
+    def write(rows):
+        release.wait(timeout=5)
+        memory._write_rows(rows)
+
+    writer = WriteBehindQueue(write, max_delay=0, name="test-memory-writer")
+    monkeypatch.setattr(memory, "memory_writer", writer)
+    yield release
+    release.set()
+    writer.shutdown()
+
+
+def test_saved_row_matches_before_it_is_written(scratch_memory):
+    embedder = HashEmbedder()
+    vec = embedder.encode("what is the capital of france")
+    memory.get_index()
+    memory.save_to_memory("what is the capital of france", "Paris", vector=vec)
+
+    match = memory.find_best_match(vec)
+    assert match["id"] is None
+    assert match["response"] == "Paris"
+    assert match["score"] == pytest.approx(1.0, abs=1e-5)
+    assert memory.find_best_matches(np.stack([vec]))[0]["response"] == "Paris"
+
+    scratch_memory.set()
+    assert memory.flush_writes(timeout=5)
+    match = memory.find_best_match(vec)
+    assert match["id"] is not None
+    assert match["response"] == "Paris"
+    assert not memory._unsaved
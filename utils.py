@@ -1,6 +1,7 @@
 # utils.py
 
 import logging
+import random
 import re
 import numpy as np
 
@@ -41,3 +42,9 @@ def log_section(title: str):
     """
     logging.info(f"\n{'=' * 40}\n{title}\n{'=' * 40}")
 
+def debug_sampled(rate: float) -> bool:
+    """
+    True for roughly `rate` of calls when DEBUG logging is on.
+    Guards detailed debug output on hot paths so it costs nothing by default.
+    """
+    return rate > 0 and logging.getLogger().isEnabledFor(logging.DEBUG) and random.random() < rate
@@ -0,0 +1,409 @@
+# vector_index.py
+
+import logging
+import threading
+import numpy as np
+
+
+INDEX_DTYPES = ("float32", "float16", "int8")
+
+
+def score_rows(matrix: np.ndarray, query: np.ndarray, scales: np.ndarray = None, chunk_size: int = 8192) -> np.ndarray:
+    """
+    Dot product of every row with the query, computed in float32.
+    `query` is one vector, or a (dim, queries) matrix for a (rows, queries) result.
+    Reduced-precision rows are widened a cache-sized chunk at a time;
+    int8 rows are multiplied by their per-row `scales`.
+    """
+    if matrix.dtype == np.float32 and scales is None:
+        return matrix @ query
+    scores = np.empty((matrix.shape[0],) + query.shape[1:], dtype=np.float32)
+    for start in range(0, matrix.shape[0], chunk_size):
+        scores[start:start + chunk_size] = matrix[start:start + chunk_size].astype(np.float32) @ query
+    if scales is not None:
+        scores *= scales.reshape((-1,) + (1,) * (query.ndim - 1))
+    return scores
+
+
+def quantize_int8(vectors: np.ndarray):
+    """Per-row symmetric int8 quantization: returns (int8 rows, float32 scales) with rows * scales ~ vectors."""
+    vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, vectors.shape[-1])
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    safe = np.where(scales > 0, scales, 1.0)
+    rows = np.clip(np.rint(vectors / safe[:, None]), -127, 127).astype(np.int8)
+    return rows, scales.astype(np.float32)
+
+
+class VectorIndex:
+    """
+    In-process index over vector memory.
+    Keeps a contiguous float32 matrix of pre-normalized vectors plus parallel
+    id / input / response arrays, so a lookup is a single matrix-vector product.
+    With a `segment` (see vector_store.py) the matrix is a read-only memory map
+    of that file instead, and new vectors are appended to it. Removed segment
+    rows are masked out of searches until compact.py rewrites the file.
+    `dtype` float16 or int8 (per-row scaled) shrinks the in-RAM matrix 2x / 4x;
+    scores are then approximate, see memory.find_best_match for the re-ranking.
+    """
+
+    def __init__(self, dim: int, initial_capacity: int = 1024, segment=None, dtype: str = "float32"):
+        if dtype not in INDEX_DTYPES:
+            raise ValueError(f"Unsupported index dtype '{dtype}' (use one of {', '.join(INDEX_DTYPES)}).")
+        self.dim = dim
+        self._lock = threading.Lock()
+        self.segment = segment
+        self._inputs = []
+        self._responses = []
+        self._dead = None  # Boolean mask of removed segment rows (None while nothing is removed)
+        self._dead_count = 0
+        self._scales = None  # Per-row scales of an int8 matrix
+        if segment is not None:
+            self._matrix = segment.vectors
+            self._ids = segment.ids
+            self._size = len(segment)
+        else:
+            capacity = max(initial_capacity, 1)
+            self._matrix = np.zeros((capacity, dim), dtype=dtype)
+            self._ids = np.zeros(capacity, dtype=np.int64)
+            if dtype == "int8":
+                self._scales = np.zeros(capacity, dtype=np.float32)
+            self._size = 0
+
+    def __len__(self):
+        return self._size - self._dead_count
+
+    def __contains__(self, row_id) -> bool:
+        return bool(np.any(self._ids[:self._size] == row_id))
+
+    @property
+    def last_id(self) -> int:
+        """Memory id of the most recently appended row (0 when empty)."""
+        return int(self._ids[self._size - 1]) if self._size else 0
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self._matrix.dtype
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the vector matrix (and int8 scales), excluding unused capacity."""
+        row_bytes = self.dim * self._matrix.dtype.itemsize + (4 if self._scales is not None else 0)
+        return self._size * row_bytes
+
+    def vectors_at(self, positions) -> np.ndarray:
+        """Stored rows as float32 (int8 rows rescaled)."""
+        rows = self._matrix[positions].astype(np.float32)
+        if self._scales is not None:
+            rows *= self._scales[positions].reshape(-1, 1) if rows.ndim == 2 else self._scales[positions]
+        return rows
+
+    @staticmethod
+    def normalize(vector: np.ndarray) -> np.ndarray:
+        """Return a float32 unit vector (zero vectors stay zero)."""
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            return vector
+        return vector / norm
+
+    def _grow(self, needed: int):
+        capacity = self._matrix.shape[0]
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        matrix = np.zeros((capacity, self.dim), dtype=self._matrix.dtype)
+        matrix[:self._size] = self._matrix[:self._size]
+        ids = np.zeros(capacity, dtype=np.int64)
+        ids[:self._size] = self._ids[:self._size]
+        if self._scales is not None:
+            scales = np.zeros(capacity, dtype=np.float32)
+            scales[:self._size] = self._scales[:self._size]
+            self._scales = scales
+        # Swap in new buffers; readers holding the old ones still see a consistent prefix.
+        self._matrix = matrix
+        self._ids = ids
+
+    def add(self, row_id: int, stored_input: str, stored_response: str, vector: np.ndarray) -> bool:
+        """Append one entry. Returns False if the vector has the wrong dimension."""
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+        if vector.shape[0] != self.dim:
+            logging.warning(f"Vector dim mismatch for memory id {row_id}: {vector.shape[0]} vs {self.dim}")
+            return False
+        with self._lock:
+            self._append_vector(row_id, self.normalize(vector))
+            self._inputs.append(stored_input)
+            self._responses.append(stored_response)
+            self._size += 1
+            self._on_added(self._size - 1)
+        return True
+
+    def _append_vector(self, row_id: int, vector: np.ndarray):
+        if self.segment is not None:
+            self.segment.append([row_id], vector)
+            self._matrix = self.segment.vectors
+            self._ids = self.segment.ids
+            return
+        self._grow(self._size + 1)
+        if self._scales is not None:
+            rows, scales = quantize_int8(vector)
+            self._matrix[self._size] = rows[0]
+            self._scales[self._size] = scales[0]
+        else:
+            self._matrix[self._size] = vector
+        self._ids[self._size] = row_id
+
+    def set_texts(self, texts: dict):
+        """
+        Fill the input/response arrays for vectors loaded from a segment.
+        `texts` maps memory id -> (input, response); ids without text get None.
+        """
+        with self._lock:
+            self._inputs = []
+            self._responses = []
+            dead = np.zeros(self._size, dtype=bool)
+            for position, row_id in enumerate(self._ids[:self._size].tolist()):
+                stored_input, stored_response = texts.get(row_id, (None, None))
+                if stored_input is None:
+                    dead[position] = True
+                self._inputs.append(stored_input)
+                self._responses.append(stored_response)
+            missing = int(dead.sum())
+            self._dead = dead if missing else None
+            self._dead_count = missing
+        if missing:
+            logging.info(f"{missing} segment vectors have no memory row (evicted or deleted); "
+                         f"run compact.py to reclaim the space.")
+
+    def refresh_segment(self, texts: dict) -> int:
+        """
+        Pick up records another process appended to the segment file.
+        `texts` maps their memory ids to (input, response); ids without text are masked.
+        Returns the number of rows added.
+        """
+        with self._lock:
+            self.segment.refresh()
+            start, size = self._size, len(self.segment)
+            if size <= start:
+                return 0
+            self._matrix = self.segment.vectors
+            self._ids = self.segment.ids
+            dead = np.zeros(size, dtype=bool)
+            if self._dead is not None:
+                dead[:len(self._dead)] = self._dead
+            for position, row_id in enumerate(self._ids[start:size].tolist(), start):
+                stored_input, stored_response = texts.get(row_id, (None, None))
+                dead[position] = stored_input is None
+                self._inputs.append(stored_input)
+                self._responses.append(stored_response)
+            self._dead_count = int(dead.sum())
+            self._dead = dead if self._dead_count else None
+            self._size = size
+            for position in range(start, size):
+                self._on_added(position)
+        return size - start
+
+    def _on_added(self, position: int):
+        """Hook for subclasses, called under the lock after a row is appended."""
+        pass
+
+    def remove(self, row_ids) -> int:
+        """
+        Remove entries by memory id. Returns the number removed.
+        In-RAM rows are compacted away; segment rows are masked (the file is append-only).
+        """
+        remove_ids = np.fromiter(row_ids, dtype=np.int64)
+        with self._lock:
+            size = self._size
+            hit = np.isin(self._ids[:size], remove_ids)
+            if self._dead is not None:
+                hit[:len(self._dead)] &= ~self._dead[:size]
+            removed = int(hit.sum())
+            if not removed:
+                return 0
+            positions = np.flatnonzero(hit)
+            if self.segment is not None:
+                dead = np.zeros(size, dtype=bool)
+                if self._dead is not None:
+                    dead[:len(self._dead)] = self._dead
+                dead[positions] = True
+                for position in positions.tolist():
+                    self._inputs[position] = None
+                    self._responses[position] = None
+                self._dead = dead
+                self._dead_count += removed
+            else:
+                keep = ~hit
+                matrix = np.zeros_like(self._matrix)
+                ids = np.zeros_like(self._ids)
+                matrix[:size - removed] = self._matrix[:size][keep]
+                ids[:size - removed] = self._ids[:size][keep]
+                if self._scales is not None:
+                    scales = np.zeros_like(self._scales)
+                    scales[:size - removed] = self._scales[:size][keep]
+                    self._scales = scales
+                # New buffers, like _grow(): readers holding the old ones stay consistent
+                self._matrix = matrix
+                self._ids = ids
+                self._inputs = [text for text, kept in zip(self._inputs, keep.tolist()) if kept]
+                self._responses = [text for text, kept in zip(self._responses, keep.tolist()) if kept]
+                self._size = size - removed
+                self._on_removed(keep)
+        return removed
+
+    def _on_removed(self, keep: np.ndarray):
+        """Hook for subclasses, called under the lock after in-RAM rows were compacted (`keep` marks survivors)."""
+        pass
+
+    def _mask_dead(self, scores: np.ndarray, positions: np.ndarray = None):
+        """Set the scores of removed rows to -inf (positions: the rows `scores` belong to, default all)."""
+        dead = self._dead
+        if dead is None:
+            return
+        if positions is None:
+            scores[:len(dead)][dead[:len(scores)]] = -np.inf
+        else:
+            in_mask = positions < len(dead)
+            scores[in_mask & dead[np.minimum(positions, len(dead) - 1)]] = -np.inf
+
+    def add_many(self, rows) -> int:
+        """Bulk-append (id, input, response, vector) tuples. Returns the number added."""
+        added = 0
+        for row_id, stored_input, stored_response, vector in rows:
+            if self.add(row_id, stored_input, stored_response, vector):
+                added += 1
+        return added
+
+    def search(self, vector: np.ndarray, k: int = 1):
+        """
+        Return up to k best matches as a list of dicts with
+        'id', 'input', 'response' and 'score', highest score first.
+        """
+        with self._lock:
+            size = self._size
+            matrix = self._matrix
+            ids = self._ids
+            inputs = self._inputs
+            responses = self._responses
+            scales = self._scales
+        if size == 0:
+            return []
+
+        query = np.asarray(vector, dtype=np.float32).reshape(-1)
+        if query.shape[0] != self.dim:
+            logging.warning(f"Vector dim mismatch: {query.shape[0]} vs {self.dim}")
+            return []
+        query = self.normalize(query)
+
+        scores = score_rows(matrix[:size], query, scales[:size] if scales is not None else None)
+        self._mask_dead(scores)
+        k = min(k, size)
+        if k == 1:
+            top = np.array([int(np.argmax(scores))])
+        else:
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+
+        return [
+            {
+                "id": int(ids[i]),
+                "input": inputs[i],
+                "response": responses[i],
+                "score": float(scores[i]),
+            }
+            for i in top
+            if scores[i] > -np.inf
+        ]
+
+    def search_many(self, vectors: np.ndarray, k: int = 1, max_block_bytes: int = 64 << 20):
+        """
+        search() for many queries at once: a matrix-matrix product per block of
+        queries (blocks are sized so the score matrix stays under `max_block_bytes`).
+        Returns one list of matches per query.
+        """
+        with self._lock:
+            size = self._size
+            matrix = self._matrix
+            ids = self._ids
+            inputs = self._inputs
+            responses = self._responses
+            scales = self._scales
+        queries = np.asarray(vectors, dtype=np.float32)
+        queries = queries.reshape(-1, queries.shape[-1]) if queries.size else queries.reshape(0, self.dim)
+        if size == 0:
+            return [[] for _ in range(len(queries))]
+        if queries.shape[1] != self.dim:
+            logging.warning(f"Vector dim mismatch: {queries.shape[1]} vs {self.dim}")
+            return [[] for _ in range(len(queries))]
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms == 0, 1, norms)
+
+        k = min(k, size)
+        block = max(1, max_block_bytes // (4 * size))
+        results = []
+        for start in range(0, len(queries), block):
+            scores = score_rows(matrix[:size], queries[start:start + block].T,
+                                scales[:size] if scales is not None else None)
+            self._mask_dead(scores)
+            if k == 1:
+                tops = np.argmax(scores, axis=0).reshape(1, -1)
+            else:
+                tops = np.argpartition(-scores, k - 1, axis=0)[:k]
+            for column in range(scores.shape[1]):
+                top = tops[:, column]
+                column_scores = scores[top, column]
+                top = top[np.argsort(-column_scores)]
+                results.append([
+                    {
+                        "id": int(ids[i]),
+                        "input": inputs[i],
+                        "response": responses[i],
+                        "score": float(scores[i, column]),
+                    }
+                    for i in top
+                    if scores[i, column] > -np.inf
+                ])
+        return results
+
+    def search_ids(self, vector: np.ndarray, row_ids, k: int = 1):
+        """
+        Like search(), but only scores the rows with the given memory ids
+        (e.g. lexical candidates). Ids not in the index are ignored.
+        Rows are appended in id order, so ids are found by binary search.
+        """
+        with self._lock:
+            size = self._size
+            matrix = self._matrix
+            ids = self._ids
+            inputs = self._inputs
+            responses = self._responses
+            scales = self._scales
+        wanted = np.unique(np.asarray(row_ids, dtype=np.int64))
+        if size == 0 or wanted.size == 0:
+            return []
+
+        query = np.asarray(vector, dtype=np.float32).reshape(-1)
+        if query.shape[0] != self.dim:
+            logging.warning(f"Vector dim mismatch: {query.shape[0]} vs {self.dim}")
+            return []
+        query = self.normalize(query)
+
+        positions = np.minimum(np.searchsorted(ids[:size], wanted), size - 1)
+        positions = positions[ids[positions] == wanted]
+        if positions.size == 0:
+            return []
+        scores = score_rows(matrix[positions], query, scales[positions] if scales is not None else None)
+        self._mask_dead(scores, positions)
+        k = min(k, positions.size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            {
+                "id": int(ids[positions[i]]),
+                "input": inputs[positions[i]],
+                "response": responses[positions[i]],
+                "score": float(scores[i]),
+            }
+            for i in top
+            if scores[i] > -np.inf
+        ]
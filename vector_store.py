@@ -0,0 +1,161 @@
+# vector_store.py
+
+import argparse
+import logging
+import os
+import struct
+import threading
+from pathlib import Path
+import numpy as np
+from vector_index import VectorIndex
+from db import get_connection
+
+# File layout: 64-byte header, then fixed-stride records of (int64 memory.id, dim x float vector).
+# Vectors are stored pre-normalized so the mapped file can be searched as-is.
+SEGMENT_MAGIC = b"NCVSEG01"
+SEGMENT_VERSION = 1
+HEADER_SIZE = 64
+_HEADER = struct.Struct("<8sIII")  # magic, version, dim, dtype code
+_DTYPE_CODES = {"float32": 0, "float16": 1}
+_DTYPE_NAMES = {code: name for name, code in _DTYPE_CODES.items()}
+
+
+def decode_blob(blob: bytes, dim: int) -> np.ndarray:
+    """Read a memory.vector BLOB as float32; float16 BLOBs are recognized by their length."""
+    if len(blob) == dim * 2:
+        return np.frombuffer(blob, dtype=np.float16).astype(np.float32)
+    return np.frombuffer(blob, dtype=np.float32)
+
+
+class VectorSegment:
+    """
+    Append-only vector segment file, read zero-copy through np.memmap.
+    Several processes can map the same file and share one page-cached copy.
+    """
+
+    def __init__(self, path: Path, dim: int, dtype: str = "float32"):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._map = None
+        self._count = 0
+
+        if not self.path.exists() or self.path.stat().st_size < HEADER_SIZE:
+            if dtype not in _DTYPE_CODES:
+                raise ValueError(f"Unsupported segment dtype '{dtype}' (use float32 or float16).")
+            header = _HEADER.pack(SEGMENT_MAGIC, SEGMENT_VERSION, dim, _DTYPE_CODES[dtype])
+            with open(self.path, "wb") as f:
+                f.write(header.ljust(HEADER_SIZE, b"\0"))
+            logging.info(f"Created vector segment {self.path} (dim={dim}, dtype={dtype})")
+
+        with open(self.path, "rb") as f:
+            magic, version, file_dim, dtype_code = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != SEGMENT_MAGIC or version != SEGMENT_VERSION:
+            raise ValueError(f"{self.path} is not a vector segment file (version {SEGMENT_VERSION}).")
+        if file_dim != dim:
+            raise ValueError(f"Vector segment {self.path} has dim {file_dim}, expected {dim}.")
+        if _DTYPE_NAMES[dtype_code] != dtype:
+            logging.warning(f"Vector segment {self.path} stores {_DTYPE_NAMES[dtype_code]}, ignoring configured {dtype}.")
+
+        self.dim = dim
+        self.dtype = np.dtype(_DTYPE_NAMES[dtype_code])
+        self.record = np.dtype([("id", "<i8"), ("vector", self.dtype, (dim,))])
+        self.refresh()
+
+    def __len__(self):
+        return self._count
+
+    def refresh(self) -> bool:
+        """Re-map the file if it has grown (e.g. appended by another process). Returns True if it changed."""
+        count = (os.path.getsize(self.path) - HEADER_SIZE) // self.record.itemsize
+        if count == self._count and (self._map is not None or count == 0):
+            return False
+        self._count = count
+        self._map = np.memmap(self.path, dtype=self.record, mode="r", offset=HEADER_SIZE, shape=(count,)) if count else None
+        return True
+
+    @property
+    def ids(self) -> np.ndarray:
+        if self._map is None:
+            return np.zeros(0, dtype=np.int64)
+        return self._map["id"]
+
+    @property
+    def vectors(self) -> np.ndarray:
+        if self._map is None:
+            return np.zeros((0, self.dim), dtype=self.dtype)
+        return self._map["vector"]
+
+    def append(self, ids, vectors: np.ndarray):
+        """Append records; vectors are expected to be normalized already."""
+        vectors = np.asarray(vectors).reshape(-1, self.dim)
+        records = np.empty(len(vectors), dtype=self.record)
+        records["id"] = ids
+        records["vector"] = vectors.astype(self.dtype)
+        with self._lock:
+            self.refresh()
+            with open(self.path, "r+b") as f:
+                # Drop any torn record left by an interrupted write before appending
+                f.truncate(HEADER_SIZE + self._count * self.record.itemsize)
+                f.seek(0, os.SEEK_END)
+                f.write(records.tobytes())
+            self.refresh()
+
+
+def migrate(db_path: Path, segment_path: Path, dim: int, dtype: str = "float32",
+            drop_blobs: bool = False, batch_size: int = 10000) -> int:
+    """
+    Copy vectors from the memory table's BLOB column into a segment file.
+    Only rows with an id beyond the segment's last id are copied, so it can be re-run.
+    With drop_blobs the BLOBs are cleared afterwards so SQLite keeps only the text.
+    """
+    segment = VectorSegment(segment_path, dim, dtype)
+    last_id = int(segment.ids[-1]) if len(segment) else 0
+    copied = 0
+    with get_connection(db_path) as conn:
+        cursor = conn.execute(
+            "SELECT id, vector FROM memory WHERE id > ? AND vector IS NOT NULL ORDER BY id", (last_id,)
+        )
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            ids, vectors = [], []
+            for row_id, blob in rows:
+                vector = decode_blob(blob, dim)
+                if vector.shape[0] != dim:
+                    logging.warning(f"Skipping memory id {row_id}: vector dim {vector.shape[0]} != {dim}")
+                    continue
+                ids.append(row_id)
+                vectors.append(VectorIndex.normalize(vector))
+            if ids:
+                segment.append(ids, np.stack(vectors))
+                copied += len(ids)
+            logging.info(f"Migrated {copied} vectors so far...")
+
+        if drop_blobs:
+            conn.execute("UPDATE memory SET vector = NULL WHERE id <= ?",
+                         (int(segment.ids[-1]) if len(segment) else 0,))
+            conn.commit()
+    if drop_blobs:
+        with get_connection(db_path) as conn:
+            conn.execute("VACUUM")
+    logging.info(f"Migration complete: {copied} vectors written to {segment_path} ({len(segment)} total).")
+    return copied
+
+
+def main():
+    from config import VECTOR_MEMORY_DB_PATH, VECTOR_SEGMENT_PATH, VECTOR_SEGMENT_DTYPE, VECTOR_DIM
+
+    parser = argparse.ArgumentParser(description="Migrate vector memory BLOBs into a memory-mapped segment file.")
+    parser.add_argument("--db", type=Path, default=VECTOR_MEMORY_DB_PATH, help="vector memory SQLite DB")
+    parser.add_argument("--segment", type=Path, default=VECTOR_SEGMENT_PATH, help="segment file to create or extend")
+    parser.add_argument("--dtype", choices=sorted(_DTYPE_CODES), default=VECTOR_SEGMENT_DTYPE)
+    parser.add_argument("--drop-blobs", action="store_true", help="clear the vector BLOBs from SQLite after copying")
+    args = parser.parse_args()
+
+    migrate(args.db, args.segment, VECTOR_DIM, dtype=args.dtype, drop_blobs=args.drop_blobs)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+    main()
@@ -0,0 +1,108 @@
+# write_behind.py
+
+import logging
+import threading
+import time
+from collections import deque
+
+
+class WriteBehindQueue:
+    """
+    Buffers writes and applies them from a background thread, in batches.
+    A batch is written once `max_batch_size` items are queued or `max_delay`
+    seconds after its first item arrived; write_fn(items) gets the whole batch
+    so it can commit it in one transaction. put() only blocks when
+    `max_pending` items are already waiting.
+    """
+
+    def __init__(self, write_fn, max_batch_size: int = 64, max_delay: float = 0.2, max_pending: int = 1000,
+                 name: str = "write-behind"):
+        self.write_fn = write_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_delay = max_delay
+        self.max_pending = max(1, max_pending)
+        self.name = name
+        self._items = deque()  # (item, monotonic time queued)
+        self._cond = threading.Condition()
+        self._queued = 0  # items ever queued
+        self._done = 0  # items written (or failed)
+        self._flush_target = 0  # flush() callers wait until _done reaches this
+        self._in_flight = 0
+        self._in_flight_since = None  # Queue time of the oldest item being written
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def put(self, item):
+        """Queue one item for the next batch."""
+        with self._cond:
+            if self._stopped:
+                raise RuntimeError(f"{self.name} queue has been shut down.")
+            while len(self._items) >= self.max_pending:
+                self._cond.wait()
+            self._items.append((item, time.monotonic()))
+            self._queued += 1
+            self._cond.notify_all()
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._items:
+                if self._stopped:
+                    return None
+                self._cond.wait()
+            deadline = self._items[0][1] + self.max_delay
+            while len(self._items) < self.max_batch_size and not self._stopped and self._flush_target <= self._done:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            self._in_flight_since = self._items[0][1]
+            batch = [self._items.popleft()[0] for _ in range(min(self.max_batch_size, len(self._items)))]
+            self._in_flight = len(batch)
+            self._cond.notify_all()  # room for blocked put() calls
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                self.write_fn(batch)
+            except Exception as e:
+                logging.error(f"{self.name}: failed to write a batch of {len(batch)}: {e}")
+            with self._cond:
+                self._done += len(batch)
+                self._in_flight = 0
+                self._in_flight_since = None
+                self._cond.notify_all()
+
+    def flush(self, timeout: float = None) -> bool:
+        """Write everything queued so far now. Returns False if `timeout` passed first."""
+        with self._cond:
+            target = self._queued
+            self._flush_target = max(self._flush_target, target)
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: self._done >= target or not self._thread.is_alive(), timeout)
+
+    def depth(self) -> int:
+        """Items queued or being written."""
+        with self._cond:
+            return len(self._items) + self._in_flight
+
+    def oldest_age(self) -> float:
+        """Seconds the oldest unwritten item has been waiting (0 when empty)."""
+        with self._cond:
+            if self._in_flight_since is not None:
+                return time.monotonic() - self._in_flight_since
+            return time.monotonic() - self._items[0][1] if self._items else 0.0
+
+    def shutdown(self, timeout: float = 10.0):
+        """Write what is queued, then stop the background thread."""
+        if self._stopped:
+            return
+        self.flush(timeout)
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        self._thread.join(timeout=timeout)